@@ -0,0 +1,195 @@
+import json
+import os
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Optional
+import numpy as np
+from loguru import logger
+from audio.synthesis import synthesize_segment
+from audio.voice_store import get_voice_store
+from utils.constants import MODELS_DIR
+
+if TYPE_CHECKING:
+    from kokoro import KPipeline
+
+BACKENDS = ('torch', 'onnx')
+DEFAULT_BACKEND = 'torch'
+DEFAULT_ONNX_MODEL_PATH = os.path.join(MODELS_DIR, 'kokoro-82m.int8.onnx')
+ONNX_INPUT_NAMES = ('input_ids', 'style', 'speed')
+ONNX_OUTPUT_NAMES = ('waveform', 'duration')
+
+# Thresholds of the parity check. int8 weights shift durations and timbre slightly, so
+# waveforms are compared by length and spectral envelope rather than sample by sample.
+PARITY_MAX_DURATION_DEVIATION = 0.05
+PARITY_MIN_SPECTRAL_CORRELATION = 0.98
+PARITY_TEXTS = (
+    "The quick brown fox jumps over the lazy dog.",
+    "It was the best of times, it was the worst of times; it was the age of wisdom.",
+    "Chapter one. In which our hero, against all advice, opens the door!",
+)
+
+
+class ModelOutput(NamedTuple):
+    """Same fields as KModel.Output, which KPipeline and synthesize_segments read."""
+    audio: np.ndarray
+    pred_dur: Optional[np.ndarray]
+
+
+class TTSBackend:
+    """
+    Runs Kokoro's forward pass for a KPipeline.
+
+    The pipeline keeps doing phonemization, chunking and voice loading; a backend only
+    provides the model object it calls, so process_audio, segment packing and the worker
+    pool work the same with every backend. Backends are sent to worker processes and must
+    stay picklable.
+    """
+
+    name = ''
+
+    @property
+    def signature(self) -> str:
+        """Identifies the backend and its model, e.g. for pool reuse."""
+        return self.name
+
+    def model_id(self, repo_id: str) -> str:
+        """Model identifier for cache keys, so audio from different backends is never mixed."""
+        return f"{repo_id}|{self.signature}"
+
+    def load_model(self, repo_id: str, device: str, threads: int = 0):
+        raise NotImplementedError
+
+    def create_pipeline(self, kokoro_module, lang_code: str, repo_id: str, model) -> "KPipeline":
+        # model=False keeps KPipeline from loading a KModel of its own.
+        pipeline = kokoro_module.KPipeline(lang_code=lang_code, repo_id=repo_id, model=False)
+        pipeline.model = model
+        return pipeline
+
+
+class TorchBackend(TTSBackend):
+    """Kokoro's own PyTorch KModel."""
+
+    name = 'torch'
+
+    def model_id(self, repo_id: str) -> str:
+        return repo_id # The original backend; keeps existing cache entries valid
+
+    def load_model(self, repo_id: str, device: str, threads: int = 0):
+        return get_voice_store(repo_id).load_model(device)
+
+
+class OnnxBackend(TTSBackend):
+    """
+    An exported (optionally int8-quantized) Kokoro graph on ONNX Runtime; see export_onnx.py.
+    Voice tensors and phonemes still come from kokoro, so torch is imported but only runs
+    voice loading, not inference.
+    """
+
+    name = 'onnx'
+
+    def __init__(self, model_path: str = DEFAULT_ONNX_MODEL_PATH):
+        self.model_path = model_path
+
+    @property
+    def signature(self) -> str:
+        return f"{self.name}:{os.path.basename(self.model_path)}"
+
+    def load_model(self, repo_id: str, device: str, threads: int = 0):
+        if not os.path.exists(self.model_path):
+            raise RuntimeError(f"ONNX model '{self.model_path}' not found. Create it with `python src/NarrateAI/export_onnx.py`.")
+        with open(get_voice_store(repo_id).config_path(), 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        return OnnxKModel(self.model_path, config['vocab'], config['plbert']['max_position_embeddings'], device, threads)
+
+
+class OnnxKModel:
+    """Stands in for KModel in a KPipeline, running the graph exported from KModelForONNX."""
+
+    def __init__(self, model_path: str, vocab: Dict[str, int], context_length: int, device: str = 'cpu', threads: int = 0):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            logger.error("The 'onnxruntime' library is required for the ONNX backend. Please install it (e.g., `pip install onnxruntime`, see the optional entries in requirements.txt).")
+            raise RuntimeError("The ONNX backend requires the 'onnxruntime' library. Install it with `pip install onnxruntime` (an optional entry in requirements.txt).")
+        self.vocab = vocab
+        self.context_length = context_length
+        # Voice packs are moved here before inference; they are handed to ONNX Runtime as numpy.
+        self.device = 'cpu'
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        providers = ['CPUExecutionProvider']
+        if str(device).startswith('cuda'):
+            if 'CUDAExecutionProvider' in ort.get_available_providers():
+                providers.insert(0, 'CUDAExecutionProvider')
+            else:
+                logger.warning("CUDA is not available to ONNX Runtime; running the ONNX backend on the CPU.")
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=providers)
+        speed_input = next(i for i in self.session.get_inputs() if i.name == ONNX_INPUT_NAMES[2])
+        self._speed_dtype = np.float64 if speed_input.type == 'tensor(double)' else np.float32
+        logger.info(f"Loaded ONNX model '{model_path}' ({', '.join(self.session.get_providers())}).")
+
+    def __bool__(self) -> bool:
+        return True # KPipeline treats a falsy model as "no model"
+
+    def __call__(self, phonemes: str, ref_s, speed: float = 1, return_output: bool = False):
+        input_ids = [i for i in map(self.vocab.get, phonemes) if i is not None]
+        if len(input_ids) + 2 > self.context_length:
+            raise ValueError(f"{len(input_ids) + 2} tokens exceed the model's context of {self.context_length}.")
+        if hasattr(ref_s, 'detach'): # torch.Tensor
+            ref_s = ref_s.detach().cpu().numpy()
+        waveform, duration = self.session.run(ONNX_OUTPUT_NAMES, {
+            ONNX_INPUT_NAMES[0]: np.array([[0, *input_ids, 0]], dtype=np.int64),
+            ONNX_INPUT_NAMES[1]: np.asarray(ref_s, dtype=np.float32).reshape(1, -1),
+            ONNX_INPUT_NAMES[2]: np.array([speed], dtype=self._speed_dtype),
+        })
+        output = ModelOutput(audio=waveform.reshape(-1), pred_dur=duration.reshape(-1).astype(np.int64))
+        return output if return_output else output.audio
+
+
+def create_backend(name: str, onnx_model_path: str = DEFAULT_ONNX_MODEL_PATH) -> TTSBackend:
+    name = str(name).lower()
+    if name == 'onnx':
+        return OnnxBackend(onnx_model_path or DEFAULT_ONNX_MODEL_PATH)
+    if name != 'torch':
+        logger.warning(f"Unsupported TTS backend '{name}' in settings; falling back to '{DEFAULT_BACKEND}'. Supported: {', '.join(BACKENDS)}")
+    return TorchBackend()
+
+
+def _log_spectrum(audio: np.ndarray, frame: int = 1024, hop: int = 256) -> np.ndarray:
+    """Mean log-magnitude spectrum of the audio, a length-independent fingerprint of its timbre."""
+    if audio.size < frame:
+        audio = np.pad(audio, (0, frame - audio.size))
+    frames = np.lib.stride_tricks.sliding_window_view(audio, frame)[::hop] * np.hanning(frame)
+    return np.log(np.abs(np.fft.rfft(frames, axis=1)).mean(axis=0) + 1e-6)
+
+
+def compare_audio(reference: np.ndarray, candidate: np.ndarray) -> Dict[str, float]:
+    """Parity metrics of a candidate backend's audio against the reference backend's."""
+    metrics = {
+        'duration_ratio': candidate.size / reference.size if reference.size else 0.0,
+        'spectral_correlation': float(np.corrcoef(_log_spectrum(reference), _log_spectrum(candidate))[0, 1]),
+    }
+    if reference.size == candidate.size and reference.size:
+        noise = np.sum((reference - candidate) ** 2)
+        metrics['snr_db'] = float(10 * np.log10(np.sum(reference ** 2) / noise)) if noise else float('inf')
+    return metrics
+
+
+def check_parity(reference_pipeline, candidate_pipeline, voice: str, speed: float = 1.0,
+                 texts: List[str] = PARITY_TEXTS) -> bool:
+    """
+    Synthesizes the same texts with two pipelines (e.g. torch and ONNX) and logs how far
+    the candidate's audio is from the reference. Returns True if every text is within
+    the parity thresholds.
+    """
+    passed = True
+    for text in texts:
+        result = compare_audio(synthesize_segment(reference_pipeline, text, voice, speed),
+                               synthesize_segment(candidate_pipeline, text, voice, speed))
+        ok = abs(result['duration_ratio'] - 1) <= PARITY_MAX_DURATION_DEVIATION \
+            and result['spectral_correlation'] >= PARITY_MIN_SPECTRAL_CORRELATION
+        passed = passed and ok
+        details = ', '.join(f"{name}={value:.3f}" for name, value in result.items())
+        (logger.info if ok else logger.warning)(f"Parity {'ok' if ok else 'FAILED'} for '{text[:40]}': {details}")
+    return passed
@@ -0,0 +1,252 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Set
+import soundfile as sf
+from loguru import logger
+from utils.constants import OUTPUTS_DIR
+from utils.file_reader import Chapter
+
+INDEX_FILE_NAME = 'index.json'
+PRUNE_INTERVAL_SECONDS = 600
+DEFAULT_BOOK_RETENTION_HOURS = 168 # A week
+
+_book_locks: Dict[str, threading.Lock] = {}
+_book_locks_lock = threading.Lock()
+_last_prune = 0.0
+
+
+def _safe_file_title(title: str, max_length: int = 60) -> str:
+    cleaned = re.sub(r'[^\w\- ]+', '', title).strip()
+    return re.sub(r'\s+', ' ', cleaned)[:max_length].rstrip()
+
+
+def _hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _book_lock(book_dir: str) -> threading.Lock:
+    with _book_locks_lock:
+        return _book_locks.setdefault(os.path.abspath(book_dir), threading.Lock())
+
+
+def prune_books(root: str, older_than: float) -> int:
+    """
+    Removes the chapter-mode book directories under root (those with an index file) that no
+    run has touched since the older_than timestamp, and returns how many. Books being
+    rendered right now are kept.
+    """
+    try:
+        entries = list(os.scandir(root))
+    except FileNotFoundError:
+        return 0
+    removed = 0
+    for entry in entries:
+        index_path = os.path.join(entry.path, INDEX_FILE_NAME)
+        try:
+            if not entry.is_dir() or not os.path.exists(index_path) or os.path.getmtime(index_path) >= older_than:
+                continue
+            lock = _book_lock(entry.path)
+            if not lock.acquire(blocking=False):
+                continue
+            try:
+                shutil.rmtree(entry.path)
+                removed += 1
+            finally:
+                lock.release()
+        except OSError as e:
+            logger.warning(f"Could not remove expired book '{entry.path}': {e}")
+    if removed:
+        logger.info(f"Removed {removed} expired chapter-mode books from '{root}'.")
+    return removed
+
+
+def _maybe_prune_books(root: str, retention_seconds: float):
+    global _last_prune
+    if not retention_seconds:
+        return
+    with _book_locks_lock:
+        now = time.time()
+        if now - _last_prune < PRUNE_INTERVAL_SECONDS:
+            return
+        _last_prune = now
+    prune_books(root, now - retention_seconds)
+
+
+class ChapterJobRunner:
+    """
+    Synthesizes a book chapter by chapter into OUTPUTS_DIR/<book_name>-<key>/, where key
+    is a hash of the chapter titles: it tells apart different books with the same file
+    name, but stays the same when the text of a chapter is edited.
+
+    Every chapter is an independent process_audio job with its own output file, so
+    chapters can render in parallel, finished ones can be played while others are still
+    running, and a failed chapter can be retried on its own. Progress is tracked in an
+    index.json next to the files, plus an .m3u playlist of the finished chapters.
+    Re-running a book skips chapters whose text and voice settings are unchanged and
+    whose file is already complete, and re-renders only the others. Concurrent runs of
+    the same book take turns, so the later one finds the chapters the earlier one
+    finished instead of rendering them again. Books no run has touched for
+    retention_hours are removed (0 keeps them).
+    """
+
+    def __init__(self, tts_engine, max_parallel_chapters: int = 1, retention_hours: float = DEFAULT_BOOK_RETENTION_HOURS):
+        self.tts_engine = tts_engine
+        self.max_parallel_chapters = max(int(max_parallel_chapters), 1)
+        self.retention_seconds = max(float(retention_hours), 0.0) * 3600
+
+    def run(self,
+            chapters: List[Chapter],
+            book_name: str,
+            progress_callback: Optional[Callable[[int, int, str], None]] = None,
+            chapter_callback: Optional[Callable[[Dict], None]] = None,
+            only_chapters: Optional[Set[int]] = None) -> str:
+        """
+        Renders the chapters and returns the path of the index file. chapter_callback
+        receives each chapter's index entry, plus the 'path' of its file, as soon as that
+        chapter is finished (or failed). only_chapters restricts the run to the given
+        1-based chapter numbers.
+        """
+        book_name = os.path.basename(book_name)
+        settings = self.tts_engine.current_settings()
+        settings_key = self.tts_engine.settings_key(settings)
+        _maybe_prune_books(OUTPUTS_DIR, self.retention_seconds)
+        book_key = _hash_text('\n'.join(chapter.title for chapter in chapters))
+        book_dir = os.path.join(OUTPUTS_DIR, f"{book_name}-{book_key[:12]}")
+        with _book_lock(book_dir):
+            return self._run_book(chapters, book_name, book_dir, settings, settings_key, progress_callback, chapter_callback, only_chapters)
+
+    def _run_book(self,
+                  chapters: List[Chapter],
+                  book_name: str,
+                  book_dir: str,
+                  settings,
+                  settings_key: str,
+                  progress_callback: Optional[Callable[[int, int, str], None]],
+                  chapter_callback: Optional[Callable[[Dict], None]],
+                  only_chapters: Optional[Set[int]]) -> str:
+        os.makedirs(book_dir, exist_ok=True)
+        index_path = os.path.join(book_dir, INDEX_FILE_NAME)
+        number_width = max(len(str(len(chapters))), 2)
+
+        previous_entries = {entry.get('number'): entry for entry in self._load_index(index_path).get('chapters', [])}
+        entries = []
+        for number, chapter in enumerate(chapters, start=1):
+            base_name = f"{number:0{number_width}d} - {_safe_file_title(chapter.title) or f'Chapter {number}'}"
+            entry = {
+                'number': number,
+                'title': chapter.title,
+                'file': f"{base_name}.{self.tts_engine.output_format}",
+                'text_hash': _hash_text(chapter.text),
+                'settings': settings_key,
+                'status': 'pending',
+                'duration_seconds': None,
+                'error': None,
+            }
+            previous = previous_entries.get(number)
+            if previous and previous.get('status') == 'done' and os.path.exists(os.path.join(book_dir, previous.get('file', ''))) \
+                    and previous.get('text_hash') == entry['text_hash'] and previous.get('settings') == settings_key:
+                entry = previous
+            entries.append(entry)
+
+        index_lock = threading.Lock()
+        index_data = {'book': book_name, 'settings': settings_key, 'chapters': entries}
+        self._write_index(index_path, index_data)
+
+        todo = [
+            (entry, chapter) for entry, chapter in zip(entries, chapters)
+            if entry['status'] != 'done' and (only_chapters is None or entry['number'] in only_chapters)
+        ]
+        skipped = len(entries) - len(todo)
+        if skipped:
+            logger.info(f"Chapter mode for '{book_name}': {skipped} of {len(entries)} chapters are already up to date or not selected.")
+
+        total_weight = sum(len(chapter.text) for _entry, chapter in todo) or 1
+        chapter_fractions: Dict[int, float] = {}
+
+        def report_progress(description: str):
+            if progress_callback:
+                done_weight = sum(chapter_fractions.get(entry['number'], 0.0) * len(chapter.text) for entry, chapter in todo)
+                progress_callback(int(done_weight / total_weight * 1000), 1000, description)
+
+        def render_chapter(entry: Dict, chapter: Chapter):
+            number = entry['number']
+
+            def chapter_progress(current_step: int, total_steps: int, _description: str):
+                if total_steps > 0:
+                    chapter_fractions[number] = current_step / total_steps
+                report_progress(f"Generating chapter {number}/{len(entries)}: {chapter.title}")
+
+            try:
+                output_path = self.tts_engine.process_audio(
+                    chapter.text,
+                    os.path.splitext(entry['file'])[0],
+                    progress_callback=chapter_progress,
+                    settings=settings,
+                    output_dir=book_dir
+                )
+                if output_path is None:
+                    raise RuntimeError("no audio was produced for this chapter")
+                entry['status'] = 'done'
+                entry['duration_seconds'] = round(sf.info(output_path).duration, 2)
+                entry['error'] = None
+                logger.info(f"Chapter {number} of '{book_name}' finished: '{output_path}'.")
+            except Exception as e:
+                entry['status'] = 'failed'
+                entry['error'] = str(e)
+                logger.error(f"Chapter {number} ('{chapter.title}') of '{book_name}' failed: {e}", exc_info=True)
+            chapter_fractions[number] = 1.0
+            with index_lock:
+                self._write_index(index_path, index_data)
+                self._write_playlist(book_dir, book_name, entries)
+            if chapter_callback:
+                chapter_callback({**entry, 'path': os.path.join(book_dir, entry['file'])})
+
+        if self.max_parallel_chapters > 1 and len(todo) > 1:
+            with ThreadPoolExecutor(max_workers=self.max_parallel_chapters, thread_name_prefix=f"chapters-{book_name}") as executor:
+                for future in [executor.submit(render_chapter, entry, chapter) for entry, chapter in todo]:
+                    future.result()
+        else:
+            for entry, chapter in todo:
+                render_chapter(entry, chapter)
+
+        self._write_playlist(book_dir, book_name, entries)
+        failed = [entry['number'] for entry in entries if entry['status'] == 'failed']
+        if failed and len(failed) == len(entries):
+            raise RuntimeError(f"All {len(entries)} chapters of '{book_name}' failed. Check logs for details.")
+        if failed:
+            logger.warning(f"Chapters {failed} of '{book_name}' failed and can be retried individually.")
+        return index_path
+
+    @staticmethod
+    def _load_index(index_path: str) -> Dict:
+        if not os.path.exists(index_path):
+            return {}
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable chapter index '{index_path}': {e}")
+            return {}
+
+    @staticmethod
+    def _write_index(index_path: str, index_data: Dict):
+        tmp_path = index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index_data, f, indent=4, ensure_ascii=False)
+        os.replace(tmp_path, index_path)
+
+    @staticmethod
+    def _write_playlist(book_dir: str, book_name: str, entries: List[Dict]):
+        lines = ['#EXTM3U']
+        for entry in entries:
+            if entry['status'] == 'done':
+                lines.append(f"#EXTINF:{int(entry.get('duration_seconds') or -1)},{entry['title']}")
+                lines.append(entry['file'])
+        with open(os.path.join(book_dir, f"{book_name}.m3u"), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
@@ -0,0 +1,233 @@
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Iterator, Optional
+import numpy as np
+import soundfile as sf
+from loguru import logger
+from audio.stream_writer import float_to_pcm16
+
+MANIFEST_VERSION = 1
+MANIFEST_FILE_NAME = 'manifest.json'
+AUDIO_FILE_NAME = 'audio.pcm'
+REPLAY_BLOCK_FRAMES = 24000 * 60 # One minute of 24 kHz audio per block when replaying
+PRUNE_INTERVAL_SECONDS = 600
+
+_active_dirs = set()
+_active_dirs_lock = threading.Lock()
+_last_prune = {} # Work directory root -> time it was last pruned
+
+
+class SegmentCheckpoint:
+    """
+    Durable record of the segments a job has already synthesized, so a restarted job resumes
+    where the previous attempt stopped instead of starting over.
+
+    The workspace holds the synthesized audio as raw 16-bit PCM (audio.pcm) and a manifest
+    with the number of finished segments and frames. The manifest is only rewritten after
+    the audio it describes has been flushed to disk, so after a crash it never claims more
+    than is actually there. The key identifies the input and voice settings; a workspace
+    with a different key is reset instead of resumed.
+    """
+
+    def __init__(self, work_dir: str, key: str, sample_rate: int, interval_segments: int = 16):
+        self.work_dir = work_dir
+        self.key = key
+        self.sample_rate = sample_rate
+        self.interval_segments = max(int(interval_segments), 1)
+        self.manifest_path = os.path.join(work_dir, MANIFEST_FILE_NAME)
+        self.audio_path = os.path.join(work_dir, AUDIO_FILE_NAME)
+        self.segments_done = 0
+        self.frames = 0
+        self._checkpointed_segments = 0
+        self._audio_file = None
+        self._acquired = False
+
+    def _read_manifest(self) -> Optional[dict]:
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable checkpoint manifest '{self.manifest_path}': {e}")
+            return None
+
+    def begin(self) -> int:
+        """
+        Opens the workspace and returns the number of segments that are already done (0 for
+        a fresh start). Raises RuntimeError if another job in this process is using the same
+        workspace.
+        """
+        with _active_dirs_lock:
+            if self.work_dir in _active_dirs:
+                raise RuntimeError(f"Checkpoint workspace '{self.work_dir}' is already in use by another job.")
+            _active_dirs.add(self.work_dir)
+            self._acquired = True
+        try:
+            return self._open_workspace()
+        except OSError:
+            self._release_dir()
+            raise
+
+    def _open_workspace(self) -> int:
+        os.makedirs(self.work_dir, exist_ok=True)
+        manifest = self._read_manifest()
+        if manifest and manifest.get('version') == MANIFEST_VERSION and manifest.get('key') == self.key \
+                and manifest.get('sample_rate') == self.sample_rate and os.path.exists(self.audio_path) \
+                and os.path.getsize(self.audio_path) >= manifest.get('frames', 0) * 2:
+            self.segments_done = int(manifest.get('segments_done', 0))
+            self.frames = int(manifest.get('frames', 0))
+        else:
+            if manifest:
+                logger.info(f"Checkpoint in '{self.work_dir}' belongs to different input or settings; starting over.")
+            self.segments_done = 0
+            self.frames = 0
+
+        # Drop audio written after the last checkpoint; those segments are synthesized again.
+        self._audio_file = open(self.audio_path, 'r+b' if os.path.exists(self.audio_path) else 'w+b')
+        self._audio_file.truncate(self.frames * 2)
+        self._audio_file.seek(0, os.SEEK_END)
+        self._checkpointed_segments = self.segments_done
+        if self.segments_done:
+            logger.info(f"Resuming from checkpoint '{self.work_dir}': {self.segments_done} segments, {self.frames / self.sample_rate:.1f}s of audio already done.")
+        self._write_manifest()
+        return self.segments_done
+
+    def _write_manifest(self):
+        manifest = {
+            'version': MANIFEST_VERSION,
+            'key': self.key,
+            'sample_rate': self.sample_rate,
+            'segments_done': self.segments_done,
+            'frames': self.frames,
+            'updated_at': time.time(),
+        }
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=4)
+        os.replace(tmp_path, self.manifest_path)
+
+    def append(self, audio_data):
+        """Records one finished segment (which may be silent/empty)."""
+        samples = float_to_pcm16(audio_data)
+        if samples.size:
+            self._audio_file.write(samples.astype('<i2').tobytes())
+            self.frames += samples.size
+        self.segments_done += 1
+        if self.segments_done - self._checkpointed_segments >= self.interval_segments:
+            self.flush()
+
+    def flush(self):
+        """Makes everything appended so far durable and records it in the manifest."""
+        if self._audio_file is None:
+            return
+        self._audio_file.flush()
+        os.fsync(self._audio_file.fileno())
+        self._write_manifest()
+        self._checkpointed_segments = self.segments_done
+
+    def _iter_pcm_blocks(self, frames: int) -> Iterator[np.ndarray]:
+        with open(self.audio_path, 'rb') as f:
+            remaining = frames
+            while remaining > 0:
+                block = np.frombuffer(f.read(min(remaining, REPLAY_BLOCK_FRAMES) * 2), dtype='<i2')
+                if block.size == 0:
+                    break
+                remaining -= block.size
+                yield block
+
+    def iter_audio(self) -> Iterator[np.ndarray]:
+        """Yields the audio of the segments done so far as float32 blocks."""
+        for block in self._iter_pcm_blocks(self.frames):
+            yield block.astype(np.float32) / 32768.0
+
+    def export_partial(self, output_path: str) -> Optional[str]:
+        """
+        Writes the audio up to the last checkpoint to a WAV file, e.g. for partial downloads.
+        Safe to call while another thread is still appending to the workspace.
+        """
+        manifest = self._read_manifest()
+        if not manifest or not manifest.get('frames'):
+            return None
+        tmp_path = output_path + '.part'
+        with sf.SoundFile(tmp_path, 'w', samplerate=manifest['sample_rate'], channels=1, format='WAV', subtype='PCM_16') as out:
+            for block in self._iter_pcm_blocks(int(manifest['frames'])):
+                out.write(block)
+        os.replace(tmp_path, output_path)
+        return output_path
+
+    def release(self):
+        """Checkpoints and closes the workspace, keeping it for a later resume."""
+        if self._audio_file is not None:
+            try:
+                self.flush()
+            except OSError as e:
+                logger.warning(f"Could not write final checkpoint in '{self.work_dir}': {e}")
+            self._audio_file.close()
+            self._audio_file = None
+        self._release_dir()
+
+    def discard(self):
+        """Removes the workspace once the job has finished (or was cancelled)."""
+        if self._audio_file is not None:
+            self._audio_file.close()
+            self._audio_file = None
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+        self._release_dir()
+
+    def _release_dir(self):
+        if self._acquired:
+            with _active_dirs_lock:
+                _active_dirs.discard(self.work_dir)
+            self._acquired = False
+
+
+def prune_checkpoints(root: str, older_than: float) -> int:
+    """
+    Removes the checkpoints under root that were last written before the older_than timestamp
+    (abandoned or failed runs nobody resumed) and returns how many. Checkpoints in use by a
+    job in this process are kept.
+    """
+    try:
+        entries = list(os.scandir(root))
+    except FileNotFoundError:
+        return 0
+    removed = 0
+    for entry in entries:
+        try:
+            if not entry.is_dir():
+                continue
+            manifest_path = os.path.join(entry.path, MANIFEST_FILE_NAME)
+            updated = os.path.getmtime(manifest_path) if os.path.exists(manifest_path) else entry.stat().st_mtime
+            if updated >= older_than:
+                continue
+            with _active_dirs_lock:
+                if entry.path in _active_dirs:
+                    continue
+                _active_dirs.add(entry.path) # Keeps begin() away while the files are removed
+            try:
+                shutil.rmtree(entry.path)
+                removed += 1
+            finally:
+                with _active_dirs_lock:
+                    _active_dirs.discard(entry.path)
+        except OSError as e:
+            logger.warning(f"Could not remove stale checkpoint '{entry.path}': {e}")
+    if removed:
+        logger.info(f"Removed {removed} stale checkpoints from '{root}'.")
+    return removed
+
+
+def maybe_prune_checkpoints(root: str, retention_seconds: float):
+    """Runs prune_checkpoints for checkpoints older than retention_seconds, at most every PRUNE_INTERVAL_SECONDS; 0 keeps them forever."""
+    if not retention_seconds:
+        return
+    with _active_dirs_lock:
+        now = time.time()
+        if now - _last_prune.get(root, 0.0) < PRUNE_INTERVAL_SECONDS:
+            return
+        _last_prune[root] = now
+    prune_checkpoints(root, now - retention_seconds)
@@ -0,0 +1,106 @@
+import threading
+import weakref
+from collections import deque
+from contextlib import contextmanager
+from typing import Iterator
+import utils.metrics as metrics
+
+
+class SynthesisDispatcher:
+    """
+    Hands out turns on a shared model to concurrent jobs, at most `slots` at a time.
+
+    Jobs that share a model (UI requests, background jobs, chapters, batch documents)
+    take a slot per forward pass and get them in arrival order, so one long book cannot
+    starve a short one, and the model never runs more passes at once than its threads
+    or GPU can serve. Slots are shared by all pipelines on the model; use synthesis_turn(),
+    which also makes calls into any one pipeline take turns, as the phonemizers behind a
+    KPipeline are not thread-safe.
+    """
+
+    def __init__(self, slots: int = 1):
+        self.slots = max(int(slots), 1)
+        self._condition = threading.Condition()
+        self._waiting = deque()
+        self._busy = 0
+
+    @property
+    def waiting(self) -> int:
+        with self._condition:
+            return len(self._waiting)
+
+    def set_slots(self, slots: int):
+        with self._condition:
+            self.slots = max(int(slots), 1)
+            self._condition.notify_all()
+
+    def acquire(self):
+        ticket = object()
+        with self._condition:
+            self._waiting.append(ticket)
+            metrics.SYNTHESIS_WAITING.inc()
+            try:
+                while self._waiting[0] is not ticket or self._busy >= self.slots:
+                    self._condition.wait()
+            except BaseException:
+                self._waiting.remove(ticket)
+                self._condition.notify_all()
+                raise
+            finally:
+                metrics.SYNTHESIS_WAITING.dec()
+            self._waiting.popleft()
+            self._busy += 1
+            self._condition.notify_all() # The next job in line may fit into another free slot
+
+    def release(self):
+        with self._condition:
+            self._busy -= 1
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+
+_dispatchers: "weakref.WeakKeyDictionary[object, SynthesisDispatcher]" = weakref.WeakKeyDictionary()
+_dispatchers_lock = threading.Lock()
+
+
+_pipeline_locks: "weakref.WeakKeyDictionary[object, threading.Lock]" = weakref.WeakKeyDictionary()
+
+
+def get_dispatcher(pipeline, slots: int = 1) -> SynthesisDispatcher:
+    """
+    Returns the dispatcher of the model behind a pipeline, applying the latest slot count.
+    Pipelines of the pipeline pool share one model per device and therefore one dispatcher;
+    stand-ins without a model (e.g. the benchmark's stub) get one of their own.
+    """
+    owner = getattr(pipeline, 'model', None) or pipeline
+    with _dispatchers_lock:
+        dispatcher = _dispatchers.get(owner)
+        if dispatcher is None:
+            dispatcher = _dispatchers[owner] = SynthesisDispatcher(slots)
+        elif dispatcher.slots != max(int(slots), 1):
+            dispatcher.set_slots(slots)
+        return dispatcher
+
+
+@contextmanager
+def synthesis_turn(pipeline, slots: int = 1) -> Iterator[None]:
+    """
+    Runs the block in a slot of the pipeline's model and alone on the pipeline itself. With
+    slots > 1, requests in different languages run passes side by side on the shared
+    model, while requests on the same pipeline still phonemize and synthesize one at a time.
+    The pipeline lock is taken before the slot, so requests queued on a busy pipeline never
+    hold a slot that requests for other pipelines could use.
+    """
+    with _dispatchers_lock:
+        pipeline_lock = _pipeline_locks.get(pipeline)
+        if pipeline_lock is None:
+            pipeline_lock = _pipeline_locks[pipeline] = threading.Lock()
+    with pipeline_lock, get_dispatcher(pipeline, slots).slot():
+        yield
@@ -0,0 +1,134 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+from loguru import logger
+from audio.backends import TTSBackend, TorchBackend
+from audio.voice_store import get_voice_store
+from utils.memory import get_rss_bytes
+import utils.metrics as metrics
+
+if TYPE_CHECKING:
+    from kokoro import KModel, KPipeline
+
+
+_kokoro = None
+
+
+def _import_kokoro(repo_id: str):
+    """Imports kokoro (and with it torch) on first use; this is the slowest import of the app."""
+    global _kokoro
+    if _kokoro is None:
+        get_voice_store(repo_id) # Applies offline mode before huggingface_hub is imported
+        start_time = time.perf_counter()
+        import kokoro
+        import_seconds = time.perf_counter() - start_time
+        metrics.STAGE_DURATION.observe(import_seconds, stage='import')
+        logger.info(f"Imported kokoro and torch in {import_seconds:.2f} seconds.")
+        _kokoro = kokoro
+    return _kokoro
+
+
+class PipelinePool:
+    """
+    Keeps initialized KPipelines warm, keyed by (lang_code, device).
+
+    All pipelines on one device share a single model from the backend, so adding a language only costs
+    its G2P resources. Least recently used pipelines are evicted once there are more
+    than max_pipelines, or once their estimated footprint exceeds max_memory_bytes
+    (0 disables the memory cap). Voice and speed are per-call arguments of a
+    pipeline, so changing them never requires a new pool entry.
+    """
+
+    def __init__(self, repo_id: str, max_pipelines: int = 2, max_memory_bytes: int = 0, backend: Optional[TTSBackend] = None):
+        self.repo_id = repo_id
+        self.backend = backend or TorchBackend()
+        self.max_pipelines = max(int(max_pipelines), 1)
+        self.max_memory_bytes = max(int(max_memory_bytes), 0)
+        self._lock = threading.RLock()
+        self._pipelines: "OrderedDict[Tuple[str, str], KPipeline]" = OrderedDict()  # Oldest first
+        self._pipeline_bytes: Dict[Tuple[str, str], int] = {}
+        self._models: Dict[str, "KModel"] = {}
+        self._model_bytes: Dict[str, int] = {}
+
+    def set_limits(self, max_pipelines: int, max_memory_bytes: int):
+        with self._lock:
+            self.max_pipelines = max(int(max_pipelines), 1)
+            self.max_memory_bytes = max(int(max_memory_bytes), 0)
+            if self._pipelines:
+                self._evict_locked(keep=next(reversed(self._pipelines)))
+
+    def get(self, lang_code: str, device: str) -> "KPipeline":
+        key = (lang_code, device)
+        with self._lock:
+            pipeline = self._pipelines.get(key)
+            if pipeline is not None:
+                self._pipelines.move_to_end(key)
+                logger.debug(f"Reusing warm KokoroTTS pipeline for lang='{lang_code}', device='{device}'.")
+                return pipeline
+
+            model = self._get_model(device)
+            logger.info(f"Initializing KokoroTTS pipeline (repo='{self.repo_id}', lang='{lang_code}', device='{device}')...")
+            start_time = time.time()
+            rss_before = get_rss_bytes()
+            pipeline = self.backend.create_pipeline(_import_kokoro(self.repo_id), lang_code, self.repo_id, model)
+            get_voice_store(self.repo_id).attach(pipeline)
+            self._pipeline_bytes[key] = max(get_rss_bytes() - rss_before, 0)
+            self._pipelines[key] = pipeline
+            init_seconds = time.time() - start_time
+            metrics.STAGE_DURATION.observe(init_seconds, stage='pipeline_init')
+            logger.info(f"KokoroTTS pipeline initialized successfully in {init_seconds:.2f} seconds.")
+            self._evict_locked(keep=key)
+            return pipeline
+
+    def _get_model(self, device: str) -> "KModel":
+        model = self._models.get(device)
+        if model is None:
+            logger.info(f"Loading Kokoro model '{self.repo_id}' ({self.backend.name} backend) on device '{device}'...")
+            start_time = time.time()
+            rss_before = get_rss_bytes()
+            _import_kokoro(self.repo_id)
+            model = self.backend.load_model(self.repo_id, device)
+            self._models[device] = model
+            self._model_bytes[device] = max(get_rss_bytes() - rss_before, 0)
+            load_seconds = time.time() - start_time
+            metrics.STAGE_DURATION.observe(load_seconds, stage='model_load')
+            logger.info(f"Kokoro model loaded on '{device}' in {load_seconds:.2f} seconds.")
+        return model
+
+    def estimated_bytes(self) -> int:
+        with self._lock:
+            return sum(self._pipeline_bytes.values()) + sum(self._model_bytes.values())
+
+    def _evict_locked(self, keep: Tuple[str, str]):
+        def over_budget() -> bool:
+            if len(self._pipelines) > self.max_pipelines:
+                return True
+            return self.max_memory_bytes > 0 and self.estimated_bytes() > self.max_memory_bytes
+
+        while over_budget() and len(self._pipelines) > 1:
+            key = next(k for k in self._pipelines if k != keep)
+            self._pipelines.pop(key)
+            self._pipeline_bytes.pop(key, None)
+            logger.info(f"Evicted KokoroTTS pipeline lang='{key[0]}', device='{key[1]}' from the engine pool.")
+            device = key[1]
+            if not any(d == device for _l, d in self._pipelines):
+                self._models.pop(device, None)
+                self._model_bytes.pop(device, None)
+                logger.info(f"Released Kokoro model on device '{device}'.")
+
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+def get_pipeline_pool(repo_id: str, max_pipelines: int, max_memory_bytes: int, backend: Optional[TTSBackend] = None) -> PipelinePool:
+    """Returns the process-wide pipeline pool, applying the latest size limits to it."""
+    global _shared_pool
+    backend = backend or TorchBackend()
+    with _shared_pool_lock:
+        if _shared_pool is None or (_shared_pool.repo_id, _shared_pool.backend.signature) != (repo_id, backend.signature):
+            _shared_pool = PipelinePool(repo_id, max_pipelines, max_memory_bytes, backend)
+        else:
+            _shared_pool.set_limits(max_pipelines, max_memory_bytes)
+        return _shared_pool
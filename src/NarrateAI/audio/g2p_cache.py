@@ -0,0 +1,206 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from importlib import metadata
+from typing import Any, Optional, Set, Tuple
+from loguru import logger
+import utils.metrics as metrics
+
+PRUNE_INTERVAL = 1000 # Inserts (or hits) between trims of the on-disk table
+
+
+def _g2p_version() -> str:
+    """Versions of the phonemizer packages; cached phonemes are dropped when they change."""
+    versions = []
+    for package in ('kokoro', 'misaki'):
+        try:
+            versions.append(f"{package}={metadata.version(package)}")
+        except metadata.PackageNotFoundError:
+            versions.append(f"{package}=unknown")
+    return ','.join(versions)
+
+
+class G2PCache:
+    """
+    Memoizes grapheme-to-phoneme results keyed by (lang_code, text).
+
+    Recent entries live in an in-process LRU of up to memory_entries; behind it, a SQLite
+    table of up to max_entries rows is shared by every job, synthesis worker process and
+    restart, so each unique segment is phonemized once. The table is trimmed by last use,
+    like the in-memory layer; hits are recorded in batches rather than written one by one.
+    Values are stored pickled and unpickled on every hit, so callers may mutate what they
+    get (KPipeline does).
+    Storage errors are logged and treated as misses; the cache never fails synthesis.
+    """
+
+    def __init__(self, db_path: str, memory_entries: int, max_entries: int):
+        self.db_path = db_path
+        self.memory_entries = max(int(memory_entries), 0)
+        self.max_entries = max(int(max_entries), 0)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self._inserts = 0
+        self._touched: Set[Tuple[str, str]] = set() # Keys hit since their last_used was last written
+        self._connection: Optional[sqlite3.Connection] = None
+        if self.max_entries:
+            try:
+                self._connection = self._open()
+            except sqlite3.Error as e:
+                logger.warning(f"G2P cache database '{db_path}' is unavailable, caching in memory only: {e}")
+
+    @property
+    def enabled(self) -> bool:
+        return self.memory_entries > 0 or self._connection is not None
+
+    def _open(self) -> sqlite3.Connection:
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        # Worker processes write to the same file, so wait for their locks instead of failing.
+        connection = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+        connection.execute('CREATE TABLE IF NOT EXISTS g2p (lang_code TEXT NOT NULL, text TEXT NOT NULL, value BLOB NOT NULL, '
+                           'last_used REAL NOT NULL DEFAULT 0, PRIMARY KEY (lang_code, text))')
+        if 'last_used' not in [column[1] for column in connection.execute('PRAGMA table_info(g2p)')]:
+            connection.execute('ALTER TABLE g2p ADD COLUMN last_used REAL NOT NULL DEFAULT 0') # Tables of earlier versions
+        connection.execute('CREATE INDEX IF NOT EXISTS g2p_last_used ON g2p (last_used)')
+        version = _g2p_version()
+        row = connection.execute("SELECT value FROM meta WHERE key = 'g2p_version'").fetchone()
+        if row is None or row[0] != version:
+            if row is not None:
+                logger.info(f"Phonemizer changed ({row[0]} -> {version}); clearing the G2P cache.")
+            connection.execute('DELETE FROM g2p')
+            connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('g2p_version', ?)", (version,))
+        entries = connection.execute('SELECT COUNT(*) FROM g2p').fetchone()[0]
+        logger.info(f"G2P cache at '{self.db_path}': {entries} entries (max {self.max_entries}, {self.memory_entries} in memory).")
+        return connection
+
+    def _remember(self, key: Tuple[str, str], blob: bytes):
+        if not self.memory_entries:
+            return
+        self._memory[key] = blob
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, lang_code: str, text: str) -> Optional[Any]:
+        key = (lang_code, text)
+        with self._lock:
+            blob = self._memory.get(key)
+            if blob is not None:
+                self._memory.move_to_end(key)
+            elif self._connection is not None:
+                try:
+                    row = self._connection.execute('SELECT value FROM g2p WHERE lang_code = ? AND text = ?', key).fetchone()
+                except sqlite3.Error as e:
+                    logger.warning(f"G2P cache lookup failed: {e}")
+                    row = None
+                if row is not None:
+                    blob = row[0]
+                    self._remember(key, blob)
+            if blob is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._touch(key)
+        metrics.CACHE_REQUESTS.inc(cache='g2p', result='miss' if blob is None else 'hit')
+        return None if blob is None else pickle.loads(blob)
+
+    def put(self, lang_code: str, text: str, value: Any):
+        if value is None:
+            return
+        try:
+            blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            logger.debug(f"Not caching unpicklable G2P result for '{text[:30]}': {e}")
+            return
+        key = (lang_code, text)
+        with self._lock:
+            self._remember(key, blob)
+            if self._connection is None:
+                return
+            try:
+                self._connection.execute('INSERT OR REPLACE INTO g2p (lang_code, text, value, last_used) VALUES (?, ?, ?, ?)', (*key, blob, time.time()))
+                self._touched.discard(key)
+                self._inserts += 1
+                if self._inserts % PRUNE_INTERVAL == 0:
+                    self._prune()
+            except sqlite3.Error as e:
+                logger.warning(f"G2P cache write failed: {e}")
+
+    def _touch(self, key: Tuple[str, str]):
+        if self._connection is None:
+            return
+        self._touched.add(key)
+        if len(self._touched) >= PRUNE_INTERVAL:
+            try:
+                self._write_touched()
+            except sqlite3.Error as e:
+                logger.warning(f"G2P cache write failed: {e}")
+
+    def _write_touched(self):
+        if self._touched:
+            now = time.time()
+            self._connection.executemany('UPDATE g2p SET last_used = ? WHERE lang_code = ? AND text = ?',
+                                         [(now, *key) for key in self._touched])
+            self._touched.clear()
+
+    def _prune(self):
+        """Deletes the least recently used rows beyond max_entries."""
+        self._write_touched()
+        self._connection.execute('DELETE FROM g2p WHERE rowid IN (SELECT rowid FROM g2p ORDER BY last_used DESC LIMIT -1 OFFSET ?)',
+                                 (self.max_entries,))
+
+
+class CachedG2P:
+    """Drop-in replacement for a KPipeline's g2p callable that consults a G2PCache first."""
+
+    def __init__(self, g2p, lang_code: str, cache: G2PCache):
+        self.g2p = g2p
+        self.lang_code = lang_code
+        self.cache = cache
+
+    def __call__(self, text: str):
+        result = self.cache.get(self.lang_code, text)
+        if result is None:
+            result = self.g2p(text)
+            self.cache.put(self.lang_code, text, result)
+        return result
+
+    def __getattr__(self, name: str):
+        return getattr(self.g2p, name)
+
+
+def install_g2p_cache(pipeline, cache: G2PCache):
+    """Routes a pipeline's phonemization through the cache. Safe to call repeatedly on the same pipeline."""
+    g2p = getattr(pipeline, 'g2p', None)
+    if g2p is None:
+        return
+    if isinstance(g2p, CachedG2P):
+        if cache.enabled:
+            g2p.cache = cache
+        else:
+            pipeline.g2p = g2p.g2p
+    elif cache.enabled:
+        pipeline.g2p = CachedG2P(g2p, pipeline.lang_code, cache)
+
+
+_shared_caches = {}
+_shared_caches_lock = threading.Lock()
+
+
+def get_g2p_cache(db_path: str, memory_entries: int, max_entries: int) -> G2PCache:
+    """Returns the process-wide cache for db_path, re-opening it only when its limits changed."""
+    with _shared_caches_lock:
+        cache = _shared_caches.get(db_path)
+        if cache is None or (cache.memory_entries, cache.max_entries) != (max(int(memory_entries), 0), max(int(max_entries), 0)):
+            cache = G2PCache(db_path, memory_entries, max_entries)
+            _shared_caches[db_path] = cache
+        return cache
@@ -1,19 +1,76 @@
+import hashlib
 import os
+from typing import TYPE_CHECKING, Optional, Callable, Iterable, Iterator, NamedTuple, Union
+from collections import deque
+from itertools import islice
+import threading
 import time
-from typing import Optional, List, Callable
-import re
-import soundfile as sf
-from pydub import AudioSegment
-from kokoro import KPipeline
+import numpy as np
 import utils.json_handler as jh
 from loguru import logger
-from utils.constants import OUTPUTS_DIR
+from utils.constants import OUTPUTS_DIR, SEGMENT_CACHE_DIR, G2P_CACHE_PATH, OUTPUT_CACHE_DIR, WORK_DIR, MEMORY_WORK_DIR, RAM_FS_DIR
+from audio.stream_writer import AudioStreamWriter, OUTPUT_FORMATS, to_float32_mono
+from audio.segment_cache import SegmentCache, get_segment_cache
+from audio.g2p_cache import G2PCache, get_g2p_cache, install_g2p_cache
+from audio.output_cache import OutputCache, get_output_cache
+from audio.synthesis import synthesize_segment, synthesize_segments
+from audio.postprocess import AudioPostProcessor, DEFAULT_TRIM_THRESHOLD_DB
+from audio.checkpoint import SegmentCheckpoint, maybe_prune_checkpoints
+from audio.dispatch import synthesis_turn
+from audio.worker_pool import lease_worker_pool
+from audio.engine_pool import get_pipeline_pool
+from audio.backends import TTSBackend, create_backend, DEFAULT_BACKEND, DEFAULT_ONNX_MODEL_PATH
+from audio.voice_store import configured_voices, get_voice_store
+from utils.prefetch import PrefetchIterator
+from utils.segmenter import TextSegmenter, DEFAULT_TARGET_CHARS, DEFAULT_MAX_CHARS
+from utils.perf import StageTimings
+import utils.metrics as metrics
+
+if TYPE_CHECKING:
+    from kokoro import KPipeline # Imported lazily by the pipeline pool; see engine_pool
 
 json_handler = jh.JsonHandler()
 
 # --- Constants ---
 SAMPLE_RATE = 24000
 KOKORO_REPO_ID = 'hexgrad/Kokoro-82M'
+DEFAULT_SEGMENT_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024 # 2GB
+DEFAULT_OUTPUT_CACHE_MAX_BYTES = 4 * 1024 * 1024 * 1024 # 4GB
+DEFAULT_G2P_CACHE_MEMORY_ENTRIES = 50000
+DEFAULT_G2P_CACHE_MAX_ENTRIES = 1000000
+DEFAULT_PIPELINE_POOL_SIZE = 2
+DEFAULT_PIPELINE_POOL_MAX_BYTES = 0 # No memory cap
+DEFAULT_SEGMENT_QUEUE_SIZE = 256
+DEFAULT_CHECKPOINT_INTERVAL_SEGMENTS = 16
+DEFAULT_CHECKPOINT_RETENTION_HOURS = 168 # A week
+DEFAULT_SYNTHESIS_SLOTS = 1
+WORKSPACE_STORAGES = ('disk', 'memory')
+DEFAULT_PACKED_BATCH_SIZE = 1 # Packing is opt-in: packed sentences share one voice style row and lose their edge silence
+DEFAULT_PACKED_BATCH_TOKENS = 200
+DEFAULT_OUTPUT_FORMAT = 'wav'
+DEFAULT_BITRATE_KBPS = 64
+WARM_UP_TEXT = "Warming up."
+# Settings apply_settings() can switch on a running engine; the others are read once, at start-up.
+LIVE_SETTINGS = ('lang_code', 'voice', 'speed', 'device', 'output_format', 'bitrate_kbps')
+SETTINGS_PREFIX = 'settings.kokoro_tts'
+# Stages process_audio records; callers may add their own (e.g. 'read') to the same StageTimings.
+PROCESS_AUDIO_STAGES = ('split', 'synthesis', 'postprocess', 'chunk_write', 'export')
+
+class SynthesisCancelled(RuntimeError):
+    """Raised by process_audio when its cancel_event is set; the partial output is removed."""
+
+
+class SynthesisInterrupted(RuntimeError):
+    """Raised by process_audio when its interrupt_event is set; the checkpoint is kept for a resume."""
+
+
+class SynthesisSettings(NamedTuple):
+    """Snapshot of the voice settings a single process_audio call runs with."""
+    lang_code: Optional[str]
+    voice: Optional[str]
+    speed: float
+    device: str
+
 
 class Kokoro_TTS:
     def _get_config_value(self, arg_value, settings_dict: dict, key: str, default_value):
@@ -27,7 +84,18 @@ class Kokoro_TTS:
                  lang_code: Optional[str] = None,
                  voice: Optional[str] = None,
                  speed: Optional[float] = None,
-                 device: Optional[str] = None):
+                 device: Optional[str] = None,
+                 workers: Optional[int] = None,
+                 pipeline: Optional["KPipeline"] = None,
+                 load_pipeline: bool = True,
+                 watch_settings: bool = False):
+        """
+        Arguments override the values in settings.kokoro_tts. A pre-built pipeline (e.g. the
+        benchmark's stub) is used instead of one from the shared pipeline pool. With
+        load_pipeline=False nothing is loaded here; call start_warm_up() to load the pipeline
+        in the background instead. With watch_settings, changes of the LIVE_SETTINGS in the
+        config (from the UI, by hand or by another process) are applied while running.
+        """
         self.sample_rate = sample_rate
         
         tts_settings = json_handler.get_setting('settings.kokoro_tts')
@@ -39,11 +107,81 @@ class Kokoro_TTS:
         self.voice = self._get_config_value(voice, tts_settings, 'voice', None)
         self.speed = float(self._get_config_value(speed, tts_settings, 'speed', 1.0))
         self.device = self._get_config_value(device, tts_settings, 'device', 'cpu')
-        self.output_format = 'wav'
+        self.output_format = self._validate_output_format(tts_settings.get('output_format', DEFAULT_OUTPUT_FORMAT))
+        # Target bitrate for lossy formats (opus, mp3); ignored by wav and flac.
+        self.bitrate_kbps = int(tts_settings.get('bitrate_kbps', DEFAULT_BITRATE_KBPS))
+        # Worker processes each load their own pipeline; 1 keeps synthesis in this process.
+        self.num_workers = max(int(self._get_config_value(workers, tts_settings, 'workers', 1)), 1)
+        self.torch_threads_per_worker = int(tts_settings.get('torch_threads_per_worker', 0)) or max((os.cpu_count() or 1) // self.num_workers, 1)
+        self.worker_batch_size = int(tts_settings.get('worker_batch_size', 8))
+        # Short consecutive segments are packed into one forward pass of at most this many
+        # segments and phonemes (see synthesize_segments); a size of 1 disables packing.
+        self.packed_batch_size = max(int(tts_settings.get('packed_batch_size', DEFAULT_PACKED_BATCH_SIZE)), 1)
+        self.packed_batch_tokens = int(tts_settings.get('packed_batch_tokens', DEFAULT_PACKED_BATCH_TOKENS))
+        # Sentences are packed into segments of about segment_target_chars; longer ones are split at segment_max_chars.
+        self.segment_target_chars = int(tts_settings.get('segment_target_chars', DEFAULT_TARGET_CHARS))
+        self.segment_max_chars = int(tts_settings.get('segment_max_chars', DEFAULT_MAX_CHARS))
+        # Segments buffered between the document reader thread and synthesis when streaming input.
+        self.segment_queue_size = int(tts_settings.get('segment_queue_size', DEFAULT_SEGMENT_QUEUE_SIZE))
+        # Silence trimming, pauses and level normalization applied to each segment before it is written.
+        self.postprocessor = AudioPostProcessor(
+            self.sample_rate,
+            trim_silence=tts_settings.get('trim_silence', False),
+            trim_threshold_db=tts_settings.get('trim_threshold_db', DEFAULT_TRIM_THRESHOLD_DB),
+            segment_pause_ms=tts_settings.get('segment_pause_ms', 0),
+            paragraph_pause_ms=tts_settings.get('paragraph_pause_ms', 0),
+            normalize=tts_settings.get('normalize', 'none'),
+            target_db=tts_settings.get('normalize_target_db')
+        )
+        # Finished segments between durable checkpoints of resumable jobs.
+        self.checkpoint_interval_segments = int(tts_settings.get('checkpoint_interval_segments', DEFAULT_CHECKPOINT_INTERVAL_SEGMENTS))
+        # Where checkpoints without a workspace of their own live: on disk, or in RAM to spare the disk round-trips.
+        self.work_dir = self._resolve_work_dir(tts_settings.get('workspace_storage', 'disk'))
+        # Checkpoints of runs nobody resumed are removed after this long (0 keeps them).
+        self.checkpoint_retention_seconds = max(float(tts_settings.get('checkpoint_retention_hours', DEFAULT_CHECKPOINT_RETENTION_HOURS)), 0.0) * 3600
+        # Model passes concurrent jobs may run at once on the shared in-process pipeline (see audio.dispatch).
+        self.synthesis_slots = max(int(tts_settings.get('synthesis_slots', DEFAULT_SYNTHESIS_SLOTS)), 1)
+        # Fetch every configured voice into the local store during warm-up (see preload.py).
+        self.preload_voices_on_startup = bool(tts_settings.get('preload_voices_on_startup', False))
+        self.segment_cache: SegmentCache = get_segment_cache(
+            SEGMENT_CACHE_DIR,
+            int(tts_settings.get('segment_cache_max_bytes', DEFAULT_SEGMENT_CACHE_MAX_BYTES))
+        )
+        # Finished audiobooks, so an identical request is answered without synthesizing again.
+        self.output_cache: OutputCache = get_output_cache(
+            OUTPUT_CACHE_DIR,
+            int(tts_settings.get('output_cache_max_bytes', DEFAULT_OUTPUT_CACHE_MAX_BYTES))
+        )
+        # Phonemes of every segment, shared by all jobs, worker processes and restarts.
+        self.g2p_cache_limits = (
+            int(tts_settings.get('g2p_cache_memory_entries', DEFAULT_G2P_CACHE_MEMORY_ENTRIES)),
+            int(tts_settings.get('g2p_cache_max_entries', DEFAULT_G2P_CACHE_MAX_ENTRIES))
+        )
+        self.g2p_cache: G2PCache = get_g2p_cache(G2P_CACHE_PATH, *self.g2p_cache_limits)
+        # 'torch' runs Kokoro's own model; 'onnx' runs an exported graph on ONNX Runtime (see export_onnx.py).
+        self.backend: TTSBackend = create_backend(
+            tts_settings.get('backend', DEFAULT_BACKEND),
+            tts_settings.get('onnx_model_path', DEFAULT_ONNX_MODEL_PATH)
+        )
+        self.model_id = self.backend.model_id(KOKORO_REPO_ID)
+        # Pipelines are shared with every other engine instance through the pool, so creating
+        # a Kokoro_TTS for a language that was used recently does not reload anything.
+        self.pipeline_pool = get_pipeline_pool(
+            KOKORO_REPO_ID,
+            int(tts_settings.get('pipeline_pool_size', DEFAULT_PIPELINE_POOL_SIZE)),
+            int(tts_settings.get('pipeline_pool_max_bytes', DEFAULT_PIPELINE_POOL_MAX_BYTES)),
+            self.backend
+        )
 
-        self.pipeline: Optional[KPipeline] = None
+        self.pipeline: Optional["KPipeline"] = pipeline
 
-        if self.lang_code and self.voice:
+        if self.pipeline is not None:
+            logger.info(f"TTS initialized with a pre-built pipeline: lang='{self.lang_code}', voice='{self.voice}', format='{self.output_format}'")
+        elif self.num_workers > 1:
+            logger.info(f"TTS configured for {self.num_workers} synthesis worker processes; the in-process pipeline will only be loaded if needed.")
+        elif not load_pipeline:
+            logger.info(f"TTS configured: lang='{self.lang_code}', voice='{self.voice}'; the pipeline will be loaded in the background or on first use.")
+        elif self.lang_code and self.voice:
             try:
                 self.pipeline = self._initialize_pipeline()
                 logger.info(f"TTS initialized: lang='{self.lang_code}', voice='{self.voice}', speed='{self.speed}', device='{self.device}', format='{self.output_format}'")
@@ -52,16 +190,30 @@ class Kokoro_TTS:
         else:
             logger.warning("TTS pipeline not auto-initialized in __init__: lang_code or voice is missing. Configure settings or expect errors during processing.")
 
-    def _initialize_pipeline(self) -> KPipeline:
-        if not self.lang_code or not self.voice:
+        if watch_settings:
+            json_handler.subscribe(self._on_settings_changed, SETTINGS_PREFIX)
+
+    def _on_settings_changed(self, changes: dict):
+        updates = {}
+        for key_path, value in changes.items():
+            name = key_path[len(SETTINGS_PREFIX) + 1:]
+            if name not in LIVE_SETTINGS:
+                logger.info(f"Setting '{key_path}' changed; it takes effect after a restart.")
+            elif value is not None and value != getattr(self, name):
+                updates[name] = value
+        if updates:
+            logger.info(f"Applying changed settings to the TTS engine: {updates}")
+            self.apply_settings(**updates)
+
+    def _initialize_pipeline(self, lang_code: Optional[str] = None, device: Optional[str] = None) -> "KPipeline":
+        lang_code = lang_code or self.lang_code
+        device = device or self.device
+        if not lang_code or not self.voice:
              logger.error("Cannot initialize pipeline: lang_code or voice is not set.")
              raise RuntimeError("TTS Pipeline initialization failed: lang_code or voice missing.")
         try:
-            logger.info(f"Initializing KokoroTTS pipeline (repo='{KOKORO_REPO_ID}', lang='{self.lang_code}', device='{self.device}')...")
-            start_time = time.time()
-            pipeline = KPipeline(repo_id=KOKORO_REPO_ID, lang_code=self.lang_code, device=self.device)
-            end_time = time.time()
-            logger.info(f"KokoroTTS pipeline initialized successfully in {end_time - start_time:.2f} seconds.")
+            pipeline = self.pipeline_pool.get(lang_code, device)
+            install_g2p_cache(pipeline, self.g2p_cache)
             return pipeline
         except ImportError:
             logger.critical('Fatal: KPipeline could not be imported. Ensure "kokoro" library is installed.', exc_info=True)
@@ -70,117 +222,433 @@ class Kokoro_TTS:
             logger.critical(f'Fatal: Failed to initialize KokoroTTS pipeline: {e}', exc_info=True)
             raise RuntimeError(f"TTS Pipeline initialization failed: {e}") from e
 
-    def process_audio(self, input_text: str, base_file_name: str, progress_callback: Optional[Callable[[int, int, str], None]] = None) -> Optional[str]:
-        base_file_name = os.path.basename(base_file_name)
+    def current_settings(self) -> SynthesisSettings:
+        return SynthesisSettings(self.lang_code, self.voice, self.speed, self.device)
+
+    @staticmethod
+    def _validate_output_format(output_format: str) -> str:
+        output_format = str(output_format).lower()
+        if output_format not in OUTPUT_FORMATS:
+            logger.warning(f"Unsupported output format '{output_format}' in settings; falling back to '{DEFAULT_OUTPUT_FORMAT}'. Supported: {', '.join(OUTPUT_FORMATS)}")
+            return DEFAULT_OUTPUT_FORMAT
+        return output_format
+
+    @staticmethod
+    def _resolve_work_dir(workspace_storage: str) -> str:
+        workspace_storage = str(workspace_storage).lower()
+        if workspace_storage not in WORKSPACE_STORAGES:
+            logger.warning(f"Unsupported workspace storage '{workspace_storage}' in settings; falling back to 'disk'. Supported: {', '.join(WORKSPACE_STORAGES)}")
+            return WORK_DIR
+        if workspace_storage == 'memory':
+            if os.path.isdir(RAM_FS_DIR):
+                return MEMORY_WORK_DIR
+            logger.warning(f"No RAM-backed filesystem at '{RAM_FS_DIR}'; keeping checkpoints on disk in '{WORK_DIR}'.")
+        return WORK_DIR
+
+    def apply_settings(self,
+                       lang_code: Optional[str] = None,
+                       voice: Optional[str] = None,
+                       speed: Optional[float] = None,
+                       device: Optional[str] = None,
+                       output_format: Optional[str] = None,
+                       bitrate_kbps: Optional[int] = None):
+        """
+        Switches voice settings in place. Voice, speed and output format changes take effect
+        immediately; a language or device change fetches the matching pipeline from the pool,
+        which is only loaded if it is not already warm.
+        """
+        previous = self.current_settings()
+        if output_format is not None:
+            self.output_format = self._validate_output_format(output_format)
+        if bitrate_kbps is not None:
+            self.bitrate_kbps = int(bitrate_kbps)
+        self.lang_code = lang_code if lang_code is not None else self.lang_code
+        self.voice = voice if voice is not None else self.voice
+        self.speed = float(speed) if speed is not None else self.speed
+        self.device = device if device is not None else self.device
+
+        if self.num_workers > 1 or not self.lang_code or not self.voice:
+            logger.info(f"TTS settings applied: lang='{self.lang_code}', voice='{self.voice}', speed='{self.speed}', device='{self.device}'")
+            return
+        if self.pipeline is None or (self.lang_code, self.device) != (previous.lang_code, previous.device):
+            self.pipeline = self._initialize_pipeline()
+        if self.voice != previous.voice:
+            self.pipeline.load_voice(self.voice) # Cached by the pipeline, so later switches back are free
+        logger.info(f"TTS settings applied: lang='{self.lang_code}', voice='{self.voice}', speed='{self.speed}', device='{self.device}'")
 
-        if not self.pipeline:
-            logger.warning("TTS pipeline was not initialized. Attempting to initialize now for processing.")
-            if self.lang_code and self.voice:
+    def _ensure_pipeline(self, settings: SynthesisSettings, base_file_name: str) -> "KPipeline":
+        if (settings.lang_code, settings.device) != (self.lang_code, self.device) or not self.pipeline:
+            if not self.pipeline:
+                logger.warning("TTS pipeline was not initialized. Attempting to initialize now for processing.")
+            if settings.lang_code and settings.voice:
                 try:
-                    self.pipeline = self._initialize_pipeline()
-                    logger.info("TTS pipeline successfully re-initialized for processing.")
+                    pipeline = self._initialize_pipeline(settings.lang_code, settings.device)
                 except RuntimeError as e:
-                    logger.error(f"Failed to re-initialize TTS pipeline for '{base_file_name}': {e}")
+                    logger.error(f"Failed to initialize TTS pipeline for '{base_file_name}': {e}")
                     raise # Re-raise, as processing cannot continue without a pipeline
+                if (settings.lang_code, settings.device) == (self.lang_code, self.device):
+                    self.pipeline = pipeline
+                return pipeline
             else:
                 logger.error(f"Cannot initialize TTS pipeline for '{base_file_name}': lang_code or voice is missing.")
                 raise RuntimeError("TTS pipeline cannot be initialized due to missing settings (lang_code, voice).")
+        return self.pipeline
 
-        if not input_text or input_text.isspace():
-            logger.warning(f"Input text for '{base_file_name}' is empty or whitespace. Skipping audio generation.")
-            return None
+    def warm_up(self) -> bool:
+        """
+        Loads the pipeline (or starts the synthesis workers) for the current settings and runs
+        a short throwaway synthesis, so the first real request does not pay for model loading
+        and first-inference setup. Returns False if warming up failed; the error is logged
+        and the next request will try to load the pipeline again.
+        """
+        settings = self.current_settings()
+        if not settings.lang_code or not settings.voice:
+            logger.warning("Skipping TTS warm-up: lang_code or voice is not set.")
+            return False
+        start_time = time.perf_counter()
+        try:
+            if self.preload_voices_on_startup:
+                self.preload_voices()
+            if self.num_workers > 1:
+                with lease_worker_pool(KOKORO_REPO_ID, settings.lang_code, settings.device, self.num_workers, self.torch_threads_per_worker,
+                                       self.worker_batch_size, self.g2p_cache_limits, self.backend) as pool:
+                    pool.warm_up(WARM_UP_TEXT, settings.voice, settings.speed)
+            else:
+                pipeline = self._ensure_pipeline(settings, 'warm-up')
+                load_seconds = time.perf_counter() - start_time
+                logger.info(f"TTS pipeline ready after {load_seconds:.2f} seconds; running warm-up synthesis.")
+                # Bypasses the segment cache, which would otherwise skip the synthesis after the first start.
+                with synthesis_turn(pipeline, self.synthesis_slots):
+                    synthesize_segment(pipeline, WARM_UP_TEXT, settings.voice, settings.speed)
+        except Exception as e:
+            logger.error(f"TTS warm-up failed: {e}", exc_info=True)
+            return False
+        warm_up_seconds = time.perf_counter() - start_time
+        metrics.STAGE_DURATION.observe(warm_up_seconds, stage='warm_up')
+        logger.info(f"TTS warm-up finished in {warm_up_seconds:.2f} seconds (lang='{settings.lang_code}', voice='{settings.voice}', device='{settings.device}').")
+        return True
 
-        chunk_output_dir = os.path.join(OUTPUTS_DIR, base_file_name + "_chunks")
-        os.makedirs(chunk_output_dir, exist_ok=True)
-        logger.debug(f"Chunk output directory for '{base_file_name}': {chunk_output_dir}")
-        
-        audio_output_paths: List[str] = []
-        split_pattern = r'(?<!\w\.\w.)(?<![A-Z][a-z]\.)(?<=\.|\?|\!|։|۔|。)\s'
-        
-        segments = re.split(split_pattern, input_text)
-        # Filter out empty strings that can result from re.split and strip whitespace
-        filtered_segments = [seg.strip() for seg in segments if seg and seg.strip()]
-
-        total_chunks_estimate = len(filtered_segments)
-        if total_chunks_estimate == 0 and input_text and input_text.strip():
-            # If splitting yields nothing for genuinely non-empty text, assume it's one large chunk.
-            total_chunks_estimate = 1
-        
-        # Ensure total_chunks_estimate is at least 1 for progress calculation if there's any text
-        current_progress_total_chunks = max(total_chunks_estimate, 1)
+    def preload_voices(self) -> bool:
+        """Fetches the model and every configured voice into the local voice store. Returns False if any file is missing."""
+        summary = get_voice_store(KOKORO_REPO_ID).preload(configured_voices())
+        if summary['failed']:
+            logger.warning(f"Voice store is incomplete, missing: {', '.join(summary['failed'])}")
+            return False
+        logger.info(f"Voice store ready: {len(summary['downloaded'])} files fetched, {len(summary['present'])} already present.")
+        return True
 
+    def start_warm_up(self) -> threading.Thread:
+        """Runs warm_up() in a background thread and returns the thread."""
+        thread = threading.Thread(target=self.warm_up, name="tts-warm-up", daemon=True)
+        thread.start()
+        return thread
 
-        try:
-            generator = self.pipeline(
-                text=input_text,
-                voice=self.voice,
-                speed=self.speed,
-                split_pattern=split_pattern
-            )
-            
-            generated_chunk_count = 0
-            for i, (_gs, _ps, audio_data) in enumerate(generator):
-                generated_chunk_count += 1
-                chunk_file_name = f"chunk_{generated_chunk_count:04d}.wav"
-                chunk_file_path = os.path.join(chunk_output_dir, chunk_file_name)
-                
-                sf.write(chunk_file_path, audio_data, self.sample_rate)
-                audio_output_paths.append(chunk_file_path)
-                
-                if progress_callback:
-                    progress_callback(generated_chunk_count, current_progress_total_chunks, f"Generating audio chunk {generated_chunk_count}/{current_progress_total_chunks}")
-            
-            if not audio_output_paths:
-                logger.warning(f"No audio chunks generated for '{base_file_name}'. Text might be unsuitable or too short for the TTS.")
+    def process_audio(self,
+                      input_text: Union[str, Iterable[str]],
+                      base_file_name: str,
+                      progress_callback: Optional[Callable[[int, int, str], None]] = None,
+                      settings: Optional[SynthesisSettings] = None,
+                      chunk_callback: Optional[Callable[[np.ndarray], None]] = None,
+                      output_dir: str = OUTPUTS_DIR,
+                      timings: Optional[StageTimings] = None,
+                      cancel_event: Optional[threading.Event] = None,
+                      checkpoint: Optional[SegmentCheckpoint] = None,
+                      interrupt_event: Optional[threading.Event] = None) -> Optional[str]:
+        """
+        Synthesizes input_text into <output_dir>/<base_file_name>.<format> and returns the path.
+        input_text may also be an iterable of text pieces (see FileReader.iter_file); it is then
+        read and segmented in a background thread while earlier segments are being synthesized.
+        If chunk_callback is given, it receives each segment's audio as soon as it has been
+        written, which lets callers stream playback before the whole book is done.
+        The split, synthesis, chunk_write and export stages are recorded in timings (if given)
+        and published to utils.metrics. Setting cancel_event stops the job after the current
+        segment and raises SynthesisCancelled. Setting interrupt_event (e.g. on shutdown) stops
+        it the same way but raises SynthesisInterrupted and keeps the checkpoint.
+        With a checkpoint (see create_checkpoint), finished segments are recorded as they are
+        written. If the same input was interrupted before, its finished segments are replayed
+        from the checkpoint and synthesis continues with the first unfinished one.
+        """
+        timings = timings if timings is not None else StageTimings()
+        start_time = time.perf_counter()
+        base_file_name = os.path.basename(base_file_name)
+        # Settings are captured once so a concurrent apply_settings() cannot change the voice mid-book.
+        settings = settings or self.current_settings()
+
+        pipeline = None
+        if self.num_workers <= 1:
+            pipeline = self._ensure_pipeline(settings, base_file_name)
+        elif not settings.lang_code or not settings.voice:
+            logger.error(f"Cannot start synthesis workers for '{base_file_name}': lang_code or voice is missing.")
+            raise RuntimeError("TTS synthesis workers cannot be started due to missing settings (lang_code, voice).")
+
+        segmenter = self.create_segmenter()
+        segment_stream = None
+        if isinstance(input_text, str):
+            if not input_text or input_text.isspace():
+                logger.warning(f"Input text for '{base_file_name}' is empty or whitespace. Skipping audio generation.")
                 return None
+            with timings.measure('split'):
+                segments = segment_list = segmenter.split(input_text)
+        else:
+            segment_stream = PrefetchIterator(segmenter.iter_segments(input_text), maxsize=self.segment_queue_size, name=f"segments-{base_file_name}")
+            segments = segment_stream
+
+        def total_segments() -> int:
+            # While the document is still being read the total is unknown; 0 makes the progress indeterminate.
+            if segment_stream is None:
+                return len(segment_list)
+            return segment_stream.produced if segment_stream.done else 0
+
+        resume_from = 0
+        if checkpoint is not None:
+            try:
+                resume_from = checkpoint.begin()
+            except (OSError, RuntimeError) as e:
+                logger.warning(f"Checkpointing disabled for '{base_file_name}': {e}")
+                checkpoint = None
+        if resume_from:
+            # Segments are deterministic for the same input, so the finished ones are skipped here.
+            segments = islice(segments, resume_from, None)
+        # Segments are read ahead of their audio, so their paragraph ends wait here in order.
+        paragraph_ends = deque()
+        postprocessor = self.postprocessor
+        if postprocessor.active:
+            segments = self._track_paragraph_ends(segments, paragraph_ends)
 
-            logger.info(f"Generated {len(audio_output_paths)} audio chunks for '{base_file_name}'.")
+        audio_output_path = os.path.join(output_dir, f'{base_file_name}.{self.output_format}')
+        cache_hits_before, cache_misses_before = self.segment_cache.hits, self.segment_cache.misses
+
+        # Each segment is appended to the output file as soon as it is available, so memory stays
+        # flat regardless of book length and no separate combining pass is needed.
+        # Compressed formats are encoded on a background thread while synthesis continues.
+        writer = AudioStreamWriter(audio_output_path, self.sample_rate, output_format=self.output_format, bitrate_kbps=self.bitrate_kbps)
+        try:
+            writer.open()
+            generated_chunk_count = 0
+            if resume_from:
+                for audio_block in checkpoint.iter_audio():
+                    writer.write(audio_block)
+                generated_chunk_count = resume_from
+            # Time spent waiting for the next segment's audio: synthesis, cache reads and,
+            # for streamed input, any wait on the document reader.
+            segment_audio = timings.timed_iter('synthesis', self._iter_segment_audio(segments, settings, pipeline, base_file_name))
+            for index, audio_data in enumerate(segment_audio, start=resume_from + 1):
+                if cancel_event is not None and cancel_event.is_set():
+                    logger.info(f"Audio processing for '{base_file_name}' was cancelled after {index - 1} segments.")
+                    raise SynthesisCancelled(f"Audio processing for '{base_file_name}' was cancelled.")
+                if interrupt_event is not None and interrupt_event.is_set():
+                    logger.info(f"Audio processing for '{base_file_name}' was interrupted after {index - 1} segments.")
+                    raise SynthesisInterrupted(f"Audio processing for '{base_file_name}' was interrupted.")
+                if segment_stream is not None:
+                    metrics.SEGMENT_QUEUE_DEPTH.set(segment_stream.queue_depth)
+                if postprocessor.active:
+                    with timings.measure('postprocess'):
+                        audio_data = postprocessor.process(to_float32_mono(audio_data), paragraph_ends.popleft())
+                with timings.measure('chunk_write'):
+                    frames_written = writer.write(audio_data)
+                if checkpoint is not None:
+                    checkpoint.append(audio_data)
+                if frames_written > 0:
+                    generated_chunk_count += 1
+                    if chunk_callback:
+                        chunk_callback(audio_data)
 
-            # Combine audio chunks
-            combined_audio = AudioSegment.empty()
-            num_chunks_to_combine = len(audio_output_paths)
-            for idx, path in enumerate(audio_output_paths):
                 if progress_callback:
-                    progress_callback(idx + 1, num_chunks_to_combine, f"Combining chunk {idx + 1}/{num_chunks_to_combine}")
-                try:
-                    segment = AudioSegment.from_wav(path)
-                    combined_audio += segment
-                except Exception as e: 
-                    logger.error(f"Error loading audio chunk '{path}' for '{base_file_name}': {e}. Skipping chunk.", exc_info=True)
-                    continue # Skip problematic chunk
-
-            if len(combined_audio) == 0: # All chunks failed or were unsuitable
-                logger.error(f"Combined audio for '{base_file_name}' is empty. All chunks might have failed processing or were unsuitable.")
+                    total = total_segments()
+                    if total:
+                        progress_callback(index, total, f"Generating audio chunk {index}/{total}")
+                    else:
+                        progress_callback(index, 0, f"Generating audio chunk {index} (still reading document)")
+
+            if generated_chunk_count == 0:
+                logger.warning(f"No audio chunks generated for '{base_file_name}'. Text might be unsuitable or too short for the TTS.")
+                writer.abort()
+                if checkpoint is not None:
+                    checkpoint.discard()
+                    checkpoint = None
                 return None
 
-            final_output_filename = f'{base_file_name}.{self.output_format}' # self.output_format is 'wav'
-            final_output_path = os.path.join(OUTPUTS_DIR, final_output_filename)
-            
-            combined_audio.export(final_output_path, format=self.output_format)
-            logger.info(f"Audiobook '{final_output_path}' generated successfully for '{base_file_name}'.")
-            return final_output_path
+            with timings.measure('export'):
+                writer.close()
+            if checkpoint is not None:
+                checkpoint.discard()
+                checkpoint = None
+            logger.info(f"Audiobook '{audio_output_path}' generated successfully for '{base_file_name}' ({generated_chunk_count} chunks, {writer.duration_seconds:.1f}s of audio).")
+            logger.info(f"Segmentation of '{base_file_name}': {segmenter.stats}.")
+            self._publish_metrics(timings, generated_chunk_count, writer.duration_seconds, time.perf_counter() - start_time)
+            if self.segment_cache.enabled:
+                job_hits = self.segment_cache.hits - cache_hits_before
+                job_misses = self.segment_cache.misses - cache_misses_before
+                metrics.CACHE_REQUESTS.inc(job_hits, cache='segment', result='hit')
+                metrics.CACHE_REQUESTS.inc(job_misses, cache='segment', result='miss')
+                cache_stats = self.segment_cache.stats()
+                logger.info(f"Segment cache for '{base_file_name}': {job_hits} hits, {job_misses} misses. "
+                            f"Lifetime hit rate {cache_stats['hit_rate']:.1%}, {cache_stats['total_bytes'] / (1024 * 1024):.1f} MB in {cache_stats['entries']} entries.")
+            return audio_output_path
 
+        except SynthesisCancelled:
+            writer.abort()
+            if checkpoint is not None:
+                checkpoint.discard()
+                checkpoint = None
+            raise
+        except SynthesisInterrupted:
+            writer.abort() # The checkpoint is released below
+            raise
         except RuntimeError as e:
+            writer.abort()
             logger.error(f"Runtime error during audio processing for '{base_file_name}': {e}", exc_info=True)
             raise
         except Exception as e:
+            writer.abort()
             logger.error(f"Unexpected error during audio processing for '{base_file_name}': {e}", exc_info=True)
             raise RuntimeError(f"Audio processing failed unexpectedly for '{base_file_name}': {e}") from e
         finally:
-            # Clean up individual chunk files and then the directory
-            for path in audio_output_paths:
-                if os.path.exists(path):
+            if segment_stream is not None:
+                segment_stream.close()
+                metrics.SEGMENT_QUEUE_DEPTH.set(0)
+            if checkpoint is not None:
+                # Failed or interrupted: keep what was synthesized so a retry can resume.
+                checkpoint.release()
+
+    @staticmethod
+    def _publish_metrics(timings: StageTimings, segment_count: int, audio_seconds: float, wall_seconds: float):
+        metrics.observe_stages({stage: timing for stage, timing in timings.as_dict().items() if stage in PROCESS_AUDIO_STAGES})
+        metrics.SEGMENTS_TOTAL.inc(segment_count)
+        metrics.AUDIO_SECONDS_TOTAL.inc(audio_seconds)
+        metrics.SYNTHESIS_WALL_SECONDS_TOTAL.inc(wall_seconds)
+        if wall_seconds > 0:
+            metrics.SEGMENTS_PER_SECOND.set(segment_count / wall_seconds)
+            metrics.AUDIO_SECONDS_PER_WALL_SECOND.set(audio_seconds / wall_seconds)
+
+    @staticmethod
+    def _track_paragraph_ends(segments: Iterable[str], paragraph_ends: deque) -> Iterator[str]:
+        for segment_text in segments:
+            paragraph_ends.append(getattr(segment_text, 'paragraph_end', False))
+            yield segment_text
+
+    def create_segmenter(self) -> TextSegmenter:
+        """Returns a fresh segmenter (one per document, as it keeps statistics) with the configured budget."""
+        return TextSegmenter(self.segment_target_chars, self.segment_max_chars)
+
+    def create_checkpoint(self, input_key: str, settings: Optional[SynthesisSettings] = None) -> SegmentCheckpoint:
+        """
+        Returns the checkpoint for synthesizing the input identified by input_key (e.g. a file
+        hash) with the given settings. It lives in the configured work directory
+        (WORK_DIR, or MEMORY_WORK_DIR with workspace_storage 'memory'), named after the key, so
+        running the same input with the same settings again finds it.
+        """
+        settings = settings or self.current_settings()
+        # The checkpoint stores PCM, so it stays valid across output format changes.
+        key = f"{input_key}|{settings.lang_code}|{settings.voice}|{settings.speed:.3f}|{self.sample_rate}|{self.create_segmenter().signature}"
+        if self.model_id != KOKORO_REPO_ID: # Keys of the default backend predate backends; keep them resumable
+            key += f"|{self.model_id}"
+        if self.postprocessor.signature: # The checkpoint holds processed audio
+            key += f"|{self.postprocessor.signature}"
+        if self.packed_batch_size > 1: # Packed audio differs slightly from unpacked
+            key += f"|pack={self.packed_batch_tokens}"
+        maybe_prune_checkpoints(self.work_dir, self.checkpoint_retention_seconds)
+        work_dir = os.path.join(self.work_dir, hashlib.sha256(key.encode('utf-8')).hexdigest()[:24])
+        return SegmentCheckpoint(work_dir, key, self.sample_rate, self.checkpoint_interval_segments)
+
+    def output_key(self, input_key: str, settings: Optional[SynthesisSettings] = None) -> str:
+        """
+        Identifies the audiobook that synthesizing the input identified by input_key (e.g. a
+        file hash) with the given settings produces, for the output cache and for
+        deduplicating concurrent requests.
+        """
+        return hashlib.sha256(f"{input_key}|{self.settings_key(settings)}".encode('utf-8')).hexdigest()
+
+    def settings_key(self, settings: Optional[SynthesisSettings] = None) -> str:
+        """
+        Identifies every setting that affects the audio synthesized from a text, e.g. to tell
+        whether a previously written file is still current: the voice settings and output
+        format in readable form, then a hash of the model, segmentation, packing and
+        post-processing.
+        """
+        settings = settings or self.current_settings()
+        packing = self.packed_batch_tokens if self.packed_batch_size > 1 else 0
+        details = f"{self.model_id}|{self.sample_rate}|{self.create_segmenter().signature}|pack={packing}|{self.postprocessor.signature}"
+        details_hash = hashlib.sha256(details.encode('utf-8')).hexdigest()[:12]
+        return f"{settings.lang_code}|{settings.voice}|{settings.speed:.3f}|{self.output_format}|{self.bitrate_kbps}|{details_hash}"
+
+    def _segment_cache_key(self, segment_text: str, settings: SynthesisSettings) -> str:
+        # Packed audio sounds slightly different, so it is never served to jobs that synthesize unpacked.
+        model_id = f"{self.model_id}|packed" if self.packed_batch_size > 1 else self.model_id
+        return SegmentCache.make_key(segment_text, settings.lang_code, settings.voice, settings.speed, model_id)
+
+    def _iter_segment_audio(self,
+                            segments: Iterable[str],
+                            settings: SynthesisSettings,
+                            pipeline: Optional["KPipeline"],
+                            base_file_name: str) -> Iterator[np.ndarray]:
+        """Yields the audio for each segment in order, from the segment cache when possible."""
+        if self.num_workers <= 1:
+            # Segments are taken in windows so cache misses next to each other can share a
+            # forward pass; the window is small, so streamed input is not held back noticeably.
+            # Concurrent jobs on the same model take turns window by window.
+            segment_iter = iter(segments)
+            max_batch_tokens = self.packed_batch_tokens if self.packed_batch_size > 1 else 0
+            while True:
+                window = list(islice(segment_iter, self.packed_batch_size))
+                if not window:
+                    return
+                cache_keys = [self._segment_cache_key(segment_text, settings) for segment_text in window]
+                window_audio = [self.segment_cache.get(cache_key) for cache_key in cache_keys]
+                misses = [i for i, audio_data in enumerate(window_audio) if audio_data is None]
+                if misses:
+                    with synthesis_turn(pipeline, self.synthesis_slots):
+                        synthesized = synthesize_segments(pipeline, [window[i] for i in misses], settings.voice, settings.speed, max_batch_tokens)
+                    for i, audio_data in zip(misses, synthesized):
+                        self.segment_cache.put(cache_keys[i], audio_data)
+                        window_audio[i] = audio_data
+                yield from window_audio
+
+        # Only cache misses are sent to the worker pool; their results come back in order and
+        # are interleaved with the cached segments here. Segments are looked up lazily, so this
+        # also works when they are still being produced by the document reader.
+        entries = deque() # (index, text, cache_key, cached) in document order
+        results = {}
+
+        def feed_misses():
+            for index, segment_text in enumerate(segments):
+                cache_key = self._segment_cache_key(segment_text, settings)
+                cached = self.segment_cache.contains(cache_key)
+                entries.append((index, segment_text, cache_key, cached))
+                if not cached:
+                    yield index, segment_text
+
+        with lease_worker_pool(KOKORO_REPO_ID, settings.lang_code, settings.device, self.num_workers, self.torch_threads_per_worker,
+                               self.worker_batch_size, self.g2p_cache_limits, self.backend) as pool:
+            pending = pool.imap_ordered(feed_misses(), settings.voice, settings.speed, self.packed_batch_tokens if self.packed_batch_size > 1 else 0)
+            pending_exhausted = False
+            while True:
+                if not entries:
+                    if pending_exhausted:
+                        return
+                    # Pulling a result makes the pool read ahead, which fills `entries`.
                     try:
-                        os.remove(path)
-                    except OSError as e_rm:
-                        logger.warning(f"Could not remove chunk file {path} for '{base_file_name}': {e_rm}")
-            
-            if os.path.exists(chunk_output_dir):
-                try:
-                    if not os.listdir(chunk_output_dir): # Check if directory is empty
-                         os.rmdir(chunk_output_dir)
-                         logger.debug(f"Successfully removed empty chunk directory: {chunk_output_dir}")
-                    else:
-                        logger.warning(f"Chunk directory {chunk_output_dir} for '{base_file_name}' was not empty after processing known chunks. Not removing. Contents: {os.listdir(chunk_output_dir)}")
-                except OSError as e_rmdir:
-                    logger.warning(f"Could not remove chunk directory {chunk_output_dir} for '{base_file_name}': {e_rmdir}")
\ No newline at end of file
+                        result_index, audio_data = next(pending)
+                        results[result_index] = audio_data
+                    except StopIteration:
+                        pending_exhausted = True
+                    continue
+
+                index, segment_text, cache_key, cached = entries.popleft()
+                if cached:
+                    audio_data = self.segment_cache.get(cache_key)
+                    if audio_data is not None:
+                        yield audio_data
+                        continue
+                    # Evicted since the lookup above; synthesize it locally.
+                    pipeline = pipeline or self._ensure_pipeline(settings, base_file_name)
+                    with synthesis_turn(pipeline, self.synthesis_slots):
+                        audio_data = synthesize_segment(pipeline, segment_text, settings.voice, settings.speed)
+                else:
+                    self.segment_cache.record_miss()
+                    if index not in results:
+                        result_index, audio_data = next(pending)
+                        results[result_index] = audio_data
+                    audio_data = results.pop(index)
+                self.segment_cache.put(cache_key, audio_data)
+                yield audio_data
@@ -0,0 +1,165 @@
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+from loguru import logger
+import utils.metrics as metrics
+
+
+def _copy_atomic(source_path: str, target_path: str):
+    """Places a copy of source_path's content at target_path atomically."""
+    target_dir = os.path.dirname(target_path)
+    if target_dir:
+        os.makedirs(target_dir, exist_ok=True)
+    tmp_path = f"{target_path}.{threading.get_ident()}.tmp"
+    try:
+        shutil.copyfile(source_path, tmp_path)
+        os.replace(tmp_path, target_path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class OutputCache:
+    """
+    On-disk cache of finished audiobooks, keyed by input content and every setting that
+    affects the output (see Kokoro_TTS.output_key).
+
+    put() moves the finished file into the cache (cache_dir/<key>/<file name>) instead of
+    copying it, and hits are served straight from there, so every audiobook is stored
+    once no matter how often it is requested, and evicting an entry frees its size on
+    disk. A file is only copied if it cannot be moved, e.g. across file systems. The
+    entries' total size is kept under max_bytes by evicting the least recently used ones;
+    mtimes are refreshed on hits so the LRU order survives restarts. Files outside
+    cache_dir are never removed.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max(int(max_bytes), 0)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict() # key -> (path relative to cache_dir, size), oldest first
+        self._total_bytes = 0
+        if self.enabled:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._load_index()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _load_index(self):
+        found = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_dir():
+                files = [f for f in os.scandir(entry.path) if f.is_file() and not f.name.endswith('.tmp')]
+                if not files:
+                    continue
+                key, file_entry = entry.name, files[0]
+            elif entry.name.endswith('.tmp'):
+                continue
+            else: # Flat <key>.<ext> entries of earlier versions
+                key, file_entry = os.path.splitext(entry.name)[0], entry
+            stat = file_entry.stat()
+            found.append((stat.st_mtime, key, os.path.relpath(file_entry.path, self.cache_dir), stat.st_size))
+        for _mtime, key, relative_path, size in sorted(found):
+            self._entries[key] = (relative_path, size)
+            self._total_bytes += size
+        logger.info(f"Output cache at '{self.cache_dir}': {len(self._entries)} audiobooks, {self._total_bytes / (1024 * 1024):.1f} MB of {self.max_bytes / (1024 * 1024):.1f} MB budget.")
+        with self._lock:
+            self._evict_locked()
+
+    def get(self, key: str) -> Optional[str]:
+        """Returns the path of the cached output for key, or None."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        path = os.path.join(self.cache_dir, entry[0]) if entry else None
+        if path is not None:
+            try:
+                os.utime(path, None)
+            except OSError as e:
+                logger.warning(f"Dropping missing output cache entry '{path}': {e}")
+                self._discard(key)
+                path = None
+        metrics.CACHE_REQUESTS.inc(cache='output', result='miss' if path is None else 'hit')
+        return path
+
+    def put(self, key: str, output_path: str) -> Optional[str]:
+        """
+        Moves the finished output_path into the cache and returns its new path, or None if
+        the cache is disabled or the file could not be added (output_path is then left as is).
+        """
+        if not self.enabled or not os.path.exists(output_path):
+            return None
+        if os.path.getsize(output_path) > self.max_bytes:
+            return None # Would be evicted right away
+        relative_path = os.path.join(key, os.path.basename(output_path))
+        path = os.path.join(self.cache_dir, relative_path)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            try:
+                os.replace(output_path, path)
+            except OSError:
+                _copy_atomic(output_path, path) # Different file system
+                os.remove(output_path)
+            size = os.path.getsize(path)
+        except OSError as e:
+            logger.warning(f"Could not add '{output_path}' to the output cache: {e}")
+            return None
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            self._total_bytes += size - (previous[1] if previous else 0)
+            self._entries[key] = (relative_path, size)
+            self._evict_locked()
+        if previous and previous[0] != relative_path:
+            self._remove_file(previous[0])
+        return path
+
+    def _discard(self, key: str):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return
+            self._total_bytes -= entry[1]
+        self._remove_file(entry[0])
+
+    def _remove_file(self, relative_path: str):
+        try:
+            os.remove(os.path.join(self.cache_dir, relative_path))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not remove output cache entry '{relative_path}': {e}")
+            return
+        if os.path.dirname(relative_path):
+            try:
+                os.rmdir(os.path.join(self.cache_dir, os.path.dirname(relative_path)))
+            except OSError:
+                pass
+
+    def _evict_locked(self):
+        while self._total_bytes > self.max_bytes and self._entries:
+            key, (relative_path, size) = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self._remove_file(relative_path)
+            logger.debug(f"Evicted audiobook '{relative_path}' from the output cache.")
+
+
+_shared_caches: Dict[str, OutputCache] = {}
+_shared_caches_lock = threading.Lock()
+
+
+def get_output_cache(cache_dir: str, max_bytes: int) -> OutputCache:
+    """Returns the process-wide cache for cache_dir so engines re-created on settings changes share one index."""
+    with _shared_caches_lock:
+        cache = _shared_caches.get(cache_dir)
+        if cache is None or cache.max_bytes != max(int(max_bytes), 0):
+            cache = OutputCache(cache_dir, max_bytes)
+            _shared_caches[cache_dir] = cache
+        return cache
@@ -0,0 +1,170 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+import numpy as np
+from loguru import logger
+
+CACHE_FILE_SUFFIX = '.npy'
+
+
+class SegmentCache:
+    """
+    Content-addressed on-disk cache of synthesized segment audio.
+
+    Entries are float32 .npy files named after a hash of the segment text and the
+    voice settings. The total size is kept under max_bytes by evicting the least
+    recently used entries; file mtimes are refreshed on hits so the LRU order
+    survives restarts.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max(int(max_bytes), 0)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # key -> size in bytes, oldest first
+        self._total_bytes = 0
+        if self.enabled:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._load_index()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    @staticmethod
+    def make_key(text: str, lang_code: str, voice: str, speed: float, model_id: str = '') -> str:
+        key_source = '\0'.join([model_id, lang_code or '', voice or '', f"{float(speed):.3f}", text])
+        return hashlib.sha256(key_source.encode('utf-8')).hexdigest()
+
+    def _path_for(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + CACHE_FILE_SUFFIX)
+
+    def _load_index(self):
+        found = []
+        for root, _dirs, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(CACHE_FILE_SUFFIX):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                found.append((stat.st_mtime, name[:-len(CACHE_FILE_SUFFIX)], stat.st_size))
+        for _mtime, key, size in sorted(found):
+            self._entries[key] = size
+            self._total_bytes += size
+        logger.info(f"Segment cache at '{self.cache_dir}': {len(self._entries)} entries, {self._total_bytes / (1024 * 1024):.1f} MB of {self.max_bytes / (1024 * 1024):.1f} MB budget.")
+        with self._lock:
+            self._evict_locked()
+
+    def contains(self, key: str) -> bool:
+        """Checks for an entry without loading it or touching the hit/miss counters."""
+        if not self.enabled:
+            return False
+        with self._lock:
+            return key in self._entries
+
+    def record_miss(self):
+        """Counts a miss that was determined via contains() rather than get()."""
+        with self._lock:
+            self.misses += 1
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            known = key in self._entries
+            if known:
+                self._entries.move_to_end(key)
+        path = self._path_for(key)
+        if known:
+            try:
+                audio = np.load(path, allow_pickle=False)
+                os.utime(path, None)
+                with self._lock:
+                    self.hits += 1
+                return audio
+            except (OSError, ValueError) as e:
+                logger.warning(f"Dropping unreadable segment cache entry '{path}': {e}")
+                self._discard(key)
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, audio: np.ndarray):
+        if not self.enabled or audio is None or audio.size == 0:
+            return
+        path = self._path_for(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                np.save(f, np.asarray(audio, dtype=np.float32), allow_pickle=False)
+            os.replace(tmp_path, path)
+            size = os.path.getsize(path)
+        except OSError as e:
+            logger.warning(f"Could not write segment cache entry '{path}': {e}")
+            if os.path.exists(tmp_path):
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+            return
+        with self._lock:
+            self._total_bytes += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._evict_locked()
+
+    def _discard(self, key: str):
+        with self._lock:
+            self._total_bytes -= self._entries.pop(key, 0)
+        try:
+            os.remove(self._path_for(key))
+        except OSError:
+            pass
+
+    def _evict_locked(self):
+        evicted = 0
+        while self._total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(self._path_for(key))
+            except OSError as e:
+                logger.warning(f"Could not evict segment cache entry '{key}': {e}")
+            evicted += 1
+        if evicted:
+            logger.debug(f"Segment cache evicted {evicted} entries; now {self._total_bytes / (1024 * 1024):.1f} MB.")
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'total_bytes': self._total_bytes,
+            }
+
+
+_shared_caches: Dict[str, SegmentCache] = {}
+_shared_caches_lock = threading.Lock()
+
+
+def get_segment_cache(cache_dir: str, max_bytes: int) -> SegmentCache:
+    """Returns the process-wide cache for cache_dir so engines re-created on settings changes share one index."""
+    with _shared_caches_lock:
+        cache = _shared_caches.get(cache_dir)
+        if cache is None or cache.max_bytes != max(int(max_bytes), 0):
+            cache = SegmentCache(cache_dir, max_bytes)
+            _shared_caches[cache_dir] = cache
+        return cache
@@ -0,0 +1,186 @@
+import os
+import queue
+import threading
+from typing import Dict, NamedTuple, Optional
+import numpy as np
+import soundfile as sf
+from loguru import logger
+
+
+def to_float32_mono(audio_data) -> np.ndarray:
+    """Converts a chunk yielded by the TTS pipeline (torch tensor or array) to a flat float32 array."""
+    if audio_data is None:
+        return np.zeros(0, dtype=np.float32)
+    if hasattr(audio_data, 'detach'):  # torch.Tensor
+        audio_data = audio_data.detach().cpu().numpy()
+    return np.asarray(audio_data, dtype=np.float32).reshape(-1)
+
+
+def float_to_pcm16(audio_data) -> np.ndarray:
+    """Converts float audio in [-1, 1] to 16-bit PCM, e.g. for streaming previews."""
+    samples = to_float32_mono(audio_data)
+    return (np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16)
+
+
+class OutputFormat(NamedTuple):
+    container: str
+    subtype: str
+    # Bitrate range (kbps) the encoder maps compression_level onto; None for lossless formats.
+    bitrate_range_kbps: Optional[tuple] = None
+
+
+# Output formats selectable through settings.kokoro_tts.output_format, keyed by file extension.
+OUTPUT_FORMATS: Dict[str, OutputFormat] = {
+    'wav': OutputFormat('WAV', 'PCM_16'),
+    'flac': OutputFormat('FLAC', 'PCM_16'),
+    'opus': OutputFormat('OGG', 'OPUS', (6, 256)),
+    'mp3': OutputFormat('MP3', 'MPEG_LAYER_III', (8, 160)),
+}
+
+_END_OF_STREAM = object()
+
+
+def compression_level_for_bitrate(output_format: str, bitrate_kbps: Optional[int]) -> Optional[float]:
+    """
+    Translates a target bitrate into libsndfile's compression_level (0 = highest bitrate).
+    libsndfile maps the level linearly onto the encoder's bitrate range, so this is exact
+    for MP3 (then rounded to the nearest valid MPEG bitrate) and close for Opus.
+    """
+    spec = OUTPUT_FORMATS[output_format]
+    if not bitrate_kbps or spec.bitrate_range_kbps is None:
+        return None
+    low, high = spec.bitrate_range_kbps
+    level = (high - float(bitrate_kbps)) / (high - low)
+    return min(max(level, 0.0), 0.9)
+
+
+class AudioStreamWriter:
+    """
+    Appends audio chunks to a single output file as they are produced.
+
+    Data goes to a '<output>.<writer>.part' file that is moved into place on close(),
+    so the final path never points at a half-written audiobook, and two writers
+    targeting the same path never write into the same file.
+
+    Compressed formats (see OUTPUT_FORMATS) are encoded in a background thread fed
+    through a bounded queue, so encoding overlaps with synthesis instead of adding to
+    it. Encoder errors are re-raised by the next write() or by close().
+    """
+
+    def __init__(self, output_path: str, sample_rate: int, output_format: str = 'wav',
+                 subtype: Optional[str] = None, bitrate_kbps: Optional[int] = None,
+                 background: Optional[bool] = None, queue_chunks: int = 64):
+        output_format = output_format.lower()
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unsupported output format '{output_format}'. Supported formats: {', '.join(OUTPUT_FORMATS)}")
+        self.output_path = output_path
+        self.partial_path = f"{output_path}.{os.getpid()}-{id(self):x}.part"
+        self.sample_rate = sample_rate
+        self.output_format = output_format
+        self.subtype = subtype or OUTPUT_FORMATS[output_format].subtype
+        self.bitrate_kbps = bitrate_kbps
+        # Plain PCM is cheap enough to write inline; everything else gets an encoder thread.
+        self.background = output_format != 'wav' if background is None else background
+        self.frames_written = 0
+        self._sound_file: Optional[sf.SoundFile] = None
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(int(queue_chunks), 1))
+        self._encoder_thread: Optional[threading.Thread] = None
+        self._encoder_error: Optional[BaseException] = None
+
+    @property
+    def duration_seconds(self) -> float:
+        return self.frames_written / self.sample_rate if self.sample_rate else 0.0
+
+    def open(self) -> 'AudioStreamWriter':
+        output_dir = os.path.dirname(self.output_path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        self._sound_file = sf.SoundFile(
+            self.partial_path,
+            mode='w',
+            samplerate=self.sample_rate,
+            channels=1,
+            format=OUTPUT_FORMATS[self.output_format].container,
+            subtype=self.subtype,
+            compression_level=compression_level_for_bitrate(self.output_format, self.bitrate_kbps)
+        )
+        if self.background:
+            self._encoder_thread = threading.Thread(target=self._encode_loop, name=f"encoder-{os.path.basename(self.output_path)}", daemon=True)
+            self._encoder_thread.start()
+        bitrate_info = f", {self.bitrate_kbps} kbps" if self.bitrate_kbps and OUTPUT_FORMATS[self.output_format].bitrate_range_kbps else ""
+        logger.debug(f"Opened streaming writer for '{self.output_path}' ({self.output_format}, {self.subtype}{bitrate_info}, {self.sample_rate} Hz)")
+        return self
+
+    def _encode_loop(self):
+        while True:
+            samples = self._queue.get()
+            if samples is _END_OF_STREAM:
+                return
+            if self._encoder_error is not None:
+                continue # Keep draining so the producer never blocks on a dead encoder
+            try:
+                self._sound_file.write(samples)
+            except Exception as e:
+                logger.error(f"Encoder for '{self.output_path}' failed: {e}")
+                self._encoder_error = e
+
+    def _raise_encoder_error(self):
+        if self._encoder_error is not None:
+            raise RuntimeError(f"Encoding '{self.output_path}' failed: {self._encoder_error}") from self._encoder_error
+
+    def _stop_encoder(self):
+        if self._encoder_thread is not None:
+            self._queue.put(_END_OF_STREAM)
+            self._encoder_thread.join()
+            self._encoder_thread = None
+
+    def write(self, audio_data) -> int:
+        """Appends one chunk and returns the number of frames written."""
+        if self._sound_file is None:
+            raise RuntimeError(f"Streaming writer for '{self.output_path}' is not open.")
+        self._raise_encoder_error()
+        samples = to_float32_mono(audio_data)
+        if samples.size == 0:
+            return 0
+        if self._encoder_thread is not None:
+            self._queue.put(samples)
+        else:
+            self._sound_file.write(samples)
+        self.frames_written += samples.size
+        return samples.size
+
+    def close(self) -> str:
+        """Waits for the encoder to catch up, finalizes the file and moves it to the output path."""
+        self._stop_encoder()
+        if self._sound_file is not None:
+            self._sound_file.close()
+            self._sound_file = None
+        self._raise_encoder_error()
+        os.replace(self.partial_path, self.output_path)
+        logger.debug(f"Streaming writer finalized '{self.output_path}' ({self.frames_written} frames, {self.duration_seconds:.1f}s)")
+        return self.output_path
+
+    def abort(self):
+        """Closes and removes the partial file without touching the output path."""
+        self._stop_encoder()
+        if self._sound_file is not None:
+            try:
+                self._sound_file.close()
+            except Exception as e:
+                logger.warning(f"Error closing partial output '{self.partial_path}': {e}")
+            self._sound_file = None
+        if os.path.exists(self.partial_path):
+            try:
+                os.remove(self.partial_path)
+            except OSError as e:
+                logger.warning(f"Could not remove partial output '{self.partial_path}': {e}")
+
+    def __enter__(self) -> 'AudioStreamWriter':
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.abort()
+        elif self._sound_file is not None:
+            self.close()
+        return False
@@ -0,0 +1,123 @@
+from typing import List, Optional
+import numpy as np
+from loguru import logger
+from audio.stream_writer import to_float32_mono
+
+KOKORO_CONTEXT_PHONEMES = 510 # Longest phoneme string Kokoro synthesizes in one forward pass
+NON_ENGLISH_CHUNK_CHARS = 400 # KPipeline splits longer non-English text before phonemizing
+PACK_SEPARATOR = ' ' # Joins packed segments; the model renders it as a short pause
+
+
+def synthesize_segment(pipeline, segment_text: str, voice: str, speed: float) -> np.ndarray:
+    """Runs one already-split segment through a KPipeline and returns its audio as one float32 array."""
+    # The segment is already split, so the pipeline must not split it again.
+    parts = [
+        to_float32_mono(audio_data)
+        for _gs, _ps, audio_data in pipeline(text=segment_text, voice=voice, speed=speed, split_pattern=None)
+    ]
+    if not parts:
+        return np.zeros(0, dtype=np.float32)
+    return np.concatenate(parts)
+
+
+def _supports_packing(pipeline) -> bool:
+    # Packing needs the phonemizer and model behind KPipeline; stand-ins like the benchmark stub lack them.
+    return getattr(pipeline, 'model', None) is not None and hasattr(pipeline, 'g2p') and hasattr(pipeline, 'infer')
+
+
+def _phonemize(pipeline, segment_text: str) -> Optional[str]:
+    """Phonemes of a segment if KPipeline would synthesize it in a single forward pass, else None."""
+    if pipeline.lang_code in 'ab':
+        _, tokens = pipeline.g2p(segment_text)
+        chunks = [ps for _gs, ps, _tks in pipeline.en_tokenize(tokens) if ps]
+    else:
+        if len(segment_text) > NON_ENGLISH_CHUNK_CHARS:
+            return None
+        ps, _ = pipeline.g2p(segment_text)
+        chunks = [ps] if ps else []
+    if len(chunks) != 1 or len(chunks[0]) > KOKORO_CONTEXT_PHONEMES:
+        return None
+    return chunks[0]
+
+
+def _split_packed_audio(audio: np.ndarray, pred_dur, phonemes: List[str], vocab: dict) -> Optional[List[np.ndarray]]:
+    """
+    Cuts the audio of packed segments apart in the middle of each separator's predicted
+    duration. Returns None if the durations cannot be mapped back onto the segments.
+    """
+    if vocab.get(PACK_SEPARATOR) is None:
+        return None
+    durations = np.asarray(pred_dur, dtype=np.int64).reshape(-1)
+    # Token 0 is the start pad; phonemes missing from the vocabulary are dropped by the model.
+    token_index = 1
+    separator_tokens = []
+    for position, ps in enumerate(phonemes):
+        if position:
+            separator_tokens.append(token_index)
+            token_index += 1
+        token_index += sum(1 for p in ps if vocab.get(p) is not None)
+    if token_index + 1 != durations.size or durations.sum() <= 0:
+        return None
+
+    frame_ends = np.cumsum(durations)
+    samples_per_frame = audio.size / frame_ends[-1]
+    cuts = [int(round((frame_ends[t] - durations[t] / 2) * samples_per_frame)) for t in separator_tokens]
+    return [piece.copy() for piece in np.split(audio, cuts)]
+
+
+def _infer(pipeline, phonemes: str, pack, speed: float):
+    return pipeline.infer(pipeline.model, phonemes, pack, speed)
+
+
+def synthesize_segments(pipeline, segment_texts: List[str], voice: str, speed: float, max_batch_tokens: int = 0) -> List[np.ndarray]:
+    """
+    Synthesizes already-split segments and returns their audio in the same order.
+
+    Kokoro runs one phoneme string per forward pass and has no padded batch dimension, so
+    short segments are packed instead: consecutive segments whose phonemes fit into
+    max_batch_tokens together are joined into one string, synthesized in a single pass,
+    and the audio is split back per segment using the model's predicted durations. With
+    max_batch_tokens <= 0, or a pipeline that does not expose its phonemizer, every
+    segment goes through synthesize_segment on its own.
+    """
+    if max_batch_tokens <= 0 or len(segment_texts) < 2 or not _supports_packing(pipeline):
+        return [synthesize_segment(pipeline, text, voice, speed) for text in segment_texts]
+
+    results: List[Optional[np.ndarray]] = [None] * len(segment_texts)
+    pack = pipeline.load_voice(voice).to(pipeline.model.device)
+    group: List[int] = []
+    group_tokens = 0
+    phonemes = [None] * len(segment_texts)
+
+    def flush_group():
+        nonlocal group, group_tokens
+        if len(group) == 1:
+            results[group[0]] = to_float32_mono(_infer(pipeline, phonemes[group[0]], pack, speed).audio)
+        elif group:
+            group_phonemes = [phonemes[i] for i in group]
+            output = _infer(pipeline, PACK_SEPARATOR.join(group_phonemes), pack, speed)
+            pieces = None
+            if output.pred_dur is not None:
+                pieces = _split_packed_audio(to_float32_mono(output.audio), output.pred_dur, group_phonemes, pipeline.model.vocab)
+            if pieces is None:
+                logger.debug(f"Could not split packed audio of {len(group)} segments; synthesizing them one by one.")
+                pieces = [to_float32_mono(_infer(pipeline, ps, pack, speed).audio) for ps in group_phonemes]
+            for i, piece in zip(group, pieces):
+                results[i] = piece
+        group, group_tokens = [], 0
+
+    for i, text in enumerate(segment_texts):
+        phonemes[i] = _phonemize(pipeline, text)
+        if phonemes[i] is None:
+            # Empty or too long for one pass: let KPipeline chunk it as usual.
+            flush_group()
+            results[i] = synthesize_segment(pipeline, text, voice, speed)
+            continue
+        tokens = len(phonemes[i]) + (len(PACK_SEPARATOR) if group else 0)
+        if group and group_tokens + tokens > min(max_batch_tokens, KOKORO_CONTEXT_PHONEMES):
+            flush_group()
+            tokens = len(phonemes[i])
+        group.append(i)
+        group_tokens += tokens
+    flush_group()
+    return results
@@ -0,0 +1,175 @@
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from loguru import logger
+import utils.json_handler as jh
+from utils.constants import MODELS_DIR
+
+CONFIG_FILE_NAME = 'config.json'
+VOICES_SUBDIR = 'voices'
+
+json_handler = jh.JsonHandler()
+
+
+class VoiceStore:
+    """
+    Local copy of a Kokoro repository's model and voice files.
+
+    preload() fetches them from the Hugging Face hub once; afterwards pipelines attached
+    to the store load everything from disk without any hub lookups. Voice tensors are
+    memory-mapped and shared by every pipeline in the process, so a voice switch costs a
+    dictionary lookup, and worker processes mapping the same files share their pages.
+    With offline=True the hub is never contacted: missing files are an error instead of a
+    download.
+    """
+
+    def __init__(self, repo_id: str, store_dir: str = MODELS_DIR, offline: bool = False):
+        self.repo_id = repo_id
+        self.offline = offline
+        self.store_dir = store_dir
+        self.root = os.path.join(store_dir, repo_id.replace('/', '--'))
+        self._voices: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def apply_offline_mode(self):
+        """Stops huggingface_hub from making network calls; must run before kokoro is imported."""
+        if self.offline:
+            os.environ['HF_HUB_OFFLINE'] = '1'
+
+    def model_file_name(self) -> str:
+        from kokoro import KModel
+        return KModel.MODEL_NAMES[self.repo_id]
+
+    def model_paths(self) -> Optional[Tuple[str, str]]:
+        """(config, weights) paths if the model is in the store, else None."""
+        config_path = os.path.join(self.root, CONFIG_FILE_NAME)
+        model_path = os.path.join(self.root, self.model_file_name())
+        if os.path.exists(config_path) and os.path.exists(model_path):
+            return config_path, model_path
+        return None
+
+    def config_path(self) -> str:
+        """Path of the model's config.json: from the store, else from the hub unless offline."""
+        config_path = os.path.join(self.root, CONFIG_FILE_NAME)
+        if os.path.exists(config_path):
+            return config_path
+        if self.offline:
+            raise RuntimeError(f"'{CONFIG_FILE_NAME}' for '{self.repo_id}' is not in '{self.root}' and offline mode is on. "
+                               f"Run `python src/NarrateAI/preload.py` once while online.")
+        from huggingface_hub import hf_hub_download
+        return hf_hub_download(repo_id=self.repo_id, filename=CONFIG_FILE_NAME)
+
+    def voice_path(self, voice: str) -> str:
+        return os.path.join(self.root, VOICES_SUBDIR, f"{voice}.pt")
+
+    def load_model(self, device: str, disable_complex: bool = False):
+        """
+        Builds a KModel from the store, falling back to the hub unless offline.
+        disable_complex avoids complex-valued STFT ops, which ONNX export cannot handle.
+        """
+        from kokoro import KModel
+        paths = self.model_paths()
+        if paths is None:
+            if self.offline:
+                raise RuntimeError(f"Model files for '{self.repo_id}' are not in '{self.root}' and offline mode is on. "
+                                   f"Run `python src/NarrateAI/preload.py` once while online.")
+            return KModel(repo_id=self.repo_id, disable_complex=disable_complex).to(device).eval()
+        config_path, model_path = paths
+        return KModel(repo_id=self.repo_id, config=config_path, model=model_path, disable_complex=disable_complex).to(device).eval()
+
+    def load_voice(self, voice: str, pipeline=None):
+        """
+        Returns a voice tensor, memory-mapped from the store. Voices missing from the store are
+        loaded the way KPipeline would (through the hub) unless offline.
+        """
+        with self._lock:
+            pack = self._voices.get(voice)
+            if pack is not None:
+                return pack
+            path = voice if voice.endswith('.pt') else self.voice_path(voice)
+            if os.path.exists(path):
+                pack = _load_tensor(path)
+            elif self.offline:
+                raise RuntimeError(f"Voice '{voice}' is not in '{os.path.dirname(path)}' and offline mode is on. "
+                                   f"Run `python src/NarrateAI/preload.py` once while online.")
+            elif pipeline is not None:
+                pack = pipeline.__class__.load_single_voice(pipeline, voice)
+            else:
+                raise RuntimeError(f"Voice '{voice}' is not in the voice store.")
+            self._voices[voice] = pack
+            return pack
+
+    def attach(self, pipeline):
+        """Makes a KPipeline load its voices through this store. Safe to call repeatedly."""
+        pipeline.load_single_voice = lambda voice: self.load_voice(voice, pipeline)
+
+    def preload(self, voices: Iterable[str], include_model: bool = True) -> Dict[str, List[str]]:
+        """
+        Downloads the model (optionally) and the given voices into the store, skipping files
+        that are already there, and returns which files were fetched, present or failed.
+        Offline, missing files are only reported as failed.
+        """
+        summary = {'downloaded': [], 'present': [], 'failed': []}
+        file_names = [CONFIG_FILE_NAME, self.model_file_name()] if include_model else []
+        file_names += [f"{VOICES_SUBDIR}/{voice}.pt" for voice in dict.fromkeys(voices)]
+        os.makedirs(self.root, exist_ok=True)
+        for file_name in file_names:
+            if os.path.exists(os.path.join(self.root, file_name)):
+                summary['present'].append(file_name)
+                continue
+            if self.offline:
+                logger.warning(f"'{file_name}' is missing from '{self.root}' and offline mode is on.")
+                summary['failed'].append(file_name)
+                continue
+            from huggingface_hub import hf_hub_download
+            start_time = time.perf_counter()
+            try:
+                hf_hub_download(repo_id=self.repo_id, filename=file_name, local_dir=self.root)
+            except Exception as e:
+                logger.error(f"Could not fetch '{file_name}' from '{self.repo_id}': {e}")
+                summary['failed'].append(file_name)
+                continue
+            logger.info(f"Fetched '{file_name}' into '{self.root}' in {time.perf_counter() - start_time:.1f} seconds.")
+            summary['downloaded'].append(file_name)
+        return summary
+
+
+def _load_tensor(path: str):
+    import torch
+    try:
+        # Memory-mapped: pages are read on first use and shared with other processes mapping the file.
+        return torch.load(path, weights_only=True, mmap=True)
+    except (RuntimeError, TypeError) as e: # Legacy (non-zip) files or torch < 2.1
+        logger.debug(f"Loading '{path}' without mmap: {e}")
+        return torch.load(path, weights_only=True)
+
+
+def configured_voices() -> List[str]:
+    """Every voice listed in settings.kokoro_tts.language_voices_map."""
+    voices_map = json_handler.get_setting('settings.kokoro_tts.language_voices_map', {}) or {}
+    return [voice for voices in voices_map.values() for voice in voices]
+
+
+_shared_stores: Dict[str, VoiceStore] = {}
+_shared_stores_lock = threading.Lock()
+
+
+def configured_store_dir() -> str:
+    return json_handler.get_setting('settings.kokoro_tts.model_store_dir', MODELS_DIR) or MODELS_DIR
+
+
+def get_voice_store(repo_id: str) -> VoiceStore:
+    """
+    Returns the process-wide store for repo_id as configured in settings.kokoro_tts. Call it
+    before kokoro is imported, so offline mode is in effect when huggingface_hub loads.
+    """
+    store_dir = configured_store_dir()
+    offline = bool(json_handler.get_setting('settings.kokoro_tts.offline', False))
+    with _shared_stores_lock:
+        store = _shared_stores.get(repo_id)
+        if store is None or (store.store_dir, store.offline) != (store_dir, offline):
+            store = VoiceStore(repo_id, store_dir, offline)
+            store.apply_offline_mode()
+            _shared_stores[repo_id] = store
+        return store
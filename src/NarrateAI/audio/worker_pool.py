@@ -0,0 +1,157 @@
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+from loguru import logger
+from audio.backends import TTSBackend, TorchBackend
+from audio.synthesis import synthesize_segments
+
+# --- Worker process state ---
+# Each worker process loads its own pipeline once in _init_worker and reuses it for every batch.
+_worker_pipeline = None
+
+
+def _init_worker(repo_id: str, lang_code: str, device: str, torch_threads: int, g2p_cache_limits: Tuple[int, int], backend: TTSBackend):
+    global _worker_pipeline
+    from audio.voice_store import get_voice_store
+    store = get_voice_store(repo_id) # Before importing kokoro, so offline mode applies
+    import torch
+    import kokoro
+    from audio.g2p_cache import get_g2p_cache, install_g2p_cache
+    from utils.constants import G2P_CACHE_PATH
+
+    if torch_threads > 0:
+        torch.set_num_threads(torch_threads)
+        torch.set_num_interop_threads(1)
+    start_time = time.time()
+    model = backend.load_model(repo_id, device, torch_threads)
+    _worker_pipeline = backend.create_pipeline(kokoro, lang_code, repo_id, model)
+    store.attach(_worker_pipeline)
+    install_g2p_cache(_worker_pipeline, get_g2p_cache(G2P_CACHE_PATH, *g2p_cache_limits))
+    logger.info(f"Synthesis worker {os.getpid()} loaded pipeline (lang='{lang_code}', device='{device}', backend='{backend.signature}', "
+                f"threads={torch_threads}) in {time.time() - start_time:.2f} seconds.")
+
+
+def _synthesize_batch(batch: List[Tuple[int, str]], voice: str, speed: float, max_batch_tokens: int) -> List[Tuple[int, np.ndarray]]:
+    audio = synthesize_segments(_worker_pipeline, [text for _index, text in batch], voice, speed, max_batch_tokens)
+    return [(index, audio_data) for (index, _text), audio_data in zip(batch, audio)]
+
+
+class SynthesisWorkerPool:
+    """
+    Shards segment synthesis across worker processes, each holding its own KPipeline.
+
+    Segments are sent in small batches and results are yielded back in the original
+    order, so callers can append them straight to the output file.
+    """
+
+    def __init__(self, repo_id: str, lang_code: str, device: str, num_workers: int, torch_threads: int, batch_size: int,
+                 g2p_cache_limits: Tuple[int, int] = (0, 0), backend: Optional[TTSBackend] = None):
+        self.repo_id = repo_id
+        self.lang_code = lang_code
+        self.device = device
+        self.num_workers = num_workers
+        self.torch_threads = torch_threads
+        self.batch_size = max(int(batch_size), 1)
+        self.g2p_cache_limits = tuple(g2p_cache_limits)
+        self.backend = backend or TorchBackend()
+        self.users = 0 # Callers currently holding a lease_worker_pool() lease; guarded by _pools_lock
+        # 'spawn' keeps torch/OpenMP state of the parent out of the workers and behaves the same on every OS.
+        self._executor = ProcessPoolExecutor(
+            max_workers=num_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(repo_id, lang_code, device, torch_threads, self.g2p_cache_limits, self.backend)
+        )
+        logger.info(f"Started synthesis worker pool: {num_workers} workers x {torch_threads} torch threads, batch size {self.batch_size}.")
+
+    @staticmethod
+    def config_key(repo_id: str, lang_code: str, device: str, num_workers: int, torch_threads: int, batch_size: int,
+                   g2p_cache_limits: Tuple[int, int] = (0, 0), backend: Optional[TTSBackend] = None) -> tuple:
+        return (repo_id, lang_code, device, num_workers, torch_threads, max(int(batch_size), 1), tuple(g2p_cache_limits), (backend or TorchBackend()).signature)
+
+    def imap_ordered(self, segments: Iterable[Tuple[int, str]], voice: str, speed: float, max_batch_tokens: int = 0) -> Iterator[Tuple[int, np.ndarray]]:
+        """
+        Synthesizes (index, text) pairs and yields (index, audio) in input order. Short segments
+        within a batch share forward passes up to max_batch_tokens phonemes (0 disables packing).
+        """
+        max_batches_in_flight = self.num_workers * 2
+        in_flight = deque()
+        segment_iter = iter(segments)
+        exhausted = False
+
+        def submit_next_batch() -> bool:
+            batch = []
+            for item in segment_iter:
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+            if not batch:
+                return False
+            in_flight.append(self._executor.submit(_synthesize_batch, batch, voice, speed, max_batch_tokens))
+            return True
+
+        try:
+            while True:
+                while not exhausted and len(in_flight) < max_batches_in_flight:
+                    exhausted = not submit_next_batch()
+                if not in_flight:
+                    return
+                for result in in_flight.popleft().result():
+                    yield result
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+    def warm_up(self, text: str, voice: str, speed: float):
+        """Starts the workers (each loads its pipeline on start) and runs a short synthesis on them."""
+        futures = [self._executor.submit(_synthesize_batch, [(0, text)], voice, speed, 0) for _worker in range(self.num_workers)]
+        for future in futures:
+            future.result()
+
+    def shutdown(self):
+        logger.info(f"Shutting down synthesis worker pool (lang='{self.lang_code}', device='{self.device}').")
+        self._executor.shutdown(wait=False)
+
+
+_pools: Dict[tuple, SynthesisWorkerPool] = {}
+_latest_key: Optional[tuple] = None
+_pools_lock = threading.Lock()
+
+
+def _shutdown_idle_pools_locked():
+    for key in [key for key, pool in _pools.items() if pool.users == 0 and key != _latest_key]:
+        _pools.pop(key).shutdown()
+
+
+@contextmanager
+def lease_worker_pool(repo_id: str, lang_code: str, device: str, num_workers: int, torch_threads: int, batch_size: int,
+                      g2p_cache_limits: Tuple[int, int] = (0, 0), backend: Optional[TTSBackend] = None) -> Iterator[SynthesisWorkerPool]:
+    """
+    Lends out the process-wide worker pool for a configuration, starting it on first use.
+
+    Pools are kept per configuration, so jobs with different languages or devices run side
+    by side. Only the most recently requested configuration stays warm once idle; older
+    pools are shut down when their last lease ends, never while one of their callers
+    still has batches pending.
+    """
+    global _latest_key
+    key = SynthesisWorkerPool.config_key(repo_id, lang_code, device, num_workers, torch_threads, batch_size, g2p_cache_limits, backend)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = SynthesisWorkerPool(repo_id, lang_code, device, num_workers, torch_threads, batch_size, g2p_cache_limits, backend)
+        pool.users += 1
+        _latest_key = key
+        _shutdown_idle_pools_locked()
+    try:
+        yield pool
+    finally:
+        with _pools_lock:
+            pool.users -= 1
+            _shutdown_idle_pools_locked()
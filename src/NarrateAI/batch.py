@@ -0,0 +1,277 @@
+"""
+Headless batch conversion: turns every supported document in a set of directories, files
+or manifests into an audiobook with a single shared TTS engine. Does not import Gradio.
+
+Run from the repository root, like main.py:
+    python src/NarrateAI/batch.py books/ --output-dir outputs/batch --jobs 2 --report report.json
+
+Outputs whose source file and voice settings are unchanged since the last run are
+skipped, and a document that was interrupted half-way resumes from its checkpoint, so an
+interrupted overnight run can simply be started again.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import soundfile as sf
+from loguru import logger
+import audio.kokoro_tts as kokoro
+import utils.logging_config as lf
+from utils.constants import OUTPUTS_DIR
+from utils.file_reader import FileReader
+from utils.text_cache import hash_file
+
+STATE_FILE_NAME = '.batch-state.json'
+
+
+class BatchItem(NamedTuple):
+    source_path: str
+    output_dir: str
+    output_name: str # Without extension
+
+
+def _load_manifest(manifest_path: str) -> List[str]:
+    """Reads a manifest: a JSON list of paths, or one path per line ('#' starts a comment)."""
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        if manifest_path.lower().endswith('.json'):
+            entries = json.load(f)
+        else:
+            entries = [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
+    return [entry if os.path.isabs(entry) else os.path.join(base_dir, entry) for entry in entries]
+
+
+def _output_slot(item: BatchItem) -> Tuple[str, str]:
+    # Case-insensitive, as on Windows and macOS file systems.
+    return os.path.normcase(os.path.abspath(item.output_dir)), item.output_name.lower()
+
+
+def _resolve_output_names(items: List[BatchItem]) -> List[BatchItem]:
+    """
+    Gives documents that would write the same output (e.g. book.pdf and book.epub in one
+    directory) their source extension in the output name ('book.pdf', 'book.epub'), and
+    raises ValueError for any that still collide.
+    """
+    counts: Dict[Tuple[str, str], int] = {}
+    for item in items:
+        counts[_output_slot(item)] = counts.get(_output_slot(item), 0) + 1
+    resolved = [
+        item._replace(output_name=os.path.basename(item.source_path)) if counts[_output_slot(item)] > 1 else item
+        for item in items
+    ]
+    claimed: Dict[Tuple[str, str], str] = {}
+    for item in resolved:
+        other = claimed.setdefault(_output_slot(item), item.source_path)
+        if other != item.source_path:
+            raise ValueError(f"'{other}' and '{item.source_path}' would be written to the same output file in "
+                             f"'{item.output_dir}'; convert them in separate runs or into separate output directories.")
+    return resolved
+
+
+def collect_items(inputs: List[str], manifests: List[str], output_dir: str, recursive: bool,
+                  supported_extensions: List[str]) -> List[BatchItem]:
+    """
+    Expands directories and manifests into the list of documents to convert. Raises
+    ValueError if two documents would be written to the same output file.
+    """
+    items: Dict[str, BatchItem] = {}
+
+    def add_file(path: str, relative_dir: str = ''):
+        if os.path.splitext(path)[1].lower() not in supported_extensions:
+            return
+        source_path = os.path.abspath(path)
+        items.setdefault(source_path, BatchItem(
+            source_path,
+            os.path.join(output_dir, relative_dir) if relative_dir else output_dir,
+            os.path.splitext(os.path.basename(path))[0]
+        ))
+
+    paths = list(inputs)
+    for manifest_path in manifests:
+        paths.extend(_load_manifest(manifest_path))
+
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                relative_dir = os.path.relpath(root, path)
+                for name in sorted(files):
+                    add_file(os.path.join(root, name), '' if relative_dir == '.' else relative_dir)
+                if not recursive:
+                    break
+        elif os.path.isfile(path):
+            add_file(path)
+        else:
+            logger.warning(f"Skipping '{path}': no such file or directory.")
+    return _resolve_output_names(list(items.values()))
+
+
+class BatchRunner:
+    """Converts BatchItems with bounded concurrency, sharing one Kokoro_TTS engine and FileReader."""
+
+    def __init__(self, tts_engine: kokoro.Kokoro_TTS, file_reader: FileReader, jobs: int = 1, force: bool = False):
+        self.tts_engine = tts_engine
+        self.file_reader = file_reader
+        self.jobs = max(int(jobs), 1)
+        self.force = force
+        self._state_lock = threading.Lock()
+
+    @staticmethod
+    def _load_state(output_dir: str) -> Dict:
+        state_path = os.path.join(output_dir, STATE_FILE_NAME)
+        try:
+            with open(state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable batch state '{state_path}': {e}")
+            return {}
+
+    def _record_state(self, output_dir: str, output_file: str, entry: Dict):
+        with self._state_lock:
+            state = self._load_state(output_dir)
+            state[output_file] = entry
+            state_path = os.path.join(output_dir, STATE_FILE_NAME)
+            tmp_path = state_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f, indent=4, ensure_ascii=False)
+            os.replace(tmp_path, state_path)
+
+    def convert(self, item: BatchItem, settings_key: str) -> Dict:
+        output_file = f"{item.output_name}.{self.tts_engine.output_format}"
+        output_path = os.path.join(item.output_dir, output_file)
+        result = {'input': item.source_path, 'output': output_path, 'status': 'failed', 'characters': 0,
+                  'audio_seconds': 0.0, 'wall_seconds': 0.0, 'real_time_factor': None, 'characters_per_second': None, 'error': None}
+        start_time = time.perf_counter()
+        try:
+            source_hash = hash_file(item.source_path)
+            previous = self._load_state(item.output_dir).get(output_file)
+            if not self.force and previous and os.path.exists(output_path) \
+                    and previous.get('source_hash') == source_hash and previous.get('settings') == settings_key:
+                logger.info(f"Skipping '{item.source_path}': '{output_path}' is up to date.")
+                result.update(status='skipped', audio_seconds=previous.get('audio_seconds', 0.0))
+                return result
+
+            characters = 0
+
+            def counted(pieces):
+                nonlocal characters
+                for piece in pieces:
+                    characters += len(piece)
+                    yield piece
+
+            os.makedirs(item.output_dir, exist_ok=True)
+            generated_path = self.tts_engine.process_audio(
+                counted(self.file_reader.iter_file(item.source_path, file_hash=source_hash)),
+                item.output_name,
+                output_dir=item.output_dir,
+                checkpoint=self.tts_engine.create_checkpoint(source_hash)
+            )
+            wall_seconds = time.perf_counter() - start_time
+            result.update(characters=characters, wall_seconds=round(wall_seconds, 3))
+            if generated_path is None:
+                result['status'] = 'empty'
+                logger.warning(f"'{item.source_path}' produced no audio (no extractable text).")
+                return result
+
+            audio_seconds = sf.info(generated_path).duration
+            result.update(
+                status='done',
+                audio_seconds=round(audio_seconds, 2),
+                real_time_factor=round(wall_seconds / audio_seconds, 4) if audio_seconds else None,
+                characters_per_second=round(characters / wall_seconds, 1) if wall_seconds else None
+            )
+            self._record_state(item.output_dir, output_file, {
+                'source': item.source_path,
+                'source_hash': source_hash,
+                'settings': settings_key,
+                'audio_seconds': result['audio_seconds'],
+            })
+            logger.info(f"Converted '{item.source_path}' -> '{generated_path}' ({audio_seconds:.1f}s of audio in {wall_seconds:.1f}s).")
+        except Exception as e:
+            result.update(error=str(e), wall_seconds=round(time.perf_counter() - start_time, 3))
+            logger.error(f"Failed to convert '{item.source_path}': {e}", exc_info=True)
+        return result
+
+    def run(self, items: List[BatchItem]) -> Dict:
+        settings_key = self.tts_engine.settings_key()
+        start_time = time.perf_counter()
+        if self.jobs > 1 and len(items) > 1:
+            with ThreadPoolExecutor(max_workers=self.jobs, thread_name_prefix='batch') as executor:
+                results = list(executor.map(lambda item: self.convert(item, settings_key), items))
+        else:
+            results = [self.convert(item, settings_key) for item in items]
+        wall_seconds = time.perf_counter() - start_time
+
+        counts = {status: sum(1 for r in results if r['status'] == status) for status in ('done', 'skipped', 'empty', 'failed')}
+        generated_audio_seconds = sum(r['audio_seconds'] for r in results if r['status'] == 'done')
+        return {
+            'settings': settings_key,
+            'jobs': self.jobs,
+            'files': len(results),
+            **counts,
+            'wall_seconds': round(wall_seconds, 3),
+            'audio_seconds_generated': round(generated_audio_seconds, 2),
+            'audio_seconds_per_wall_second': round(generated_audio_seconds / wall_seconds, 3) if wall_seconds else None,
+            'results': results,
+        }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Convert directories of documents to audiobooks without the web UI.")
+    parser.add_argument('inputs', nargs='*', help="Documents and/or directories to convert.")
+    parser.add_argument('--manifest', action='append', default=[],
+                        help="File listing documents to convert (one path per line, or a JSON list). Can be repeated.")
+    parser.add_argument('--output-dir', default=os.path.join(OUTPUTS_DIR, 'batch'))
+    parser.add_argument('--recursive', action='store_true', help="Descend into subdirectories of input directories.")
+    parser.add_argument('--jobs', type=int, default=1, help="Documents converted concurrently.")
+    parser.add_argument('--force', action='store_true', help="Convert even if the output is up to date.")
+    parser.add_argument('--lang-code', help="Overrides settings.kokoro_tts.lang_code.")
+    parser.add_argument('--voice', help="Overrides settings.kokoro_tts.voice.")
+    parser.add_argument('--speed', type=float, help="Overrides settings.kokoro_tts.speed.")
+    parser.add_argument('--device', help="Overrides settings.kokoro_tts.device.")
+    parser.add_argument('--format', dest='output_format', help="Overrides settings.kokoro_tts.output_format.")
+    parser.add_argument('--bitrate', type=int, help="Overrides settings.kokoro_tts.bitrate_kbps.")
+    parser.add_argument('--report', help="Write the JSON summary here (default: <output-dir>/batch-report.json).")
+    args = parser.parse_args(argv)
+    if not args.inputs and not args.manifest:
+        parser.error("give at least one input file, directory or --manifest")
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    lf.setup_logging()
+
+    file_reader = FileReader()
+    try:
+        items = collect_items(args.inputs, args.manifest, args.output_dir, args.recursive, list(file_reader.supported_extensions))
+    except ValueError as e:
+        logger.error(str(e))
+        return 1
+    if not items:
+        logger.error("No supported documents found in the given inputs.")
+        return 1
+    logger.info(f"Batch conversion of {len(items)} documents into '{args.output_dir}' with {max(args.jobs, 1)} concurrent jobs.")
+
+    # One engine for the whole batch: the model is loaded once and shared by every job.
+    tts_engine = kokoro.Kokoro_TTS(lang_code=args.lang_code, voice=args.voice, speed=args.speed, device=args.device)
+    tts_engine.apply_settings(output_format=args.output_format, bitrate_kbps=args.bitrate)
+
+    report = BatchRunner(tts_engine, file_reader, jobs=args.jobs, force=args.force).run(items)
+    report_path = args.report or os.path.join(args.output_dir, 'batch-report.json')
+    os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=4, ensure_ascii=False)
+    logger.info(f"Batch finished: {report['done']} converted, {report['skipped']} up to date, {report['empty']} empty, "
+                f"{report['failed']} failed in {report['wall_seconds']:.1f}s. Report: '{report_path}'")
+    return 1 if report['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
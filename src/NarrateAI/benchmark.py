@@ -0,0 +1,308 @@
+"""
+Benchmark harness for the read -> split -> synthesize -> write pipeline.
+
+Generates synthetic TXT, PDF, EPUB, DOCX and HTML documents of several sizes, runs each
+through FileReader.read_file and Kokoro_TTS.process_audio, and prints (or writes) a JSON
+report with per-stage timings, the real-time factor and peak RSS, so runs from different
+commits can be compared. With --pipeline stub (the default) a deterministic CPU stub
+replaces KPipeline, so the benchmark runs offline and measures everything except the model.
+
+Run from the repository root, like main.py:
+    python src/NarrateAI/benchmark.py --sizes small medium --formats txt pdf --output bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+import numpy as np
+import soundfile as sf
+from loguru import logger
+import audio.kokoro_tts as kokoro
+from audio.segment_cache import SegmentCache
+from utils.constants import SEGMENT_CACHE_DIR, TEXT_CACHE_DIR
+from utils.file_reader import FileReader
+from utils.memory import get_peak_rss_bytes, get_rss_bytes
+from utils.perf import StageTimings
+from utils.text_cache import TextCache
+
+REPORT_VERSION = 1
+CORPUS_SIZES = {'small': 500, 'medium': 5000, 'large': 50000} # Words per document
+CORPUS_FORMATS = ['txt', 'pdf', 'epub', 'docx', 'html']
+# Stages reported for every run, in pipeline order. 'combine' is always 0 because audio is
+# streamed into the output file; it is kept so reports stay comparable with older commits.
+STAGES = ['read', 'split', 'synthesis', 'chunk_write', 'combine', 'export']
+WORDS = (
+    "the a of and to in is was he she it that for on with as his her they at by this had "
+    "from not but be have are which one all were there when an their said been would so "
+    "river house morning letter window quiet garden story voice evening winter journey "
+    "remembered carried answered walked looked opened waited listened returned followed"
+).split()
+PDF_LINES_PER_PAGE = 45
+PDF_CHARS_PER_LINE = 90
+
+
+class StubPipeline:
+    """
+    Deterministic stand-in for KPipeline: emits a fixed number of samples per input
+    character (a quiet sine tone), optionally burning CPU time per character to mimic a
+    model. Yields (graphemes, phonemes, audio) like KPipeline.
+    """
+
+    def __init__(self, sample_rate: int = kokoro.SAMPLE_RATE, samples_per_char: int = 1200, compute_us_per_char: float = 0.0):
+        self.sample_rate = sample_rate
+        self.samples_per_char = samples_per_char
+        self.compute_us_per_char = compute_us_per_char
+
+    def load_voice(self, voice: str):
+        return None
+
+    def __call__(self, text: str, voice: Optional[str] = None, speed: float = 1.0, split_pattern=None):
+        num_samples = max(int(len(text) * self.samples_per_char / max(speed, 0.1)), 1)
+        if self.compute_us_per_char > 0:
+            deadline = time.perf_counter() + len(text) * self.compute_us_per_char / 1e6
+            while time.perf_counter() < deadline:
+                pass
+        t = np.arange(num_samples, dtype=np.float32) / self.sample_rate
+        yield text, text, (0.1 * np.sin(2 * np.pi * 220.0 * t)).astype(np.float32)
+
+
+def generate_text(num_words: int, seed: int = 0) -> List[str]:
+    """Returns deterministic pseudo-prose as a list of paragraphs."""
+    rng = random.Random(seed)
+    paragraphs, sentences, words_left = [], [], num_words
+    while words_left > 0:
+        length = min(rng.randint(6, 24), words_left)
+        sentence = " ".join(rng.choice(WORDS) for _ in range(length))
+        sentences.append(sentence[0].upper() + sentence[1:] + rng.choice(['.', '.', '.', '?', '!']))
+        words_left -= length
+        if len(sentences) >= rng.randint(3, 8):
+            paragraphs.append(" ".join(sentences))
+            sentences = []
+    if sentences:
+        paragraphs.append(" ".join(sentences))
+    return paragraphs
+
+
+def _write_txt(path: str, paragraphs: List[str]):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("\n\n".join(paragraphs))
+
+
+def _write_html(path: str, paragraphs: List[str]):
+    body = "\n".join(f"<p>{p}</p>" for p in paragraphs)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f"<html><head><title>Benchmark</title></head><body><h1>Benchmark</h1>\n{body}\n</body></html>")
+
+
+def _write_docx(path: str, paragraphs: List[str]):
+    import docx
+    document = docx.Document()
+    for paragraph in paragraphs:
+        document.add_paragraph(paragraph)
+    document.save(path)
+
+
+def _write_epub(path: str, paragraphs: List[str], paragraphs_per_chapter: int = 40):
+    from ebooklib import epub
+    book = epub.EpubBook()
+    book.set_identifier('narrateai-benchmark')
+    book.set_title('Benchmark')
+    book.set_language('en')
+    chapters = []
+    for number, start in enumerate(range(0, len(paragraphs), paragraphs_per_chapter), start=1):
+        chapter = epub.EpubHtml(title=f"Chapter {number}", file_name=f"chapter_{number}.xhtml", lang='en')
+        body = "".join(f"<p>{p}</p>" for p in paragraphs[start:start + paragraphs_per_chapter])
+        chapter.content = f"<html><body><h1>Chapter {number}</h1>{body}</body></html>"
+        book.add_item(chapter)
+        chapters.append(chapter)
+    book.toc = chapters
+    book.add_item(epub.EpubNcx())
+    book.add_item(epub.EpubNav())
+    book.spine = ['nav'] + chapters
+    epub.write_epub(path, book)
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def _write_pdf(path: str, paragraphs: List[str]):
+    """Writes a minimal text-only PDF (Helvetica, one text object per page)."""
+    lines = []
+    for paragraph in paragraphs:
+        line = ""
+        for word in paragraph.split():
+            if len(line) + len(word) + 1 > PDF_CHARS_PER_LINE:
+                lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}" if line else word
+        lines.extend([line, ""])
+    pages = [lines[i:i + PDF_LINES_PER_PAGE] for i in range(0, len(lines), PDF_LINES_PER_PAGE)] or [[""]]
+
+    # Object numbers: 1 catalog, 2 page tree, 3 font, then a (page, content) pair per page.
+    objects = {1: b"<< /Type /Catalog /Pages 2 0 R >>", 3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"}
+    page_refs = []
+    for page_number, page_lines in enumerate(pages):
+        page_obj, content_obj = 4 + 2 * page_number, 5 + 2 * page_number
+        text_ops = "".join(f"({_pdf_escape(line)}) Tj T* " for line in page_lines)
+        stream = f"BT /F1 10 Tf 14 TL 40 780 Td {text_ops}ET".encode('latin-1', errors='replace')
+        objects[content_obj] = b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"
+        objects[page_obj] = (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                             f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_obj} 0 R >>").encode()
+        page_refs.append(f"{page_obj} 0 R")
+    objects[2] = f"<< /Type /Pages /Kids [{' '.join(page_refs)}] /Count {len(pages)} >>".encode()
+
+    with open(path, 'wb') as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = {}
+        for number in sorted(objects):
+            offsets[number] = f.tell()
+            f.write(b"%d 0 obj\n" % number + objects[number] + b"\nendobj\n")
+        xref_offset = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for number in sorted(objects):
+            f.write(b"%010d 00000 n \n" % offsets[number])
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset))
+
+
+CORPUS_WRITERS = {
+    'txt': _write_txt,
+    'pdf': _write_pdf,
+    'epub': _write_epub,
+    'docx': _write_docx,
+    'html': _write_html,
+}
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_case(tts_engine: kokoro.Kokoro_TTS, file_reader: FileReader, document_path: str, output_dir: str) -> Dict:
+    """Reads and synthesizes one document, returning its measurements."""
+    timings = StageTimings()
+    rss_before = get_rss_bytes()
+    start_time = time.perf_counter()
+
+    with timings.measure('read'):
+        text = file_reader.read_file(document_path)
+    output_path = tts_engine.process_audio(
+        text,
+        os.path.splitext(os.path.basename(document_path))[0],
+        output_dir=output_dir,
+        timings=timings
+    )
+    total_seconds = time.perf_counter() - start_time
+
+    audio_seconds = 0.0
+    if output_path:
+        audio_seconds = sf.info(output_path).duration
+        os.remove(output_path)
+
+    recorded = timings.as_dict()
+    stages = {stage: recorded.get(stage, {'seconds': 0.0, 'count': 0}) for stage in STAGES}
+    return {
+        'characters': len(text),
+        'audio_seconds': round(audio_seconds, 3),
+        'total_seconds': round(total_seconds, 6),
+        # Processing time per second of audio; below 1.0 is faster than real time.
+        'real_time_factor': round(total_seconds / audio_seconds, 6) if audio_seconds else None,
+        'stages': stages,
+        'rss_delta_bytes': get_rss_bytes() - rss_before,
+        'peak_rss_bytes': get_peak_rss_bytes(),
+    }
+
+
+def run_benchmark(args: argparse.Namespace) -> Dict:
+    if args.pipeline == 'stub':
+        pipeline = StubPipeline(samples_per_char=args.stub_samples_per_char, compute_us_per_char=args.stub_compute_us_per_char)
+        tts_engine = kokoro.Kokoro_TTS(lang_code=args.lang_code, voice=args.voice, workers=1, pipeline=pipeline)
+    else:
+        tts_engine = kokoro.Kokoro_TTS(lang_code=args.lang_code, voice=args.voice, device=args.device, workers=args.workers)
+    tts_engine.apply_settings(output_format=args.output_format)
+    if not args.use_caches:
+        # Cached text or audio would make repeated runs measure the caches instead of the pipeline.
+        tts_engine.segment_cache = SegmentCache(SEGMENT_CACHE_DIR, 0)
+    file_reader = FileReader()
+    if not args.use_caches:
+        file_reader.text_cache = TextCache(TEXT_CACHE_DIR, 0)
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix='narrateai-bench-') as work_dir:
+        for size_name in args.sizes:
+            paragraphs = generate_text(CORPUS_SIZES[size_name], seed=args.seed)
+            for document_format in args.formats:
+                document_path = os.path.join(work_dir, f"{size_name}.{document_format}")
+                try:
+                    CORPUS_WRITERS[document_format](document_path, paragraphs)
+                except ImportError as e:
+                    logger.warning(f"Skipping {document_format} corpus: {e}")
+                    results.append({'format': document_format, 'size': size_name, 'skipped': str(e)})
+                    continue
+                for repeat in range(args.repeat):
+                    logger.info(f"Benchmarking {size_name} {document_format} (run {repeat + 1}/{args.repeat})...")
+                    case = run_case(tts_engine, file_reader, document_path, work_dir)
+                    results.append({'format': document_format, 'size': size_name, 'words': CORPUS_SIZES[size_name],
+                                    'run': repeat + 1, **case})
+
+    return {
+        'report_version': REPORT_VERSION,
+        'commit': _git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'pipeline': args.pipeline,
+        'output_format': tts_engine.output_format,
+        'workers': tts_engine.num_workers,
+        'results': results,
+        'peak_rss_bytes': get_peak_rss_bytes(),
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark NarrateAI's document reading and audio generation.")
+    parser.add_argument('--formats', nargs='+', choices=CORPUS_FORMATS, default=CORPUS_FORMATS)
+    parser.add_argument('--sizes', nargs='+', choices=list(CORPUS_SIZES), default=['small', 'medium'])
+    parser.add_argument('--pipeline', choices=['stub', 'kokoro'], default='stub',
+                        help="'stub' runs offline with a deterministic fake pipeline; 'kokoro' uses the real model.")
+    parser.add_argument('--repeat', type=int, default=1, help="Runs per document.")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for the synthetic corpus.")
+    parser.add_argument('--lang-code', default='a')
+    parser.add_argument('--voice', default='af_heart')
+    parser.add_argument('--device', default=None, help="Device for the real pipeline (defaults to the configured one).")
+    parser.add_argument('--workers', type=int, default=None, help="Synthesis worker processes for the real pipeline.")
+    parser.add_argument('--output-format', default='wav')
+    parser.add_argument('--stub-samples-per-char', type=int, default=1200, help="Audio samples the stub emits per character.")
+    parser.add_argument('--stub-compute-us-per-char', type=float, default=0.0, help="CPU time the stub burns per character.")
+    parser.add_argument('--use-caches', action='store_true', help="Keep the text and segment caches enabled.")
+    parser.add_argument('--output', help="Write the JSON report to this file instead of stdout.")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    report = run_benchmark(args)
+    report_json = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(report_json + "\n")
+    else:
+        print(report_json)
+
+
+if __name__ == "__main__":
+    main()
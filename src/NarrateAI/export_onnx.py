@@ -0,0 +1,122 @@
+"""
+Exports the Kokoro model to ONNX for the 'onnx' backend (settings.kokoro_tts.backend),
+quantizes its weights to int8 for faster CPU inference, and checks that the exported
+model sounds like the PyTorch one.
+
+Run from the repository root, like main.py (needs torch, onnx and onnxruntime; see the
+optional entries at the end of requirements.txt):
+    python src/NarrateAI/export_onnx.py                  # export, quantize, parity check
+    python src/NarrateAI/export_onnx.py --no-quantize    # keep float32 weights
+    python src/NarrateAI/export_onnx.py --check-only     # re-run the parity check
+
+The output defaults to settings.kokoro_tts.onnx_model_path.
+"""
+import argparse
+import importlib.util
+import os
+import sys
+import time
+from typing import List, Optional
+from loguru import logger
+import utils.json_handler as jh
+import utils.logging_config as lf
+from audio.backends import (DEFAULT_ONNX_MODEL_PATH, ONNX_INPUT_NAMES, ONNX_OUTPUT_NAMES, OnnxBackend, TorchBackend,
+                            check_parity)
+from audio.kokoro_tts import KOKORO_REPO_ID
+from audio.voice_store import get_voice_store
+
+ONNX_OPSET = 17
+# Weights of these ops are quantized; they hold most of the model's compute. Convolutions
+# stay float32 because int8 ConvTranspose in the vocoder audibly degrades the output.
+QUANTIZED_OP_TYPES = ['MatMul', 'Gemm', 'LSTM']
+
+
+def export(model, output_path: str):
+    import torch
+    from kokoro.model import KModelForONNX
+    input_ids = torch.LongTensor([[0, *range(1, 49), 0]])
+    style = torch.randn(1, 256)
+    speed = torch.tensor([1.0], dtype=torch.float32)
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    torch.onnx.export(
+        KModelForONNX(model).eval(),
+        (input_ids, style, speed),
+        output_path,
+        input_names=list(ONNX_INPUT_NAMES),
+        output_names=list(ONNX_OUTPUT_NAMES),
+        dynamic_axes={
+            ONNX_INPUT_NAMES[0]: {1: 'tokens'},
+            ONNX_OUTPUT_NAMES[0]: {0: 'samples'},
+            ONNX_OUTPUT_NAMES[1]: {0: 'tokens'},
+        },
+        opset_version=ONNX_OPSET,
+        do_constant_folding=True,
+    )
+
+
+def quantize(input_path: str, output_path: str):
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    quantize_dynamic(input_path, output_path, op_types_to_quantize=QUANTIZED_OP_TYPES, weight_type=QuantType.QInt8)
+
+
+def float_model_path(output_path: str) -> str:
+    """Where the float32 export goes before quantization, e.g. kokoro-82m.int8.onnx -> kokoro-82m.onnx."""
+    if output_path.endswith('.int8.onnx'):
+        return output_path[:-len('.int8.onnx')] + '.onnx'
+    return os.path.splitext(output_path)[0] + '.fp32.onnx'
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    tts_settings = jh.JsonHandler().get_setting('settings.kokoro_tts', {}) or {}
+    parser = argparse.ArgumentParser(description="Export Kokoro to ONNX (optionally int8) and check it against the PyTorch model.")
+    parser.add_argument('--output', default=tts_settings.get('onnx_model_path', DEFAULT_ONNX_MODEL_PATH),
+                        help="Path of the model the onnx backend loads (default: settings.kokoro_tts.onnx_model_path).")
+    parser.add_argument('--no-quantize', action='store_true', help="Write float32 weights to --output instead of int8.")
+    parser.add_argument('--check-only', action='store_true', help="Skip the export and only compare --output with the PyTorch model.")
+    parser.add_argument('--no-check', action='store_true', help="Skip the parity check.")
+    parser.add_argument('--lang-code', default=tts_settings.get('lang_code', 'a'), help="Language of the parity check texts.")
+    parser.add_argument('--voice', default=tts_settings.get('voice', 'af_heart'), help="Voice used for the parity check.")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    lf.setup_logging()
+    required = ['onnxruntime'] + ([] if args.check_only else ['onnx'])
+    missing = [name for name in required if importlib.util.find_spec(name) is None]
+    if missing:
+        logger.error(f"export_onnx.py requires {' and '.join(missing)}. Install them with `pip install {' '.join(missing)}` "
+                     f"(optional entries in requirements.txt).")
+        return 1
+
+    store = get_voice_store(KOKORO_REPO_ID) # Before importing kokoro, so offline mode applies
+    import kokoro
+
+    if not args.check_only:
+        start_time = time.perf_counter()
+        float_path = args.output if args.no_quantize else float_model_path(args.output)
+        logger.info(f"Exporting '{KOKORO_REPO_ID}' to '{float_path}'...")
+        # ONNX has no complex tensors, so the exported model uses the real-valued STFT.
+        export(store.load_model('cpu', disable_complex=True), float_path)
+        if not args.no_quantize:
+            logger.info(f"Quantizing weights of {', '.join(QUANTIZED_OP_TYPES)} ops to int8: '{args.output}'...")
+            quantize(float_path, args.output)
+        logger.info(f"ONNX model written to '{args.output}' ({os.path.getsize(args.output) / (1024 * 1024):.1f} MB) "
+                    f"in {time.perf_counter() - start_time:.1f} seconds.")
+
+    if args.no_check:
+        return 0
+    torch_backend, onnx_backend = TorchBackend(), OnnxBackend(args.output)
+    reference = torch_backend.create_pipeline(kokoro, args.lang_code, KOKORO_REPO_ID, torch_backend.load_model(KOKORO_REPO_ID, 'cpu'))
+    candidate = onnx_backend.create_pipeline(kokoro, args.lang_code, KOKORO_REPO_ID, onnx_backend.load_model(KOKORO_REPO_ID, 'cpu'))
+    store.attach(reference)
+    store.attach(candidate)
+    if not check_parity(reference, candidate, args.voice):
+        logger.error(f"'{args.output}' does not match the PyTorch model closely enough; see the warnings above.")
+        return 1
+    logger.info(f"'{args.output}' matches the PyTorch model. Set settings.kokoro_tts.backend to 'onnx' to use it.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
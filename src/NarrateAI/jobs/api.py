@@ -0,0 +1,131 @@
+import os
+import shutil
+import tempfile
+from typing import Dict, Optional
+from fastapi import APIRouter, File, Form, Header, HTTPException, Request, UploadFile
+from fastapi.responses import FileResponse
+from starlette.background import BackgroundTask
+from jobs.scheduler import JobScheduler
+from jobs.store import DONE, FAILED, FINAL_STATES, RUNNING
+from utils.profiling import FLAMEGRAPH_FILE_NAME, FOLDED_FILE_NAME, SUMMARY_FILE_NAME, TORCH_TRACE_FILE_NAME
+
+PROFILE_FILES = (SUMMARY_FILE_NAME, FLAMEGRAPH_FILE_NAME, FOLDED_FILE_NAME, TORCH_TRACE_FILE_NAME)
+
+
+def _public_job(scheduler: JobScheduler, job: Dict) -> Dict:
+    """The job fields exposed over the API (no server-side paths)."""
+    return {
+        'id': job['id'],
+        'user': job['user'],
+        'filename': job['filename'],
+        'status': job['status'],
+        'progress': job['progress'],
+        'message': job['message'],
+        'error': job['error'],
+        'settings': job['settings'],
+        'created_at': job['created_at'],
+        'started_at': job['started_at'],
+        'finished_at': job['finished_at'],
+        'queue_position': scheduler.queue_position(job),
+        'download_url': f"/api/jobs/{job['id']}/download" if job['status'] == DONE else None,
+        'partial_url': f"/api/jobs/{job['id']}/partial" if job['status'] == RUNNING else None,
+        'profile_url': f"/api/jobs/{job['id']}/profile" if os.path.exists(os.path.join(scheduler.profile_dir(job), SUMMARY_FILE_NAME)) else None,
+    }
+
+
+def create_jobs_router(scheduler: JobScheduler, supported_extensions) -> APIRouter:
+    """
+    Builds the /api/jobs routes:
+      POST   /api/jobs                 submit a document (multipart 'file', optional 'user' and 'profile')
+      GET    /api/jobs                 list jobs, optionally filtered by user and status
+      GET    /api/jobs/{id}            poll a job's status and progress
+      POST   /api/jobs/{id}/cancel     cancel a queued or running job
+      POST   /api/jobs/{id}/retry      queue a failed job again (it resumes from its checkpoint)
+      GET    /api/jobs/{id}/download   fetch the finished audiobook
+      GET    /api/jobs/{id}/partial    fetch the audio checkpointed so far (WAV) of an unfinished job
+      GET    /api/jobs/{id}/profile    fetch the profile of a job submitted with profile=true
+                                       (hotspot summary; ?file=flamegraph.svg or torch_trace.json)
+    Users are identified by the 'user' form field, the X-User header, or the client address.
+    """
+    router = APIRouter(prefix="/api/jobs", tags=["jobs"])
+
+    def get_job_or_404(job_id: str) -> Dict:
+        job = scheduler.store.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found.")
+        return job
+
+    @router.post("", status_code=202)
+    def submit_job(request: Request, file: UploadFile = File(...), user: Optional[str] = Form(None),
+                   profile: bool = Form(False), x_user: Optional[str] = Header(None)):
+        filename = os.path.basename(file.filename or '')
+        if os.path.splitext(filename)[1].lower() not in supported_extensions:
+            raise HTTPException(status_code=415, detail=f"Unsupported file type '{filename}'. Supported: {', '.join(supported_extensions)}")
+        user = user or x_user or (request.client.host if request.client else 'anonymous')
+        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(filename)[1]) as upload:
+            shutil.copyfileobj(file.file, upload)
+        try:
+            job = scheduler.submit(user, filename, upload.name, profile=profile)
+        finally:
+            os.remove(upload.name)
+        return _public_job(scheduler, job)
+
+    @router.get("")
+    def list_jobs(user: Optional[str] = None, status: Optional[str] = None, limit: int = 100):
+        return [_public_job(scheduler, job) for job in scheduler.store.list(user=user, status=status, limit=limit)]
+
+    @router.get("/{job_id}")
+    def get_job(job_id: str):
+        return _public_job(scheduler, get_job_or_404(job_id))
+
+    @router.post("/{job_id}/cancel")
+    def cancel_job(job_id: str):
+        job = get_job_or_404(job_id)
+        if job['status'] in FINAL_STATES:
+            raise HTTPException(status_code=409, detail=f"Job '{job_id}' is already {job['status']}.")
+        return _public_job(scheduler, scheduler.cancel(job_id))
+
+    @router.post("/{job_id}/retry")
+    def retry_job(job_id: str):
+        job = get_job_or_404(job_id)
+        if job['status'] != FAILED:
+            raise HTTPException(status_code=409, detail=f"Only failed jobs can be retried; job '{job_id}' is {job['status']}.")
+        return _public_job(scheduler, scheduler.retry(job_id))
+
+    @router.get("/{job_id}/download")
+    def download_job(job_id: str):
+        job = get_job_or_404(job_id)
+        if job['status'] != DONE or not job['output_path'] or not os.path.exists(job['output_path']):
+            raise HTTPException(status_code=409, detail=f"Job '{job_id}' has no finished audiobook (status: {job['status']}).")
+        return FileResponse(job['output_path'], filename=os.path.basename(job['output_path']))
+
+    @router.get("/{job_id}/partial")
+    def download_partial(job_id: str):
+        job = get_job_or_404(job_id)
+        if job['status'] in FINAL_STATES:
+            raise HTTPException(status_code=409, detail=f"Job '{job_id}' is {job['status']}; use /download for finished jobs.")
+        # A file of its own per request, so concurrent downloads never overwrite each other's export.
+        fd, partial_path = tempfile.mkstemp(suffix='.partial.wav', dir=job['output_dir'])
+        os.close(fd)
+        try:
+            exported = scheduler.checkpoint_for(job).export_partial(partial_path)
+        except Exception:
+            os.remove(partial_path)
+            raise
+        if exported is None:
+            os.remove(partial_path)
+            raise HTTPException(status_code=409, detail=f"Job '{job_id}' has no checkpointed audio yet.")
+        return FileResponse(partial_path, filename=f"{os.path.splitext(job['filename'])[0]}.partial.wav",
+                            background=BackgroundTask(os.remove, partial_path))
+
+    @router.get("/{job_id}/profile")
+    def download_profile(job_id: str, file: str = SUMMARY_FILE_NAME):
+        job = get_job_or_404(job_id)
+        if file not in PROFILE_FILES:
+            raise HTTPException(status_code=404, detail=f"Unknown profile file '{file}'. Available: {', '.join(PROFILE_FILES)}")
+        profile_path = os.path.join(scheduler.profile_dir(job), file)
+        if not os.path.exists(profile_path):
+            raise HTTPException(status_code=409, detail=f"Job '{job_id}' has no '{file}' (status: {job['status']}). Submit it with profile=true.")
+        return FileResponse(profile_path, filename=f"{os.path.splitext(job['filename'])[0]}.{file}")
+
+    return router
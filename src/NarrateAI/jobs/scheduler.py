@@ -0,0 +1,227 @@
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+from loguru import logger
+import utils.metrics as metrics
+import utils.json_handler as jh
+from audio.kokoro_tts import Kokoro_TTS, SynthesisCancelled, SynthesisInterrupted, SynthesisSettings
+from jobs.store import CANCELLED, DONE, FAILED, QUEUED, RUNNING, JobStore
+from utils.file_reader import FileReader
+from utils.text_cache import hash_file
+from utils.profiling import profile_job
+
+PROGRESS_UPDATE_INTERVAL = 1.0 # Seconds between progress writes to the store
+STOP_TIMEOUT = 10.0 # Seconds stop() waits for running jobs to checkpoint their current segment
+PROFILE_DIR_NAME = 'profile' # Present in the job directory if the job is to be profiled
+
+
+class JobScheduler:
+    """
+    Runs queued synthesis jobs in the background, at most max_concurrent_jobs at a time.
+
+    Scheduling is fair across users: the next job always comes from the user with the
+    fewest running jobs (ties go to the user who was served least recently), and each
+    user's own jobs run in submission order. One user submitting a stack of large books
+    therefore delays everyone else by at most one job per free slot.
+    """
+
+    def __init__(self, store: JobStore, tts_engine: Kokoro_TTS, file_reader: FileReader, jobs_dir: str, max_concurrent_jobs: int = 1):
+        self.store = store
+        self.tts_engine = tts_engine
+        self.file_reader = file_reader
+        self.jobs_dir = jobs_dir
+        self.max_concurrent_jobs = max(int(max_concurrent_jobs), 1)
+        self._condition = threading.Condition()
+        self._running: Dict[str, threading.Event] = {} # job id -> cancel event
+        self._running_users: Dict[str, int] = {}
+        self._last_served: Dict[str, float] = {}
+        self._stopping = False
+        self._shutdown = threading.Event() # Interrupts running jobs without cancelling them
+        self._dispatcher: Optional[threading.Thread] = None
+
+    def start(self):
+        self.store.requeue_interrupted()
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="job-dispatcher", daemon=True)
+        self._dispatcher.start()
+        logger.info(f"Job scheduler started with up to {self.max_concurrent_jobs} concurrent jobs.")
+
+    def stop(self, timeout: float = STOP_TIMEOUT):
+        """
+        Stops dispatching and interrupts running jobs after their current segment. They stay
+        RUNNING with their checkpoints kept, so the next start() requeues and resumes them.
+        """
+        with self._condition:
+            self._stopping = True
+            self._shutdown.set()
+            self._condition.notify_all()
+            deadline = time.monotonic() + timeout
+            while self._running and time.monotonic() < deadline:
+                self._condition.wait(timeout=deadline - time.monotonic())
+            if self._running:
+                logger.warning(f"{len(self._running)} jobs were still running at shutdown; they resume from their last checkpoint.")
+
+    def submit(self, user: str, filename: str, source_path: str, settings: Optional[SynthesisSettings] = None, profile: bool = False) -> Dict:
+        """
+        Queues a job for a document at source_path (copied into the job's own directory, so
+        the caller may delete it). Voice settings are captured now, not when the job starts.
+        With profile, the job's profile is saved in its directory (see profile_dir).
+        """
+        filename = os.path.basename(filename)
+        settings = settings or self.tts_engine.current_settings()
+        job_id = uuid.uuid4().hex
+        job_dir = os.path.join(self.jobs_dir, job_id)
+        os.makedirs(job_dir, exist_ok=True)
+        input_path = os.path.join(job_dir, filename)
+        shutil.copyfile(source_path, input_path)
+        if profile:
+            os.makedirs(os.path.join(job_dir, PROFILE_DIR_NAME), exist_ok=True)
+        job = self.store.create(user, filename, input_path, job_dir, settings._asdict(), job_id=job_id)
+        logger.info(f"Queued job {job['id']} for user '{user}': '{filename}'.")
+        self._wake()
+        return job
+
+    def cancel(self, job_id: str) -> Optional[Dict]:
+        """Cancels a queued job immediately, or asks a running job to stop after its current segment."""
+        if self.store.transition(job_id, QUEUED, CANCELLED, message='Cancelled', finished_at=time.time()):
+            logger.info(f"Cancelled queued job {job_id}.")
+            self._wake()
+        else:
+            with self._condition:
+                cancel_event = self._running.get(job_id)
+            if cancel_event is not None:
+                cancel_event.set()
+                self.store.update(job_id, message='Cancelling...')
+                logger.info(f"Cancellation requested for running job {job_id}.")
+        return self.store.get(job_id)
+
+    def queue_position(self, job: Dict) -> Optional[int]:
+        """1-based position of a queued job in the fair schedule, or None if it is not queued."""
+        if job['status'] != QUEUED:
+            return None
+        order = self._fair_order(self.store.queued())
+        return next((position for position, queued in enumerate(order, start=1) if queued['id'] == job['id']), None)
+
+    def retry(self, job_id: str) -> Optional[Dict]:
+        """Queues a failed job again; it resumes from the checkpoint its last attempt left behind."""
+        if self.store.transition(job_id, FAILED, QUEUED, progress=0, message='Queued for retry', error=None,
+                                 started_at=None, finished_at=None):
+            logger.info(f"Requeued failed job {job_id}.")
+            self._wake()
+        return self.store.get(job_id)
+
+    def checkpoint_for(self, job: Dict, input_hash: Optional[str] = None):
+        """
+        The job's checkpoint. It is keyed on the input and settings like the UI's, so a requeued
+        or retried job, or a new job for the same file and settings, resumes where it stopped.
+        Pass input_hash if the input file was already hashed.
+        """
+        return self.tts_engine.create_checkpoint(input_hash or hash_file(job['input_path']), SynthesisSettings(**job['settings']))
+
+    @staticmethod
+    def profile_dir(job: Dict) -> str:
+        return os.path.join(job['output_dir'], PROFILE_DIR_NAME)
+
+    def _wake(self):
+        with self._condition:
+            self._condition.notify_all()
+
+    def _fair_order(self, queued: List[Dict]) -> List[Dict]:
+        """Orders queued jobs by the schedule _dispatch_loop would follow, assuming nothing finishes."""
+        per_user: Dict[str, List[Dict]] = {}
+        for job in queued:
+            per_user.setdefault(job['user'], []).append(job)
+        with self._condition:
+            running = dict(self._running_users)
+            last_served = dict(self._last_served)
+        order = []
+        while per_user:
+            user = min(per_user, key=lambda u: (running.get(u, 0), last_served.get(u, 0.0), per_user[u][0]['sequence']))
+            order.append(per_user[user].pop(0))
+            running[user] = running.get(user, 0) + 1
+            last_served[user] = time.time() + len(order)
+            if not per_user[user]:
+                del per_user[user]
+        return order
+
+    def _dispatch_loop(self):
+        while True:
+            with self._condition:
+                while not self._stopping and len(self._running) >= self.max_concurrent_jobs:
+                    self._condition.wait()
+                if self._stopping:
+                    return
+            order = self._fair_order(self.store.queued())
+            if not order:
+                with self._condition:
+                    self._condition.wait(timeout=5.0)
+                continue
+            job = order[0]
+            # Registered before the status changes, so a cancel() in between always finds the event.
+            cancel_event = threading.Event()
+            with self._condition:
+                self._running[job['id']] = cancel_event
+            if not self.store.transition(job['id'], QUEUED, RUNNING, started_at=time.time(), message='Starting...'):
+                with self._condition:
+                    self._running.pop(job['id'], None) # Cancelled in the meantime
+                continue
+            with self._condition:
+                self._running_users[job['user']] = self._running_users.get(job['user'], 0) + 1
+                self._last_served[job['user']] = time.time()
+            threading.Thread(target=self._run_job, args=(job, cancel_event), name=f"job-{job['id'][:8]}", daemon=True).start()
+
+    def _run_job(self, job: Dict, cancel_event: threading.Event):
+        job_id = job['id']
+        last_update = 0.0
+
+        def progress_callback(current_step: int, total_steps: int, description: str):
+            nonlocal last_update
+            now = time.monotonic()
+            if now - last_update < PROGRESS_UPDATE_INTERVAL:
+                return
+            last_update = now
+            fields = {'message': description}
+            if total_steps > 0:
+                fields['progress'] = round(current_step / total_steps, 4)
+            self.store.update(job_id, **fields)
+
+        logger.info(f"Starting job {job_id} ('{job['filename']}') for user '{job['user']}'.")
+        profiling = jh.JsonHandler().get_setting('settings.profiling', {}) or {}
+        profile = os.path.isdir(self.profile_dir(job)) or bool(profiling.get('enabled', False))
+        try:
+            with metrics.track_job('api'), profile_job(self.profile_dir(job), job['filename'], profile, profiling):
+                input_hash = hash_file(job['input_path'])
+                output_path = self.tts_engine.process_audio(
+                    self.file_reader.iter_file(job['input_path'], file_hash=input_hash),
+                    os.path.splitext(job['filename'])[0],
+                    progress_callback=progress_callback,
+                    settings=SynthesisSettings(**job['settings']),
+                    output_dir=job['output_dir'],
+                    cancel_event=cancel_event,
+                    checkpoint=self.checkpoint_for(job, input_hash),
+                    interrupt_event=self._shutdown
+                )
+            if output_path is None:
+                self.store.update(job_id, status=FAILED, finished_at=time.time(), message='Failed',
+                                  error="The document is empty or contains no extractable text.")
+            else:
+                self.store.update(job_id, status=DONE, progress=1.0, finished_at=time.time(), message='Done', output_path=output_path)
+                logger.info(f"Job {job_id} finished: '{output_path}'.")
+        except SynthesisCancelled:
+            self.store.update(job_id, status=CANCELLED, finished_at=time.time(), message='Cancelled')
+        except SynthesisInterrupted:
+            # Left RUNNING on purpose: requeue_interrupted() picks it up on the next start.
+            self.store.update(job_id, message='Interrupted by shutdown')
+            logger.info(f"Job {job_id} interrupted by shutdown; it resumes after the restart.")
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {e}", exc_info=True)
+            self.store.update(job_id, status=FAILED, finished_at=time.time(), message='Failed', error=str(e))
+        finally:
+            with self._condition:
+                self._running.pop(job_id, None)
+                self._running_users[job['user']] -= 1
+                if not self._running_users[job['user']]:
+                    del self._running_users[job['user']]
+                self._condition.notify_all()
@@ -0,0 +1,136 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+from loguru import logger
+
+# Job states. Queued and running jobs are "active"; the others are final.
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINAL_STATES = (DONE, FAILED, CANCELLED)
+
+_COLUMNS = ('id', 'user', 'filename', 'input_path', 'output_dir', 'status', 'progress', 'message',
+            'output_path', 'error', 'settings', 'created_at', 'started_at', 'finished_at', 'sequence')
+
+
+class JobStore:
+    """
+    SQLite-backed store of synthesis jobs, so queued work and finished results survive restarts.
+
+    Jobs are plain dicts with the keys in _COLUMNS; 'settings' is stored as JSON. 'sequence'
+    is a monotonically increasing submission number that defines FIFO order.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                user TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                input_path TEXT NOT NULL,
+                output_dir TEXT NOT NULL,
+                status TEXT NOT NULL,
+                progress REAL NOT NULL DEFAULT 0,
+                message TEXT,
+                output_path TEXT,
+                error TEXT,
+                settings TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                sequence INTEGER NOT NULL
+            )''')
+        self._connection.execute('CREATE INDEX IF NOT EXISTS jobs_status_sequence ON jobs (status, sequence)')
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict:
+        job = {column: row[column] for column in _COLUMNS}
+        job['settings'] = json.loads(job['settings']) if job['settings'] else {}
+        return job
+
+    def create(self, user: str, filename: str, input_path: str, output_dir: str, settings: Dict, job_id: Optional[str] = None) -> Dict:
+        job_id = job_id or uuid.uuid4().hex
+        with self._lock:
+            sequence = self._connection.execute('SELECT COALESCE(MAX(sequence), 0) + 1 FROM jobs').fetchone()[0]
+            self._connection.execute(
+                'INSERT INTO jobs (id, user, filename, input_path, output_dir, status, progress, message, settings, created_at, sequence) '
+                'VALUES (?, ?, ?, ?, ?, ?, 0, ?, ?, ?, ?)',
+                (job_id, user, filename, input_path, output_dir, QUEUED, 'Queued', json.dumps(settings), time.time(), sequence)
+            )
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._connection.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list(self, user: Optional[str] = None, status: Optional[str] = None, limit: int = 100) -> List[Dict]:
+        query, params = 'SELECT * FROM jobs WHERE 1 = 1', []
+        if user is not None:
+            query += ' AND user = ?'
+            params.append(user)
+        if status is not None:
+            query += ' AND status = ?'
+            params.append(status)
+        query += ' ORDER BY sequence DESC LIMIT ?'
+        params.append(int(limit))
+        with self._lock:
+            rows = self._connection.execute(query, params).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def queued(self) -> List[Dict]:
+        """Returns all queued jobs in submission order."""
+        with self._lock:
+            rows = self._connection.execute('SELECT * FROM jobs WHERE status = ? ORDER BY sequence', (QUEUED,)).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def update(self, job_id: str, **fields) -> Optional[Dict]:
+        unknown = set(fields) - set(_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown job fields: {sorted(unknown)}")
+        if 'settings' in fields:
+            fields['settings'] = json.dumps(fields['settings'])
+        if fields:
+            assignments = ', '.join(f"{name} = ?" for name in fields)
+            with self._lock:
+                self._connection.execute(f'UPDATE jobs SET {assignments} WHERE id = ?', (*fields.values(), job_id))
+        return self.get(job_id)
+
+    def transition(self, job_id: str, from_status: str, to_status: str, **fields) -> bool:
+        """Atomically moves a job from one status to another; returns False if it was not in from_status."""
+        fields['status'] = to_status
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        with self._lock:
+            cursor = self._connection.execute(
+                f'UPDATE jobs SET {assignments} WHERE id = ? AND status = ?', (*fields.values(), job_id, from_status)
+            )
+        return cursor.rowcount == 1
+
+    def requeue_interrupted(self) -> int:
+        """Puts jobs that were running when the process stopped back in the queue, keeping their place."""
+        with self._lock:
+            cursor = self._connection.execute(
+                'UPDATE jobs SET status = ?, progress = 0, message = ?, started_at = NULL WHERE status = ?',
+                (QUEUED, 'Requeued after restart', RUNNING)
+            )
+        if cursor.rowcount:
+            logger.info(f"Requeued {cursor.rowcount} jobs that were interrupted by a restart.")
+        return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -1,12 +1,31 @@
+import time
+_IMPORT_START = time.perf_counter()
 import os
+import queue
+import threading
 import warnings
+import webbrowser
+from typing import Optional
+import numpy as np
 import gradio as gr
+import uvicorn
+from fastapi import FastAPI, Response
 import audio.kokoro_tts as kokoro
+from audio.stream_writer import OUTPUT_FORMATS, float_to_pcm16
+from audio.chapter_jobs import ChapterJobRunner, DEFAULT_BOOK_RETENTION_HOURS
 from loguru import logger
 from utils.file_reader import FileReader
+from utils.text_cache import hash_file
+from utils.single_flight import SingleFlight
+from utils.workspace import RequestWorkspaces, DEFAULT_RETENTION_HOURS
+from utils.profiling import profile_job
 import utils.logging_config as lf
 import utils.json_handler as jh
-from utils.constants import OUTPUTS_DIR
+import utils.metrics as metrics
+from utils.constants import OUTPUTS_DIR, REQUESTS_DIR, PROFILES_DIR, SERVER_HOST, SERVER_PORT, METRICS_ROUTE, JOBS_DIR, JOBS_DB_PATH
+from jobs.store import JobStore
+from jobs.scheduler import JobScheduler
+from jobs.api import create_jobs_router
 
 warnings.filterwarnings("ignore", category=FutureWarning)
 warnings.filterwarnings("ignore", category=UserWarning)
@@ -14,33 +33,67 @@ warnings.filterwarnings("ignore", category=DeprecationWarning)
 warnings.filterwarnings("ignore", category=RuntimeWarning)
 
 lf.setup_logging()
+# kokoro and torch are not imported yet: the pipeline pool loads them in the warm-up thread.
+logger.info(f"Imported application modules in {time.perf_counter() - _IMPORT_START:.2f} seconds.")
 
 class AudiobookGeneratorApp:
     def __init__(self):
-        self.tts_engine = kokoro.Kokoro_TTS()
+        # The pipeline is loaded by the warm-up thread started in launch(), so the UI comes up right away.
+        # It follows later changes of its settings in config.json, whoever makes them.
+        self.tts_engine = kokoro.Kokoro_TTS(load_pipeline=False, watch_settings=True)
         self.file_reader = FileReader()
         self.json_handler = jh.JsonHandler()
+        # Identical uploads (same content and settings) submitted while one is being generated share that run.
+        self.in_flight_audiobooks = SingleFlight()
+        # UI requests run concurrently; each writes into a workspace of its own, so uploads with the same
+        # file name never overwrite each other. They share the engine, which takes turns on the model.
+        self.max_concurrent_requests = max(int(self.json_handler.get_setting('settings.server.max_concurrent_requests', 2)), 1)
+        self.request_workspaces = RequestWorkspaces(REQUESTS_DIR, self.json_handler.get_setting('settings.server.request_retention_hours', DEFAULT_RETENTION_HOURS))
+        # Background jobs submitted through /api/jobs share the UI's engine; started in launch().
+        self.job_scheduler = JobScheduler(
+            JobStore(JOBS_DB_PATH),
+            self.tts_engine,
+            self.file_reader,
+            JOBS_DIR,
+            max_concurrent_jobs=int(self.json_handler.get_setting('settings.jobs.max_concurrent_jobs', 1))
+        )
 
-    def _read_and_validate_input_file(self, uploaded_file_path: str, progress_reporter):
-        """Reads the uploaded file and performs initial validation."""
+    def _open_input_stream(self, uploaded_file_path: str, progress_reporter, file_hash: Optional[str] = None):
+        """Validates the uploaded file and returns a lazy stream of its text pieces."""
         if not uploaded_file_path:
-            logger.warning("No file path provided to _read_and_validate_input_file.")
+            logger.warning("No file path provided to _open_input_stream.")
             raise ValueError("Uploaded file path is missing.")
 
         base_uploaded_filename = os.path.basename(uploaded_file_path)
         progress_reporter(0.05, desc=f"Reading file: {base_uploaded_filename}...")
         
-        text_content = self.file_reader.read_file(uploaded_file_path) # Can raise FileNotFoundError, ValueError, NotImplementedError
-        logger.info(f"Successfully read content from {base_uploaded_filename}")
-
-        if not text_content or text_content.isspace():
-            logger.warning(f"File {base_uploaded_filename} is empty or contains no readable text.")
-            raise ValueError(f"The file '{base_uploaded_filename}' is empty or contains no extractable text.")
-        
-        return text_content, base_uploaded_filename
-
-    def generate_audiobook(self, uploaded_file_path: str, progress=gr.Progress()):
+        # Pages/chapters are parsed in the background while synthesis runs on the ones already read.
+        text_stream = self.file_reader.iter_file(uploaded_file_path, file_hash=file_hash) # Can raise FileNotFoundError, ValueError
+        logger.info(f"Opened text stream for {base_uploaded_filename}")
+        return text_stream, base_uploaded_filename
+
+    def _profile(self, filename: str, requested: bool):
+        """Profiles the job if asked to or if settings.profiling.enabled is set; otherwise a no-op."""
+        profiling = self.json_handler.get_setting('settings.profiling', {}) or {}
+        output_dir = os.path.join(PROFILES_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.path.splitext(filename)[0]}")
+        return profile_job(output_dir, filename, requested or bool(profiling.get('enabled', False)), profiling)
+
+    @staticmethod
+    def _make_tts_progress_callback(progress):
+        def tts_progress_callback(current_step: int, total_steps: int, description: str):
+            if total_steps > 0:
+                stage_progress = current_step / total_steps
+                # Initial app progress is 0.1; audio is streamed to the output file while it is
+                # generated, so generation covers the remaining 90%.
+                overall_progress = 0.1 + (stage_progress * 0.9)
+                progress(min(overall_progress, 0.99), desc=description) # Cap at 0.99 until truly done
+            else: # When total_steps is not meaningful (e.g., initialization phase within TTS)
+                progress(None, desc=description)
+        return tts_progress_callback
+
+    def generate_audiobook(self, uploaded_file_path: str, progress=gr.Progress(), chunk_callback=None, profile: bool = False):
         progress(0, desc="Initializing...")
+        self.json_handler.reload_if_changed() # Settings edited outside the UI apply from this request on
         if not uploaded_file_path:
             logger.warning("No file uploaded for audiobook generation.")
             raise gr.Error("Please upload a file to generate an audiobook.")
@@ -48,85 +101,234 @@ class AudiobookGeneratorApp:
         base_uploaded_filename_for_error_logging = os.path.basename(uploaded_file_path) if uploaded_file_path else "unknown_file"
 
         try:
-            text_content, base_uploaded_filename = self._read_and_validate_input_file(uploaded_file_path, progress)
-            base_uploaded_filename_for_error_logging = base_uploaded_filename # Update with actual name
-
-            progress(0.1, desc="File read successfully. Preparing for audio generation...")
-            output_base_name = os.path.splitext(base_uploaded_filename)[0]
-            logger.info(f"Processing audio for '{output_base_name}'")
-
-            def tts_progress_callback(current_step: int, total_steps: int, description: str):
-                if total_steps > 0:
-                    stage_progress = current_step / total_steps
-                    if "Generating" in description:
-                        # Initial app progress is 0.1, TTS generation phase is 80% of the rest
-                        overall_progress = 0.1 + (stage_progress * 0.8)
-                    elif "Combining" in description:
-                        # TTS combining phase is 10% after generation (0.1 + 0.8 base)
-                        overall_progress = 0.1 + 0.8 + (stage_progress * 0.1)
-                    else: # Fallback for other descriptions if any
-                        overall_progress = 0.1 + (current_step / total_steps * 0.9) # Assume it fits within the 90% post-initial
-                    progress(min(overall_progress, 0.99), desc=description) # Cap at 0.99 until truly done
-                else: # When total_steps is not meaningful (e.g., initialization phase within TTS)
-                    progress(desc=description)
-
-
-            audio_output_path = self.tts_engine.process_audio(
-                text_content,
-                output_base_name,
-                progress_callback=tts_progress_callback
-            )
+            with metrics.track_job('audiobook'), self._profile(base_uploaded_filename_for_error_logging, profile):
+                input_hash = hash_file(uploaded_file_path) # Keys the text, output and checkpoint caches
+                text_stream, base_uploaded_filename = self._open_input_stream(uploaded_file_path, progress, file_hash=input_hash)
+                base_uploaded_filename_for_error_logging = base_uploaded_filename # Update with actual name
+
+                progress(0.1, desc="File opened. Preparing for audio generation...")
+                output_base_name = os.path.splitext(base_uploaded_filename)[0]
+                settings = self.tts_engine.current_settings()
+                request_key = self.tts_engine.output_key(input_hash, settings)
+
+                # Hits are served straight from the cache, without a workspace or a copy of their own.
+                cached_path = self.tts_engine.output_cache.get(request_key)
+                if cached_path is not None:
+                    progress(1.0, desc="Audiobook served from cache.")
+                    logger.info(f"Served '{output_base_name}' from the output cache: {cached_path}")
+                    return cached_path
+
+                def synthesize() -> str:
+                    logger.info(f"Processing audio for '{output_base_name}'")
+                    path = self.tts_engine.process_audio(
+                        text_stream,
+                        output_base_name,
+                        progress_callback=self._make_tts_progress_callback(progress),
+                        output_dir=self.request_workspaces.create(),
+                        settings=settings,
+                        chunk_callback=chunk_callback,
+                        # Re-running the same file after a crash continues where it stopped.
+                        checkpoint=self.tts_engine.create_checkpoint(input_hash, settings)
+                    )
+                    if path and os.path.exists(path):
+                        path = self.tts_engine.output_cache.put(request_key, path) or path # Moved into the cache
+                    return path
+
+                if self.in_flight_audiobooks.in_flight(request_key):
+                    # Followers only get the leader's finished file, not its live preview.
+                    progress(None, desc="The same book with the same settings is already being generated; waiting for it (no live preview)...")
+                audio_output_path, shared = self.in_flight_audiobooks.do(request_key, synthesize)
+                if shared:
+                    logger.info(f"'{output_base_name}' was generated by an identical concurrent request.")
+
+                if audio_output_path and os.path.exists(audio_output_path):
+                    progress(1.0, desc="Audiobook generated successfully!")
+                    logger.info(f"Audiobook generated successfully: {audio_output_path}")
+                    return audio_output_path
+                elif audio_output_path is None:
+                     logger.warning(f"Audiobook generation for '{output_base_name}' resulted in no output file (e.g. input text was empty after processing).")
+                     raise gr.Error(f"Audiobook generation for '{output_base_name}' did not produce an audio file. The file might be empty or contain no extractable text.")
+                else: # audio_output_path is not None, but file doesn't exist
+                    logger.error(f"Audiobook generation failed for '{output_base_name}'. Output path '{audio_output_path}' does not exist.")
+                    raise gr.Error("Audiobook generation failed: The audio file was not created. Please check logs.")
 
-            if audio_output_path and os.path.exists(audio_output_path):
-                progress(1.0, desc="Audiobook generated successfully!")
-                logger.info(f"Audiobook generated successfully: {audio_output_path}")
-                return audio_output_path
-            elif audio_output_path is None:
-                 logger.warning(f"Audiobook generation for '{output_base_name}' resulted in no output file (e.g. input text was empty after processing).")
-                 raise gr.Error(f"Audiobook generation for '{output_base_name}' did not produce an audio file. Input text might have been empty or unsuitable.")
-            else: # audio_output_path is not None, but file doesn't exist
-                logger.error(f"Audiobook generation failed for '{output_base_name}'. Output path '{audio_output_path}' does not exist.")
-                raise gr.Error("Audiobook generation failed: The audio file was not created. Please check logs.")
-
-        except FileNotFoundError as e:
-            logger.error(f"File not found during audiobook generation for '{base_uploaded_filename_for_error_logging}': {e}", exc_info=True)
+        except Exception as e:
+            self._raise_generation_error(e, base_uploaded_filename_for_error_logging)
+
+    def _raise_generation_error(self, e: Exception, filename: str):
+        """Logs a generation failure and re-raises it as a user-facing gr.Error."""
+        if isinstance(e, gr.Error):
+            raise e
+        if isinstance(e, FileNotFoundError):
+            logger.error(f"File not found during audiobook generation for '{filename}': {e}", exc_info=True)
             raise gr.Error(f"An error occurred: {str(e)}. Ensure the file exists and was uploaded correctly.")
-        except ValueError as e:
-            logger.error(f"Value error during audiobook generation for '{base_uploaded_filename_for_error_logging}': {e}", exc_info=True)
+        if isinstance(e, ValueError):
+            logger.error(f"Value error during audiobook generation for '{filename}': {e}", exc_info=True)
             raise gr.Error(str(e))
-        except NotImplementedError as e:
-            logger.error(f"NotImplementedError during audiobook generation for '{base_uploaded_filename_for_error_logging}': {e}", exc_info=True)
+        if isinstance(e, NotImplementedError):
+            logger.error(f"NotImplementedError during audiobook generation for '{filename}': {e}", exc_info=True)
             raise gr.Error(f"Processing error: {str(e)}. You might need to install additional libraries (e.g., python-docx).")
-        except RuntimeError as e:
-            logger.error(f"Runtime error during audiobook generation for '{base_uploaded_filename_for_error_logging}': {e}", exc_info=True)
+        if isinstance(e, RuntimeError):
+            logger.error(f"Runtime error during audiobook generation for '{filename}': {e}", exc_info=True)
             raise gr.Error(f"Audiobook generation encountered a runtime problem: {str(e)}. Check logs for details.")
-        except Exception as e:
-            logger.critical(f"Critical unexpected error in generate_audiobook for {base_uploaded_filename_for_error_logging}: {e}", exc_info=True)
-            raise gr.Error(f"An unexpected error occurred. Details: {str(e)}. Check application logs.")
-
-    def update_settings(self, lang_code, voice, speed, device):
-        logger.info(f"Updating settings: lang='{lang_code}', voice='{voice}', speed={speed}, device='{device}', format='wav' (hardcoded)")
+        logger.critical(f"Critical unexpected error in audiobook generation for {filename}: {e}", exc_info=True)
+        raise gr.Error(f"An unexpected error occurred. Details: {str(e)}. Check application logs.")
 
-        self.json_handler.set_setting('settings.kokoro_tts.lang_code', lang_code)
-        self.json_handler.set_setting('settings.kokoro_tts.voice', voice)
-        self.json_handler.set_setting('settings.kokoro_tts.speed', float(speed))
-        self.json_handler.set_setting('settings.kokoro_tts.device', device)
+    def generate_chapters(self, uploaded_file_path: str, progress=gr.Progress(), chapter_callback=None, profile: bool = False) -> str:
+        """Chapter mode: renders each chapter to its own file and returns the chapter index path."""
+        progress(0, desc="Initializing...")
+        self.json_handler.reload_if_changed()
+        if not uploaded_file_path:
+            logger.warning("No file uploaded for chapter generation.")
+            raise gr.Error("Please upload a file to generate an audiobook.")
 
+        base_uploaded_filename = os.path.basename(uploaded_file_path)
+        try:
+            with metrics.track_job('chapters'), self._profile(base_uploaded_filename, profile):
+                progress(0.05, desc=f"Reading chapters: {base_uploaded_filename}...")
+                chapters = self.file_reader.read_chapters(uploaded_file_path)
+                if not chapters:
+                    raise ValueError(f"The file '{base_uploaded_filename}' is empty or contains no extractable text.")
+
+                progress(0.1, desc=f"Found {len(chapters)} chapters. Preparing for audio generation...")
+                chapter_workers = int(self.json_handler.get_setting('settings.kokoro_tts.chapter_workers', 1))
+                retention_hours = self.json_handler.get_setting('settings.server.chapter_retention_hours', DEFAULT_BOOK_RETENTION_HOURS)
+                runner = ChapterJobRunner(self.tts_engine, max_parallel_chapters=chapter_workers, retention_hours=retention_hours)
+                index_path = runner.run(
+                    chapters,
+                    os.path.splitext(base_uploaded_filename)[0],
+                    progress_callback=self._make_tts_progress_callback(progress),
+                    chapter_callback=chapter_callback
+                )
+                progress(1.0, desc="Chapters generated successfully!")
+                logger.info(f"Chapters generated successfully: {index_path}")
+                return index_path
+        except Exception as e:
+            self._raise_generation_error(e, base_uploaded_filename)
+
+    def generate_audiobook_stream(self, uploaded_file_path: str, stream_preview: bool = True, split_chapters: bool = False,
+                                  profile: bool = False, progress=gr.Progress()):
+        """
+        Generator wrapper around generate_audiobook for the streaming UI. Yields
+        (preview_chunk, final_audio_path, chapter_files) tuples: preview audio is streamed
+        while the book is being synthesized and the complete file is delivered at the end.
+        In chapter mode, the list of chapter files grows as chapters finish instead.
+        With profile, the job is profiled into logs/profiles/ (see utils.profiling).
+        """
+        if split_chapters:
+            yield from self._generate_chapters_stream(uploaded_file_path, progress, profile)
+            return
+        if not stream_preview:
+            yield gr.skip(), self.generate_audiobook(uploaded_file_path, progress, profile=profile), gr.skip()
+            return
+
+        chunk_queue = queue.Queue()
+        end_of_stream = object()
+        result = {}
+
+        def run_generation():
+            try:
+                result['path'] = self.generate_audiobook(uploaded_file_path, progress, chunk_callback=chunk_queue.put, profile=profile)
+            except Exception as e:
+                result['error'] = e
+            finally:
+                chunk_queue.put(end_of_stream)
+
+        generation_thread = threading.Thread(target=run_generation, name="audiobook-generation", daemon=True)
+        generation_thread.start()
+
+        finished = False
+        while not finished:
+            chunks = [chunk_queue.get()]
+            # Send everything that piled up since the last yield as one preview chunk.
+            while True:
+                try:
+                    chunks.append(chunk_queue.get_nowait())
+                except queue.Empty:
+                    break
+            if chunks[-1] is end_of_stream:
+                finished = True
+                chunks.pop()
+            if chunks:
+                yield (self.tts_engine.sample_rate, float_to_pcm16(np.concatenate(chunks))), gr.skip(), gr.skip()
+
+        generation_thread.join()
+        if 'error' in result:
+            raise result['error']
+        yield gr.skip(), result['path'], gr.skip()
+
+    def _generate_chapters_stream(self, uploaded_file_path: str, progress, profile: bool = False):
+        """Runs chapter mode in a background thread and yields the chapter files as they finish."""
+        finished_queue = queue.Queue()
+        end_of_stream = object()
+        result = {}
+
+        def run_generation():
+            try:
+                result['index_path'] = self.generate_chapters(uploaded_file_path, progress, chapter_callback=finished_queue.put, profile=profile)
+            except Exception as e:
+                result['error'] = e
+            finally:
+                finished_queue.put(end_of_stream)
+
+        generation_thread = threading.Thread(target=run_generation, name="chapter-generation", daemon=True)
+        generation_thread.start()
+
+        finished_files = {}
+        while True:
+            entry = finished_queue.get()
+            if entry is end_of_stream:
+                break
+            if entry['status'] == 'done':
+                finished_files[entry['number']] = entry['path']
+                yield gr.skip(), gr.skip(), [finished_files[number] for number in sorted(finished_files)]
+
+        generation_thread.join()
+        if 'error' in result:
+            raise result['error']
+        index_path = result['index_path']
+        book_dir = os.path.dirname(index_path)
+        playlist_files = [os.path.join(book_dir, name) for name in sorted(os.listdir(book_dir)) if name.endswith('.m3u')]
+        yield gr.skip(), gr.skip(), [finished_files[number] for number in sorted(finished_files)] + [index_path] + playlist_files
+
+    def update_settings(self, lang_code, voice, speed, device, output_format, bitrate_kbps):
+        logger.info(f"Updating settings: lang='{lang_code}', voice='{voice}', speed={speed}, device='{device}', format='{output_format}', bitrate={bitrate_kbps} kbps")
+
+        apply_error = None
         try:
-            self.tts_engine = kokoro.Kokoro_TTS(
+            # Applied before saving, so the engine's settings subscriber has nothing left to do.
+            # Warm pipelines are kept in the engine pool, so this only loads a model when the
+            # language/device combination has not been used recently.
+            self.tts_engine.apply_settings(
                 lang_code=lang_code,
                 voice=voice,
                 speed=float(speed),
-                device=device
+                device=device,
+                output_format=output_format,
+                bitrate_kbps=int(bitrate_kbps)
             )
-            logger.info("Settings updated and TTS engine re-initialized successfully.")
-            return "Settings updated successfully!"
-        except RuntimeError as e:
-            logger.error(f"Failed to re-initialize TTS engine with new settings: {e}", exc_info=True)
-            return f"Settings saved, but TTS engine re-initialization failed: {e}. Check logs."
         except Exception as e:
-            logger.error(f"Unexpected error during settings update or TTS re-initialization: {e}", exc_info=True)
-            return f"Unexpected error during settings update: {e}. Check logs."
+            apply_error = e
+
+        # One atomic write for all of them; other processes sharing config.json pick them up from there.
+        with self.json_handler.transaction() as settings:
+            settings.set('settings.kokoro_tts.lang_code', lang_code)
+            settings.set('settings.kokoro_tts.voice', voice)
+            settings.set('settings.kokoro_tts.speed', float(speed))
+            settings.set('settings.kokoro_tts.device', device)
+            settings.set('settings.kokoro_tts.output_format', output_format)
+            settings.set('settings.kokoro_tts.bitrate_kbps', int(bitrate_kbps))
+
+        if isinstance(apply_error, RuntimeError):
+            logger.error(f"Failed to re-initialize TTS engine with new settings: {apply_error}", exc_info=apply_error)
+            return f"Settings saved, but TTS engine re-initialization failed: {apply_error}. Check logs."
+        if apply_error is not None:
+            logger.error(f"Unexpected error during settings update or TTS re-initialization: {apply_error}", exc_info=apply_error)
+            return f"Unexpected error during settings update: {apply_error}. Check logs."
+        if not settings.committed:
+            return "Settings applied, but saving them to config/config.json failed. Check logs."
+        logger.info("Settings updated and applied to the TTS engine successfully.")
+        return "Settings updated successfully!"
 
     def build_settings_components(self):
         logger.info("Building settings UI components.")
@@ -142,6 +344,8 @@ class AudiobookGeneratorApp:
         current_voice = kokoro_settings.get('voice', "")
         current_speed = float(kokoro_settings.get('speed', 1.0))
         current_device = kokoro_settings.get('device', 'cpu')
+        current_output_format = kokoro_settings.get('output_format', kokoro.DEFAULT_OUTPUT_FORMAT)
+        current_bitrate = int(kokoro_settings.get('bitrate_kbps', kokoro.DEFAULT_BITRATE_KBPS))
 
         available_lang_codes = list(language_voices_map.keys())
         initial_voices = language_voices_map.get(current_lang_code, [])
@@ -166,6 +370,13 @@ class AudiobookGeneratorApp:
         device_input = gr.Radio(
             choices=["cpu", "cuda"], value=current_device, label="Device", interactive=True
         )
+        with gr.Row():
+            output_format_input = gr.Dropdown(
+                label="Output Format", choices=list(OUTPUT_FORMATS), value=current_output_format, interactive=True
+            )
+            bitrate_input = gr.Slider(
+                minimum=16, maximum=192, step=8, value=current_bitrate, label="Bitrate (kbps, Opus/MP3 only)", interactive=True
+            )
 
         update_button = gr.Button("Update Settings")
         output_message = gr.Textbox(label="Status", interactive=False, lines=1)
@@ -183,7 +394,7 @@ class AudiobookGeneratorApp:
 
         update_button.click(
             fn=self.update_settings,
-            inputs=[lang_code_input, voice_input, speed_input, device_input],
+            inputs=[lang_code_input, voice_input, speed_input, device_input, output_format_input, bitrate_input],
             outputs=output_message
         )
         logger.info("Settings UI components built.")
@@ -196,9 +407,18 @@ class AudiobookGeneratorApp:
                 with gr.TabItem("Audiobook Generator"):
                     gr.Markdown("## Audiobook Generator")
                     gr.Interface(
-                        fn=self.generate_audiobook,
-                        inputs=[gr.File(label="Upload your document (TXT, PDF, EPUB, DOCX, HTML)", type="filepath")],
-                        outputs=[gr.Audio(label="Generated Audiobook (WAV format)", type="filepath")],
+                        fn=self.generate_audiobook_stream,
+                        inputs=[
+                            gr.File(label="Upload your document (TXT, PDF, EPUB, DOCX, HTML)", type="filepath"),
+                            gr.Checkbox(label="Stream preview while generating", value=True),
+                            gr.Checkbox(label="Split into chapters (one file per chapter)", value=False),
+                            gr.Checkbox(label="Profile this job (flame graph and hotspots in logs/profiles/)", value=False)
+                        ],
+                        outputs=[
+                            gr.Audio(label="Live Preview", streaming=True, autoplay=True),
+                            gr.Audio(label="Generated Audiobook", type="filepath"),
+                            gr.File(label="Chapter Files", file_count="multiple")
+                        ],
                         allow_flagging="never"
                     )
 
@@ -208,11 +428,32 @@ class AudiobookGeneratorApp:
         logger.info("Gradio main interface with gr.Tabs created.")
         return demo_ui
 
+    def create_server_app(self, main_ui: gr.Blocks) -> FastAPI:
+        """Mounts the Gradio UI on a FastAPI app that also serves the job API and Prometheus metrics."""
+        server_app = FastAPI(title="NarrateAI")
+        server_app.include_router(create_jobs_router(self.job_scheduler, list(self.file_reader.supported_extensions)))
+
+        @server_app.get(METRICS_ROUTE, include_in_schema=False)
+        def metrics_endpoint():
+            return Response(content=metrics.REGISTRY.expose(), media_type=metrics.PROMETHEUS_CONTENT_TYPE)
+
+        return gr.mount_gradio_app(server_app, main_ui, path="/")
+
     def launch(self):
         logger.info("Launching Gradio interface.")
         main_ui = self.create_main_interface()
-        main_ui.launch(share=False, inbrowser=True)
-        logger.info("Gradio interface launched.")
+        main_ui.queue(default_concurrency_limit=self.max_concurrent_requests)
+        server_app = self.create_server_app(main_ui)
+        self.tts_engine.start_warm_up()
+        self.job_scheduler.start()
+        url = f"http://{SERVER_HOST}:{SERVER_PORT}/"
+        logger.info(f"Serving the UI at {url} ({self.max_concurrent_requests} concurrent requests) and metrics at {url.rstrip('/')}{METRICS_ROUTE}")
+        threading.Timer(1.5, webbrowser.open, args=(url,)).start()
+        try:
+            uvicorn.run(server_app, host=SERVER_HOST, port=SERVER_PORT, log_level="warning")
+        finally:
+            self.job_scheduler.stop()
+        logger.info("Gradio interface stopped.")
 
 if __name__ == "__main__":
     if not os.path.exists(OUTPUTS_DIR):
@@ -0,0 +1,46 @@
+"""
+Fetches the Kokoro model and voices into the local store (settings.kokoro_tts.model_store_dir),
+so the app can afterwards run with settings.kokoro_tts.offline set to true. Files that are
+already in the store are skipped, so the command can simply be run again after adding voices.
+
+Run from the repository root, like main.py:
+    python src/NarrateAI/preload.py                      # every voice in language_voices_map
+    python src/NarrateAI/preload.py --voices af_heart bf_emma
+"""
+import argparse
+import sys
+from typing import List, Optional
+from loguru import logger
+import utils.logging_config as lf
+from audio.kokoro_tts import KOKORO_REPO_ID
+from audio.voice_store import VoiceStore, configured_store_dir, configured_voices
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Download the Kokoro model and voices for offline use.")
+    parser.add_argument('--voices', nargs='+', help="Voices to fetch (default: every voice in settings.kokoro_tts.language_voices_map).")
+    parser.add_argument('--no-model', action='store_true', help="Only fetch voices, not the model weights.")
+    parser.add_argument('--repo-id', default=KOKORO_REPO_ID)
+    parser.add_argument('--store-dir', help="Overrides settings.kokoro_tts.model_store_dir.")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    lf.setup_logging()
+
+    voices = args.voices or configured_voices()
+    # Preloading is what makes offline mode possible, so it always goes online.
+    store = VoiceStore(args.repo_id, args.store_dir or configured_store_dir(), offline=False)
+    logger.info(f"Preloading {'' if args.no_model else 'the model and '}{len(voices)} voices into '{store.root}'...")
+    summary = store.preload(voices, include_model=not args.no_model)
+    logger.info(f"Preload finished: {len(summary['downloaded'])} downloaded, {len(summary['present'])} already present, "
+                f"{len(summary['failed'])} failed.")
+    if summary['failed']:
+        logger.error(f"Could not fetch: {', '.join(summary['failed'])}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
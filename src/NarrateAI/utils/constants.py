@@ -1,8 +1,29 @@
+import os
+
 # --- Application Behavior ---
 DEBUG_MODE = False
 
 # --- Configuration ---
 CONFIG_FILE_PATH = 'config/config.json'
 
+# --- Server ---
+SERVER_HOST = '127.0.0.1'
+SERVER_PORT = 7860
+METRICS_ROUTE = '/metrics'
+
 # --- Directories ---
-OUTPUTS_DIR = 'outputs'
\ No newline at end of file
+LOGS_DIR = 'logs'
+PROFILES_DIR = os.path.join(LOGS_DIR, 'profiles') # Profiles of web UI jobs (settings.profiling)
+OUTPUTS_DIR = 'outputs'
+CACHE_DIR = os.path.join(OUTPUTS_DIR, 'cache')
+SEGMENT_CACHE_DIR = os.path.join(CACHE_DIR, 'segments')
+TEXT_CACHE_DIR = os.path.join(CACHE_DIR, 'text')
+G2P_CACHE_PATH = os.path.join(CACHE_DIR, 'g2p.sqlite3')
+OUTPUT_CACHE_DIR = os.path.join(CACHE_DIR, 'outputs') # Finished audiobooks, served again for identical requests
+WORK_DIR = os.path.join(OUTPUTS_DIR, '.work') # Checkpoints of unfinished jobs
+RAM_FS_DIR = '/dev/shm' # tmpfs on Linux
+MEMORY_WORK_DIR = os.path.join(RAM_FS_DIR, 'narrateai', 'work') # Same, in RAM (settings.kokoro_tts.workspace_storage = 'memory')
+REQUESTS_DIR = os.path.join(OUTPUTS_DIR, 'requests') # One workspace per web UI request
+JOBS_DIR = os.path.join(OUTPUTS_DIR, 'jobs')
+JOBS_DB_PATH = os.path.join(JOBS_DIR, 'jobs.sqlite3')
+MODELS_DIR = 'models' # Local model and voice store for offline use
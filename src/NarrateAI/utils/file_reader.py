@@ -1,9 +1,95 @@
+import multiprocessing
 import os
-from pdfreader import SimplePDFViewer, PageDoesNotExist
-import ebooklib
-from ebooklib import epub
-from bs4 import BeautifulSoup
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Iterator, List, NamedTuple, Optional, Tuple
 from loguru import logger
+import utils.json_handler as jh
+from utils.constants import TEXT_CACHE_DIR
+from utils.perf import StageTimings
+import utils.metrics as metrics
+from utils.text_cache import TextCache, hash_file
+
+# Upper bound on the size of a single piece yielded by the TXT stream reader.
+TXT_STREAM_BLOCK_CHARS = 64 * 1024
+# Parallel extraction only pays off once a document is big enough to amortize the task overhead.
+PARALLEL_PDF_MIN_PAGES = 32
+PDF_PAGES_PER_TASK = 16
+PARALLEL_EPUB_MIN_DOCUMENTS = 8
+DEFAULT_TEXT_CACHE_MAX_BYTES = 256 * 1024 * 1024 # 256MB
+TEXT_CACHE_VERSION = 2
+# The format libraries (pdfreader, ebooklib, bs4, python-docx) are imported by the functions
+# that use them, so starting the app does not pay for formats nobody has opened yet.
+
+
+class Chapter(NamedTuple):
+    title: str
+    text: str
+
+
+def _decode_pdf_string(value) -> str:
+    if isinstance(value, bytes):
+        if value.startswith(b'\xfe\xff'):
+            return value[2:].decode('utf-16-be', errors='replace')
+        return value.decode('latin-1')
+    return str(value) if value is not None else ""
+
+
+# --- Extraction worker functions (run in worker processes) ---
+def _extract_pdf_pages(path_to_file: str, first_page: int, page_count: int) -> List[str]:
+    from pdfreader import SimplePDFViewer, PageDoesNotExist
+    pages = []
+    with open(path_to_file, "rb") as file:
+        viewer = SimplePDFViewer(file)
+        try:
+            viewer.navigate(first_page)
+            for page_offset in range(page_count):
+                if page_offset:
+                    viewer.next()
+                viewer.render()
+                pages.append("".join(viewer.canvas.strings))
+        except PageDoesNotExist:
+            pass
+        except Exception as e:
+            logger.error(f"Error reading PDF page {first_page + len(pages)} in '{path_to_file}': {e}", exc_info=True)
+    return pages
+
+
+def _html_to_text(html_content: bytes, parser: str) -> str:
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(html_content, parser).get_text(separator='\n')
+
+
+def _resolve_html_parser(preference: str) -> str:
+    """Maps the configured parser ('auto', 'lxml' or 'html.parser') to one that is installed."""
+    if preference in ('auto', 'lxml'):
+        try:
+            import lxml  # noqa: F401 - optional, much faster than html.parser
+            return 'lxml'
+        except ImportError:
+            if preference == 'lxml':
+                logger.warning("HTML parser 'lxml' is configured but not installed. Falling back to 'html.parser'.")
+    return 'html.parser'
+
+
+_extraction_executor: Optional[ProcessPoolExecutor] = None
+_extraction_executor_workers = 0
+_extraction_executor_lock = threading.Lock()
+
+
+def _get_extraction_executor(num_workers: int) -> ProcessPoolExecutor:
+    """Returns a long-lived process pool so worker start-up is paid once, not per document."""
+    global _extraction_executor, _extraction_executor_workers
+    with _extraction_executor_lock:
+        if _extraction_executor is None or _extraction_executor_workers != num_workers:
+            if _extraction_executor is not None:
+                _extraction_executor.shutdown(wait=False)
+            _extraction_executor = ProcessPoolExecutor(max_workers=num_workers, mp_context=multiprocessing.get_context('spawn'))
+            _extraction_executor_workers = num_workers
+            logger.info(f"Started document extraction pool with {num_workers} workers.")
+        return _extraction_executor
+
 
 class FileReader:
     def __init__(self):
@@ -15,38 +101,94 @@ class FileReader:
             '.html': self._read_html,
             '.htm': self._read_html,
         }
+        # Formats that can be read incrementally. Concatenating the yielded pieces gives
+        # exactly what the matching _read_* method returns.
+        self.streaming_readers = {
+            '.txt': self._iter_txt,
+            '.pdf': self._iter_pdf,
+            '.epub': self._iter_epub,
+        }
+
+        reader_settings = jh.JsonHandler().get_setting('settings.file_reader', {}) or {}
+        # 0 picks a worker count from the CPU count; 1 extracts serially in this process.
+        self.extraction_workers = int(reader_settings.get('extraction_workers', 0)) or min(os.cpu_count() or 1, 4)
+        self.html_parser = _resolve_html_parser(reader_settings.get('html_parser', 'auto'))
+        self.text_cache = TextCache(TEXT_CACHE_DIR, int(reader_settings.get('text_cache_max_bytes', DEFAULT_TEXT_CACHE_MAX_BYTES)))
     
     def _read_txt(self, path_to_file: str) -> str:
         logger.debug(f"Reading TXT file: {path_to_file}")
         with open(path_to_file, "r", encoding='utf-8') as file:
             return file.read()
 
+    def _iter_txt(self, path_to_file: str) -> Iterator[str]:
+        """Yields the file in blocks that end on a paragraph break where possible."""
+        logger.debug(f"Streaming TXT file: {path_to_file}")
+        with open(path_to_file, "r", encoding='utf-8') as file:
+            block_lines = []
+            block_chars = 0
+            for line in file:
+                block_lines.append(line)
+                block_chars += len(line)
+                if block_chars >= TXT_STREAM_BLOCK_CHARS or (block_chars >= TXT_STREAM_BLOCK_CHARS // 4 and not line.strip()):
+                    yield "".join(block_lines)
+                    block_lines = []
+                    block_chars = 0
+            if block_lines:
+                yield "".join(block_lines)
+
     def _read_pdf(self, path_to_file: str) -> str:
         logger.debug(f"Reading PDF file: {path_to_file}")
+        return "".join(self._iter_pdf(path_to_file))
+
+    def _iter_pdf(self, path_to_file: str) -> Iterator[str]:
+        """Yields the text of one page at a time, rendering page ranges in parallel for large files."""
+        from pdfreader import PDFDocument, SimplePDFViewer, PageDoesNotExist
+        if self.extraction_workers > 1:
+            try:
+                with open(path_to_file, "rb") as file:
+                    page_count = sum(1 for _page in PDFDocument(file).pages())
+            except Exception as e:
+                logger.warning(f"Could not count pages of '{path_to_file}', extracting serially: {e}")
+                page_count = 0
+            if page_count >= PARALLEL_PDF_MIN_PAGES:
+                logger.debug(f"Extracting {page_count} PDF pages with {self.extraction_workers} workers.")
+                first_pages = range(1, page_count + 1, PDF_PAGES_PER_TASK)
+                executor = _get_extraction_executor(self.extraction_workers)
+                # map() yields page ranges in order, as soon as each one is ready.
+                for pages in executor.map(_extract_pdf_pages, repeat(path_to_file), first_pages, repeat(PDF_PAGES_PER_TASK)):
+                    yield from pages
+                return
+
         with open(path_to_file, "rb") as file:
             viewer = SimplePDFViewer(file)
-            content = ""
             try:
                 while True:
                     viewer.render()
-                    content += "".join(viewer.canvas.strings)
+                    yield "".join(viewer.canvas.strings)
                     viewer.next()
             except PageDoesNotExist:
                 logger.debug("Reached end of PDF document.")
             except Exception as e:
                 logger.error(f"Error reading PDF page in '{path_to_file}': {e}", exc_info=True)
-            return content
 
     def _read_epub(self, path_to_file: str) -> str:
         logger.debug(f"Reading EPUB file: {path_to_file}")
+        return "".join(self._iter_epub(path_to_file))
+
+    def _iter_epub(self, path_to_file: str) -> Iterator[str]:
+        """Yields the text of one document (usually a chapter) at a time."""
+        import ebooklib
+        from ebooklib import epub
         book = epub.read_epub(path_to_file)
-        content_parts = []
-        for item in book.get_items():
-            if item.get_type() == ebooklib.ITEM_DOCUMENT:
-                soup = BeautifulSoup(item.get_content(), 'html.parser')
-                text = soup.get_text(separator='\n')
-                content_parts.append(text)
-        return '\n'.join(content_parts)
+        documents = [item.get_content() for item in book.get_items() if item.get_type() == ebooklib.ITEM_DOCUMENT]
+        if self.extraction_workers > 1 and len(documents) >= PARALLEL_EPUB_MIN_DOCUMENTS:
+            logger.debug(f"Parsing {len(documents)} EPUB documents with {self.extraction_workers} workers ('{self.html_parser}').")
+            executor = _get_extraction_executor(self.extraction_workers)
+            texts = executor.map(_html_to_text, documents, repeat(self.html_parser), chunksize=2)
+        else:
+            texts = (_html_to_text(document, self.html_parser) for document in documents)
+        for index, text in enumerate(texts):
+            yield text if index == 0 else '\n' + text
 
     def _read_docx(self, path_to_file: str) -> str:
         logger.debug(f"Reading DOCX file: {path_to_file}")
@@ -66,9 +208,10 @@ class FileReader:
 
     def _read_html(self, path_to_file: str) -> str:
         logger.debug(f"Reading HTML file: {path_to_file}")
+        from bs4 import BeautifulSoup
         try:
             with open(path_to_file, "r", encoding='utf-8') as file:
-                soup = BeautifulSoup(file, 'html.parser')
+                soup = BeautifulSoup(file, self.html_parser)
                 # Attempt to get meaningful text, often from the body
                 body = soup.find('body')
                 if body:
@@ -80,28 +223,210 @@ class FileReader:
             logger.error(f"Error reading HTML file '{path_to_file}': {e}", exc_info=True)
             raise ValueError(f"Could not read HTML file '{path_to_file}'.")
 
-    def read_file(self, path_to_file: str) -> str:
+    def _pdf_outline_starts(self, path_to_file: str) -> List[Tuple[int, str]]:
+        """Returns (0-based page index, title) for each top-level PDF outline entry."""
+        from pdfreader import PDFDocument
+        with open(path_to_file, "rb") as file:
+            doc = PDFDocument(file)
+            outlines = doc.root.Outlines
+            if not outlines:
+                return []
+            pages = list(doc.pages())
+            starts = []
+            item = outlines.First
+            while item is not None:
+                destination = item.Dest or (item.A or {}).get('D')
+                # Named destinations are not resolved; such entries are skipped.
+                if isinstance(destination, list) and destination:
+                    target_page = destination[0]
+                    page_index = next((index for index, page in enumerate(pages) if dict.__eq__(page, target_page)), None)
+                    if page_index is not None:
+                        starts.append((page_index, _decode_pdf_string(item.Title).strip()))
+                item = item.Next
+            return sorted(starts, key=lambda start: start[0])
+
+    def _read_pdf_chapters(self, path_to_file: str) -> List[Chapter]:
+        page_texts = list(self._iter_pdf(path_to_file))
+        try:
+            starts = self._pdf_outline_starts(path_to_file)
+        except Exception as e:
+            logger.warning(f"Could not read the outline of '{path_to_file}': {e}")
+            starts = []
+        if not starts:
+            return []
+        chapters = []
+        if starts[0][0] > 0:
+            chapters.append(Chapter("Front Matter", "".join(page_texts[:starts[0][0]])))
+        for position, (first_page, title) in enumerate(starts):
+            last_page = starts[position + 1][0] if position + 1 < len(starts) else len(page_texts)
+            chapters.append(Chapter(title, "".join(page_texts[first_page:last_page])))
+        return chapters
+
+    def _read_epub_chapters(self, path_to_file: str) -> List[Chapter]:
+        """Keeps spine items as chapters, titled from the TOC. Spine items without a TOC entry
+        (e.g. a chapter split over several files) are merged into the preceding chapter."""
+        import ebooklib
+        from ebooklib import epub
+        book = epub.read_epub(path_to_file)
+        toc_titles = {}
+
+        def collect_toc(entries):
+            for entry in entries:
+                if isinstance(entry, tuple):
+                    section, children = entry
+                    if getattr(section, 'href', None):
+                        toc_titles.setdefault(section.href.split('#')[0], section.title)
+                    collect_toc(children)
+                elif getattr(entry, 'href', None):
+                    toc_titles.setdefault(entry.href.split('#')[0], entry.title)
+        collect_toc(book.toc)
+
+        chapters: List[List[str]] = [] # [title, text] pairs, merged in place
+        for item_id, _linear in book.spine:
+            item = book.get_item_with_id(item_id)
+            # The navigation document only repeats the table of contents.
+            if item is None or item.get_type() != ebooklib.ITEM_DOCUMENT or isinstance(item, epub.EpubNav):
+                continue
+            text = _html_to_text(item.get_content(), self.html_parser)
+            title = toc_titles.get(item.get_name())
+            if title or not chapters:
+                chapters.append([title or "Front Matter", text])
+            else:
+                chapters[-1][1] += '\n' + text
+        return [Chapter(title, text) for title, text in chapters]
+
+    def _read_docx_chapters(self, path_to_file: str) -> List[Chapter]:
+        """Splits at the top-most heading level used in the document."""
+        try:
+            from docx import Document  # Requires `pip install python-docx`
+        except ImportError:
+            logger.error("The 'python-docx' library is required to read DOCX files. Please install it (e.g., `pip install python-docx`).")
+            raise NotImplementedError("DOCX reading requires the 'python-docx' library. Please install it.")
+        doc = Document(path_to_file)
+
+        def heading_level(paragraph) -> Optional[int]:
+            style_name = paragraph.style.name if paragraph.style is not None else ""
+            if style_name == 'Title':
+                return 0
+            if style_name.startswith('Heading '):
+                level = style_name[len('Heading '):]
+                return int(level) if level.isdigit() else None
+            return None
+
+        levels = [heading_level(para) for para in doc.paragraphs]
+        used_levels = [level for level in levels if level is not None and level > 0]
+        if not used_levels:
+            return []
+        split_level = min(used_levels)
+
+        chapters: List[List] = []
+        for para, level in zip(doc.paragraphs, levels):
+            if level == split_level:
+                chapters.append([para.text.strip() or f"Chapter {len(chapters) + 1}", [para.text]])
+            elif chapters:
+                chapters[-1][1].append(para.text)
+            else:
+                chapters.append(["Front Matter", [para.text]])
+        return [Chapter(title, '\n'.join(parts)) for title, parts in chapters]
+
+    def read_chapters(self, path_to_file: str) -> List[Chapter]:
+        """
+        Reads a file as a list of chapters: EPUB spine items, DOCX headings or PDF outline
+        entries. Documents without chapter structure (and TXT/HTML files) come back as a
+        single chapter named after the file. Chapters without text are dropped.
+        """
+        file_extension = self._get_file_extension(path_to_file)
+        logger.info(f"Reading chapters of '{path_to_file}'")
+        chapter_readers = {
+            '.pdf': self._read_pdf_chapters,
+            '.epub': self._read_epub_chapters,
+            '.docx': self._read_docx_chapters,
+        }
+        try:
+            chapter_reader = chapter_readers.get(file_extension)
+            chapters = chapter_reader(path_to_file) if chapter_reader else []
+            if not chapters:
+                title = os.path.splitext(os.path.basename(path_to_file))[0]
+                chapters = [Chapter(title, "".join(self._iter_units(path_to_file, file_extension)))]
+        except (NotImplementedError, ValueError):
+            raise
+        except Exception as e:
+            logger.error(f"Failed to read chapters of '{path_to_file}': {e}", exc_info=True)
+            raise ValueError(f"Error processing file '{os.path.basename(path_to_file)}': {e}")
+        chapters = [chapter for chapter in chapters if chapter.text and not chapter.text.isspace()]
+        logger.info(f"Found {len(chapters)} chapters in '{path_to_file}'.")
+        return chapters
+
+    def _get_file_extension(self, path_to_file: str) -> str:
         if not os.path.isfile(path_to_file):
             logger.error(f"File not found: '{path_to_file}'")
             raise FileNotFoundError(f"No such file: '{path_to_file}'")
 
         file_extension = os.path.splitext(path_to_file)[1].lower()
-        logger.info(f"Attempting to read file: '{path_to_file}' with extension '{file_extension}'")
-
-        reader_method = self.supported_extensions.get(file_extension)
-
-        if reader_method:
-            try:
-                content = reader_method(path_to_file)
-                logger.info(f"Successfully read file: '{path_to_file}'")
-                return content
-            except NotImplementedError as nie:
-                logger.error(f"{nie} for file '{path_to_file}'")
-                raise nie 
-            except Exception as e:
-                logger.error(f"Failed to read file '{path_to_file}' with extension '{file_extension}': {e}", exc_info=True)
-                raise ValueError(f"Error processing file '{os.path.basename(path_to_file)}': {e}")
-        else:
+        if file_extension not in self.supported_extensions:
             logger.warning(f"Unsupported file extension: '{file_extension}' for file '{path_to_file}'")
             supported_ext_str = ", ".join(self.supported_extensions.keys())
             raise ValueError(f"Unsupported file extension: '{file_extension}'. Supported extensions are: {supported_ext_str}")
+        return file_extension
+
+    def iter_file(self, path_to_file: str, file_hash: Optional[str] = None) -> Iterator[str]:
+        """
+        Reads a file incrementally, yielding text page by page (PDF), document by document
+        (EPUB) or in paragraph-aligned blocks (TXT). Formats without a streaming reader are
+        yielded as a single piece. The path and extension are validated before this returns;
+        read errors surface while iterating, with the same exception types as read_file.
+        Callers that already hashed the file pass file_hash, so it is not read twice.
+        """
+        file_extension = self._get_file_extension(path_to_file)
+        logger.info(f"Streaming file: '{path_to_file}' with extension '{file_extension}'")
+        return self._iter_units(path_to_file, file_extension, file_hash)
+
+    def _iter_units(self, path_to_file: str, file_extension: str, file_hash: Optional[str] = None) -> Iterator[str]:
+        document_format = file_extension.lstrip('.')
+        try:
+            cache_key = None
+            if self.text_cache.enabled:
+                cache_key = f"{file_hash or hash_file(path_to_file)}-{document_format}-{self.html_parser}-v{TEXT_CACHE_VERSION}"
+                cached_units = self.text_cache.get(cache_key)
+                metrics.CACHE_REQUESTS.inc(cache='text', result='hit' if cached_units is not None else 'miss')
+                if cached_units is not None:
+                    logger.info(f"Reusing cached text for '{path_to_file}'.")
+                    metrics.DOCUMENTS_READ.inc(format=document_format, cache='hit')
+                    for unit in cached_units:
+                        metrics.CHARACTERS_READ.inc(len(unit))
+                        yield unit
+                    return
+
+            stream_method = self.streaming_readers.get(file_extension)
+            if stream_method:
+                units_source = stream_method(path_to_file)
+            else:
+                units_source = iter([self.supported_extensions[file_extension](path_to_file)])
+
+            # Only time spent extracting is measured, not time the consumer holds on to a piece.
+            read_timings = StageTimings()
+            extracted_units = read_timings.timed_iter('read', units_source)
+            if cache_key:
+                # Pieces go to the cache file as they are read, so the document is never held in memory.
+                extracted_units = self.text_cache.write_through(cache_key, extracted_units)
+            unit_count = character_count = 0
+            for unit in extracted_units:
+                unit_count += 1
+                character_count += len(unit)
+                yield unit
+            logger.info(f"Successfully extracted text from '{path_to_file}' ({unit_count} pieces).")
+            metrics.READ_DURATION.observe(read_timings.seconds('read'), format=document_format)
+            metrics.STAGE_DURATION.observe(read_timings.seconds('read'), stage='read')
+            metrics.DOCUMENTS_READ.inc(format=document_format, cache='miss' if cache_key else 'disabled')
+            metrics.CHARACTERS_READ.inc(character_count)
+        except NotImplementedError as nie:
+            logger.error(f"{nie} for file '{path_to_file}'")
+            raise nie
+        except Exception as e:
+            logger.error(f"Failed to read file '{path_to_file}' with extension '{file_extension}': {e}", exc_info=True)
+            raise ValueError(f"Error processing file '{os.path.basename(path_to_file)}': {e}")
+
+    def read_file(self, path_to_file: str) -> str:
+        file_extension = self._get_file_extension(path_to_file)
+        logger.info(f"Attempting to read file: '{path_to_file}' with extension '{file_extension}'")
+        return "".join(self._iter_units(path_to_file, file_extension))
@@ -1,11 +1,60 @@
+import copy
 import json
 import os
+import queue
 import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 from loguru import logger
 from utils.constants import CONFIG_FILE_PATH
 
+RELOAD_CHECK_INTERVAL = 1.0 # Seconds between checks of the config file for external edits
+_MISSING = object()
+
+SettingsCallback = Callable[[Dict[str, Any]], None]
+
+
+def _flatten(data: Any, prefix: str = '') -> Dict[str, Any]:
+    """Maps the dotted path of every leaf setting to its value."""
+    if not isinstance(data, dict) or not data:
+        return {prefix: data} if prefix else {}
+    flat = {}
+    for key, value in data.items():
+        flat.update(_flatten(value, f"{prefix}.{key}" if prefix else str(key)))
+    return flat
+
+
+def _diff(old: dict, new: dict) -> Dict[str, Any]:
+    """Dotted paths of the settings that differ between two configs, with their new values (None if removed)."""
+    old_flat, new_flat = _flatten(old), _flatten(new)
+    return {key: new_flat.get(key) for key in old_flat.keys() | new_flat.keys() if old_flat.get(key, _MISSING) != new_flat.get(key, _MISSING)}
+
+
+class SettingsTransaction:
+    """Settings collected by JsonHandler.transaction(); they are written together when the block ends."""
+
+    def __init__(self):
+        self.changes: Dict[str, Any] = {}
+        self.committed = False
+
+    def set(self, key_path: str, value):
+        self.changes[key_path] = value
+
+
 class JsonHandler:
+    """
+    Process-wide access to config/config.json.
+
+    Lookups of dotted key paths are cached. The file is checked for external edits (e.g.
+    by hand or by another process) at most every RELOAD_CHECK_INTERVAL seconds and
+    reloaded when its modification time or size changed. Writes go through
+    set_settings() or transaction(), which apply any number of keys in one atomic
+    replace of the file. Subscribers are told about every changed setting, whether the
+    change came from this process or from the file, on a notifier thread of their own.
+    """
+
     _instance = None
     _lock = threading.Lock()
 
@@ -20,9 +69,23 @@ class JsonHandler:
         if self._initialized:
             return
         self.config_path = Path(config_path)
+        self._config_lock = threading.RLock()
+        self._lookups: Dict[str, Any] = {}
+        self._subscribers: List[Tuple[str, SettingsCallback]] = []
+        self._notifications: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+        self._notifier: Optional[threading.Thread] = None
+        self._file_state = self._stat()
+        self._last_check = time.monotonic()
         self.config_data = self._load_config()
         self._initialized = True
 
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.config_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
     def _load_config(self):
         if not self.config_path.exists():
             logger.error(f"Config file not found at {self.config_path}.")
@@ -40,44 +103,177 @@ class JsonHandler:
             raise
 
     def _save_config(self, data):
+        # Written next to the config and moved over it, so readers (and other processes) never see a partial file.
+        tmp_path = self.config_path.with_name(f"{self.config_path.name}.{os.getpid()}-{threading.get_ident()}.tmp")
         try:
             self.config_path.parent.mkdir(parents=True, exist_ok=True)
-            with self.config_path.open('w', encoding='utf-8') as f:
+            with tmp_path.open('w', encoding='utf-8') as f:
                 json.dump(data, f, indent=4, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.config_path)
             logger.info(f"Configuration saved to {self.config_path}")
         except Exception as e:
             logger.error(f"Failed to save configuration to {self.config_path}: {e}", exc_info=True)
+            try:
+                tmp_path.unlink()
+            except OSError:
+                pass
             raise
 
+    def _reload_locked(self, force: bool = False) -> Dict[str, Any]:
+        """Reloads the file if it changed on disk and returns the changed settings."""
+        now = time.monotonic()
+        if not force and now - self._last_check < RELOAD_CHECK_INTERVAL:
+            return {}
+        self._last_check = now
+        file_state = self._stat()
+        if file_state is None or file_state == self._file_state:
+            return {}
+        self._file_state = file_state # Also for unreadable edits, so they are reported once, not on every check
+        try:
+            with self.config_path.open('r', encoding='utf-8') as f:
+                config = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Ignoring unreadable edit of {self.config_path}, keeping the previous settings: {e}")
+            return {}
+        changes = _diff(self.config_data, config)
+        self.config_data = config
+        self._lookups.clear()
+        if changes:
+            logger.info(f"Reloaded {self.config_path}: {len(changes)} settings changed ({', '.join(sorted(changes))}).")
+        return changes
+
+    def reload_if_changed(self) -> Dict[str, Any]:
+        """
+        Picks up external edits of the config file right away and returns the settings that
+        changed, once subscribers have applied them. Meant for job boundaries, e.g. before a
+        request captures the engine's settings.
+        """
+        with self._config_lock:
+            changes = self._reload_locked(force=True)
+        self._notify(changes)
+        if changes:
+            self.wait_for_notifications()
+        return changes
+
+    def _lookup(self, key_path: str):
+        value = self.config_data
+        for key in key_path.split('.'):
+            if not isinstance(value, dict) or key not in value:
+                return _MISSING
+            value = value[key]
+        return value
+
     def get_setting(self, key_path: str, default=None):
+        with self._config_lock:
+            changes = self._reload_locked()
+            value = self._lookups.get(key_path, _MISSING)
+            if value is _MISSING:
+                value = self._lookup(key_path)
+                if value is not _MISSING:
+                    self._lookups[key_path] = value
+        self._notify(changes)
+        if value is _MISSING:
+            logger.warning(f"Setting '{key_path}' not found. Returning default: {default}.")
+            return default
+        return value
+
+    @staticmethod
+    def _assign(data: dict, key_path: str, value) -> bool:
         keys = key_path.split('.')
-        current_level = self.config_data
-        for key in keys:
-            if isinstance(current_level, dict) and key in current_level:
-                current_level = current_level[key]
-            else:
-                logger.warning(f"Setting '{key_path}' not found. Returning default: {default}.")
-                return default
-        return current_level
-
-    def set_setting(self, key_path: str, value):
-        keys = key_path.split('.')
-        current_level = self.config_data
-        
-        for i, key in enumerate(keys[:-1]):
+        current_level = data
+        for key in keys[:-1]:
             if not isinstance(current_level, dict):
                 logger.error(f"Cannot traverse path '{key_path}': '{key}' is not a dictionary in the path.")
                 return False
             current_level = current_level.setdefault(key, {}) # Ensure path exists
-
-        if isinstance(current_level, dict):
-            current_level[keys[-1]] = value
-            logger.info(f"Setting '{key_path}' updated to '{value}'")
-            try:
-                self._save_config(self.config_data)
-                return True
-            except Exception:
-                return False
-        else:
+        if not isinstance(current_level, dict):
             logger.error(f"Cannot set value for '{key_path}': final parent element is not a dictionary.")
             return False
+        current_level[keys[-1]] = value
+        return True
+
+    def set_settings(self, values: Dict[str, Any]) -> bool:
+        """Applies several settings (dotted key path -> value) in one write. Nothing is changed if any of them fails."""
+        changes = {}
+        with self._config_lock:
+            # Edits made to the file since it was last read are kept, not overwritten.
+            external_changes = self._reload_locked(force=True)
+            data = copy.deepcopy(self.config_data)
+            saved = all(self._assign(data, key_path, value) for key_path, value in values.items())
+            if saved and _diff(self.config_data, data):
+                try:
+                    self._save_config(data)
+                except Exception:
+                    saved = False
+                else:
+                    changes = _diff(self.config_data, data)
+                    self.config_data = data
+                    self._lookups.clear()
+                    self._file_state = self._stat()
+                    logger.info(f"Settings updated: {', '.join(f'{key}={value!r}' for key, value in sorted(changes.items()))}")
+        self._notify({**external_changes, **changes})
+        return saved
+
+    def set_setting(self, key_path: str, value) -> bool:
+        return self.set_settings({key_path: value})
+
+    @contextmanager
+    def transaction(self) -> Iterator[SettingsTransaction]:
+        """
+        Collects settings set inside the block and writes them together at its end; nothing
+        is written if the block raises. transaction.committed tells whether the write succeeded.
+        """
+        transaction = SettingsTransaction()
+        yield transaction
+        transaction.committed = self.set_settings(transaction.changes)
+
+    def subscribe(self, callback: SettingsCallback, prefix: str = ''):
+        """
+        Calls callback({key_path: new_value}) with the changed settings under prefix (e.g.
+        'settings.kokoro_tts') after every write or reload that changes any of them.
+        Removed settings are reported as None. Callbacks run one after another on a single
+        notifier thread, never on the thread that read or wrote the setting, so a slow
+        callback (e.g. one that loads a model) cannot stall a job that merely reads a setting.
+        """
+        with self._config_lock:
+            self._subscribers.append((prefix, callback))
+
+    def unsubscribe(self, callback: SettingsCallback):
+        with self._config_lock:
+            self._subscribers = [(prefix, cb) for prefix, cb in self._subscribers if cb != callback]
+
+    def _notify(self, changes: Dict[str, Any]):
+        if not changes:
+            return
+        with self._config_lock:
+            if self._notifier is None:
+                self._notifier = threading.Thread(target=self._notify_loop, name="settings-notifier", daemon=True)
+                self._notifier.start()
+        self._notifications.put(changes)
+
+    def wait_for_notifications(self):
+        """Blocks until subscribers have been told about every change made so far."""
+        if threading.current_thread() is not self._notifier: # A subscriber waiting on itself would never return
+            self._notifications.join()
+
+    def _notify_loop(self):
+        while True:
+            changes = self._notifications.get()
+            try:
+                self._deliver(changes)
+            finally:
+                self._notifications.task_done()
+
+    def _deliver(self, changes: Dict[str, Any]):
+        with self._config_lock:
+            subscribers = list(self._subscribers)
+        for prefix, callback in subscribers:
+            relevant = {key: value for key, value in changes.items() if not prefix or key == prefix or key.startswith(f"{prefix}.")}
+            if not relevant:
+                continue
+            try:
+                callback(relevant)
+            except Exception as e:
+                logger.error(f"Settings subscriber {getattr(callback, '__qualname__', callback)} failed: {e}", exc_info=True)
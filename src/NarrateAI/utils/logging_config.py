@@ -6,7 +6,7 @@ from utils import constants
 def setup_logging():
     logger.remove() # Remove any default handlers
 
-    log_dir = 'logs'
+    log_dir = constants.LOGS_DIR
     os.makedirs(log_dir, exist_ok=True) # Ensure log directory exists
 
     # Determine effective log level from your constants file
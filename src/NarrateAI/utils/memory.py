@@ -0,0 +1,70 @@
+import os
+import sys
+from loguru import logger
+
+
+def get_rss_bytes() -> int:
+    """Returns the resident set size of the current process in bytes, or 0 if it cannot be determined."""
+    try:
+        import psutil  # Optional, used when available
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    except Exception as e:
+        logger.debug(f"psutil failed to report process memory: {e}")
+
+    if sys.platform.startswith('linux'):
+        try:
+            with open('/proc/self/statm', 'r') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError, IndexError):
+            return 0
+
+    if sys.platform == 'win32':
+        return _get_windows_rss_bytes()
+
+    return 0
+
+
+def get_peak_rss_bytes() -> int:
+    """Returns the peak resident set size of the current process in bytes, or 0 if unavailable."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere.
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except ImportError:
+        pass
+    if sys.platform == 'win32':
+        return _get_windows_rss_bytes(peak=True)
+    return 0
+
+
+def _get_windows_rss_bytes(peak: bool = False) -> int:
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [
+                ('cb', wintypes.DWORD),
+                ('PageFaultCount', wintypes.DWORD),
+                ('PeakWorkingSetSize', ctypes.c_size_t),
+                ('WorkingSetSize', ctypes.c_size_t),
+                ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+                ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+                ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                ('PagefileUsage', ctypes.c_size_t),
+                ('PeakPagefileUsage', ctypes.c_size_t),
+            ]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(PROCESS_MEMORY_COUNTERS)
+        process_handle = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(process_handle, ctypes.byref(counters), counters.cb):
+            return 0
+        return counters.PeakWorkingSetSize if peak else counters.WorkingSetSize
+    except Exception as e:
+        logger.debug(f"Could not query Windows process memory: {e}")
+        return 0
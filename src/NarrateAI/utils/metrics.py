@@ -0,0 +1,244 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from utils.memory import get_peak_rss_bytes, get_rss_bytes
+
+# Buckets (seconds) for stage and job durations: sub-second reads up to multi-hour books.
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0, 10800.0)
+SEGMENT_CHAR_BUCKETS = (10, 25, 50, 100, 150, 200, 300, 400, 600)
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def _escape_label(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+class _Metric:
+    metric_type = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _label_values(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Metric '{self.name}' expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _label_text(self, label_values: LabelValues, extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(zip(self.labelnames, label_values))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{name}="{_escape_label(value)}"' for name, value in pairs) + '}'
+
+    def _samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def expose(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        lines.extend(self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    metric_type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels) -> float:
+        key = self._label_values(labels)
+        with self._lock:
+            return self._values.get(key, 0.0)
+
+    def _samples(self) -> Iterable[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{self._label_text(key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(_Metric):
+    """A value that goes up and down. If a callback is given, it is read at scrape time instead."""
+    metric_type = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 callback: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._callback = callback
+
+    def set(self, value: float, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def _samples(self) -> Iterable[str]:
+        if self._callback is not None:
+            return [f"{self.name} {_format_value(self._callback())}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{self._label_text(key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    metric_type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DURATION_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    def _samples(self) -> Iterable[str]:
+        with self._lock:
+            items = sorted((key, list(counts), self._sums[key]) for key, counts in self._counts.items())
+        lines = []
+        for key, counts, total in items:
+            cumulative = 0
+            for upper_bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{self._label_text(key, ('le', _format_value(upper_bound)))} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_text(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{self._label_text(key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds the application's metrics and renders them in the Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+              callback: Optional[Callable[[], float]] = None) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DURATION_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def expose(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.expose())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+_START_TIME = time.time()
+
+# --- Jobs ---
+JOBS_TOTAL = REGISTRY.counter('narrateai_jobs_total', 'Audiobook generation jobs by kind and outcome.', ['kind', 'status'])
+JOBS_IN_PROGRESS = REGISTRY.gauge('narrateai_jobs_in_progress', 'Audiobook generation jobs currently running.')
+JOB_DURATION = REGISTRY.histogram('narrateai_job_duration_seconds', 'Wall time of audiobook generation jobs, by kind.', ['kind'])
+
+# --- Stages ---
+STAGE_DURATION = REGISTRY.histogram('narrateai_stage_duration_seconds', 'Time spent per pipeline stage and job.', ['stage'])
+READ_DURATION = REGISTRY.histogram('narrateai_read_duration_seconds', 'Time spent extracting text, by document format.', ['format'])
+DOCUMENTS_READ = REGISTRY.counter('narrateai_documents_read_total', 'Documents read, by format and text cache result.', ['format', 'cache'])
+CHARACTERS_READ = REGISTRY.counter('narrateai_characters_read_total', 'Characters of text extracted from documents.')
+
+# --- Synthesis throughput ---
+SEGMENTS_TOTAL = REGISTRY.counter('narrateai_segments_synthesized_total', 'Text segments turned into audio.')
+AUDIO_SECONDS_TOTAL = REGISTRY.counter('narrateai_audio_seconds_generated_total', 'Seconds of audio generated.')
+SYNTHESIS_WALL_SECONDS_TOTAL = REGISTRY.counter('narrateai_synthesis_wall_seconds_total', 'Wall time spent in process_audio.')
+SEGMENTS_PER_SECOND = REGISTRY.gauge('narrateai_segments_per_second', 'Segments per wall second of the last finished job.')
+AUDIO_SECONDS_PER_WALL_SECOND = REGISTRY.gauge('narrateai_audio_seconds_per_wall_second',
+                                               'Audio seconds generated per wall second of the last finished job (inverse real-time factor).')
+SEGMENT_QUEUE_DEPTH = REGISTRY.gauge('narrateai_segment_queue_depth', 'Segments read ahead of synthesis and waiting in the queue.')
+SYNTHESIS_WAITING = REGISTRY.gauge('narrateai_synthesis_waiting', 'Model passes of concurrent jobs waiting for a free synthesis slot.')
+SEGMENT_CHARACTERS = REGISTRY.histogram('narrateai_segment_characters', 'Length of the text segments sent to the model.',
+                                        buckets=SEGMENT_CHAR_BUCKETS)
+
+# --- Caches ---
+CACHE_REQUESTS = REGISTRY.counter('narrateai_cache_requests_total', 'Cache lookups by cache and result.', ['cache', 'result'])
+
+
+
+def cache_hit_rate(cache: str) -> float:
+    """Returns the lifetime hit rate of a cache as recorded in CACHE_REQUESTS."""
+    hits = CACHE_REQUESTS.get(cache=cache, result='hit')
+    misses = CACHE_REQUESTS.get(cache=cache, result='miss')
+    return hits / (hits + misses) if hits + misses else 0.0
+
+
+REGISTRY.gauge('narrateai_segment_cache_hit_ratio', 'Lifetime hit ratio of the synthesized segment cache.', callback=lambda: cache_hit_rate('segment'))
+REGISTRY.gauge('narrateai_text_cache_hit_ratio', 'Lifetime hit ratio of the extracted text cache.', callback=lambda: cache_hit_rate('text'))
+REGISTRY.gauge('narrateai_g2p_cache_hit_ratio', 'Lifetime hit ratio of the grapheme-to-phoneme cache.', callback=lambda: cache_hit_rate('g2p'))
+REGISTRY.gauge('narrateai_output_cache_hit_ratio', 'Lifetime hit ratio of the finished audiobook cache.', callback=lambda: cache_hit_rate('output'))
+
+# --- Process ---
+REGISTRY.gauge('narrateai_process_resident_memory_bytes', 'Resident set size of the process.', callback=get_rss_bytes)
+REGISTRY.gauge('narrateai_process_peak_resident_memory_bytes', 'Peak resident set size of the process.', callback=get_peak_rss_bytes)
+REGISTRY.gauge('narrateai_process_uptime_seconds', 'Seconds since the process started.', callback=lambda: time.time() - _START_TIME)
+
+
+def observe_stages(stage_timings: Dict[str, Dict[str, float]]):
+    """Records a job's StageTimings.as_dict() into the stage duration histogram."""
+    for stage, timing in stage_timings.items():
+        STAGE_DURATION.observe(timing['seconds'], stage=stage)
+
+
+@contextmanager
+def track_job(kind: str):
+    """Counts a generation job as in progress while the block runs and records its outcome and duration."""
+    JOBS_IN_PROGRESS.inc()
+    start_time = time.perf_counter()
+    status = 'failed'
+    try:
+        yield
+        status = 'success'
+    finally:
+        JOBS_IN_PROGRESS.dec()
+        JOB_DURATION.observe(time.perf_counter() - start_time, kind=kind)
+        JOBS_TOTAL.inc(kind=kind, status=status)
@@ -0,0 +1,57 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, TypeVar
+
+T = TypeVar('T')
+
+
+class StageTimings:
+    """
+    Accumulates wall-clock time and call counts per named stage (e.g. 'synthesis').
+
+    Passed into process_audio by callers that want a per-stage breakdown, such as the
+    benchmark; when no instance is passed, nothing is measured. Safe to share between threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seconds: Dict[str, float] = {}
+        self._counts: Dict[str, int] = {}
+
+    def add(self, stage: str, seconds: float, count: int = 1):
+        with self._lock:
+            self._seconds[stage] = self._seconds.get(stage, 0.0) + seconds
+            self._counts[stage] = self._counts.get(stage, 0) + count
+
+    @contextmanager
+    def measure(self, stage: str):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start_time)
+
+    def timed_iter(self, stage: str, items: Iterable[T]) -> Iterator[T]:
+        """Yields from items, charging the time spent producing each item to stage."""
+        iterator = iter(items)
+        while True:
+            start_time = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(stage, time.perf_counter() - start_time, count=0)
+                return
+            self.add(stage, time.perf_counter() - start_time)
+            yield item
+
+    def seconds(self, stage: str) -> float:
+        with self._lock:
+            return self._seconds.get(stage, 0.0)
+
+    def as_dict(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                stage: {'seconds': round(seconds, 6), 'count': self._counts.get(stage, 0)}
+                for stage, seconds in self._seconds.items()
+            }
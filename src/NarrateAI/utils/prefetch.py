@@ -0,0 +1,69 @@
+import queue
+import threading
+from typing import Generic, Iterable, Iterator, TypeVar
+from loguru import logger
+
+T = TypeVar('T')
+
+_END = object()
+
+
+class PrefetchIterator(Generic[T]):
+    """
+    Runs an iterable in a background thread and hands its items over through a bounded queue.
+
+    The producer blocks once maxsize items are waiting, so a slow consumer keeps memory
+    bounded while a fast producer (e.g. document parsing) stays ahead of it. Exceptions
+    raised by the producer are re-raised in the consumer. Call close() to stop early.
+    """
+
+    def __init__(self, source: Iterable[T], maxsize: int = 256, name: str = "prefetch"):
+        self.produced = 0
+        self.done = False
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(int(maxsize), 1))
+        self._stop = threading.Event()
+        self._error = None
+        self._thread = threading.Thread(target=self._produce, args=(source,), name=name, daemon=True)
+        self._thread.start()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def _put(self, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self, source: Iterable[T]):
+        try:
+            for item in source:
+                if not self._put(item):
+                    return
+                self.produced += 1
+        except Exception as e:
+            logger.debug(f"Producer thread '{self._thread.name}' failed: {e}")
+            self._error = e
+        finally:
+            self.done = True
+            self._put(_END)
+
+    def __iter__(self) -> Iterator[T]:
+        return self
+
+    def __next__(self) -> T:
+        item = self._queue.get()
+        if item is _END:
+            self._queue.put(_END) # Keep the iterator exhausted for later calls
+            if self._error is not None:
+                raise self._error
+            raise StopIteration
+        return item
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=5)
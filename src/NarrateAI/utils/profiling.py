@@ -0,0 +1,247 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import nullcontext
+from html import escape
+from typing import ContextManager, Dict, List, Optional, Tuple
+from loguru import logger
+
+DEFAULT_SAMPLE_INTERVAL_MS = 5
+DEFAULT_TOP_N = 30
+FOLDED_FILE_NAME = 'profile.folded'
+FLAMEGRAPH_FILE_NAME = 'flamegraph.svg'
+TORCH_TRACE_FILE_NAME = 'torch_trace.json'
+SUMMARY_FILE_NAME = 'summary.txt'
+FLAMEGRAPH_WIDTH = 1200
+FLAMEGRAPH_ROW_HEIGHT = 16
+
+Stack = Tuple[str, ...]
+
+# Only one torch profiler can record at a time in a process.
+_torch_profiler_lock = threading.Lock()
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler of the Python threads of one job.
+
+    A background thread snapshots the stacks of the thread that started it and of every
+    thread started afterwards (document readers, encoders, chapter workers) every
+    interval_seconds. Threads that already existed (the web server, other jobs) are left
+    out. Time in native code, such as a model forward pass, is attributed to the Python
+    function that called into it. Nothing is installed in the sampled threads, so they
+    run at full speed; the cost is the sampler thread's own work, a few percent at the
+    default interval.
+    """
+
+    def __init__(self, interval_seconds: float = DEFAULT_SAMPLE_INTERVAL_MS / 1000):
+        self.interval_seconds = max(float(interval_seconds), 0.001)
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.wall_seconds = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._excluded: set = set()
+        self._start_time = 0.0
+
+    def start(self):
+        self._excluded = {thread.ident for thread in threading.enumerate()} - {threading.get_ident()}
+        self._start_time = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.wall_seconds = time.perf_counter() - self._start_time
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        thread_names: Dict[int, str] = {}
+        names_refreshed = 0.0
+        while not self._stop.wait(self.interval_seconds):
+            now = time.perf_counter()
+            if now - names_refreshed > 1.0:
+                thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+                names_refreshed = now
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident or ident in self._excluded:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                # Threads are grouped by name without numeric suffixes, e.g. 'chapters-book_0' -> 'chapters-book'.
+                stack.append(thread_names.get(ident, 'thread').rstrip('0123456789').rstrip('_-') or 'thread')
+                self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def hotspots(self, top_n: int = DEFAULT_TOP_N) -> Tuple[List[Tuple[str, int]], List[Tuple[str, int]]]:
+        """The top_n functions by own samples (leaf frames) and by total samples (anywhere on the stack)."""
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            if len(stack) < 2:
+                continue
+            own[stack[-1]] += count
+            for function in set(stack[1:]):
+                total[function] += count
+        return own.most_common(top_n), total.most_common(top_n)
+
+    def write_folded(self, path: str):
+        """Collapsed stacks ('thread;outer;...;inner count'), as read by flamegraph.pl and speedscope."""
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{';'.join(frame.replace(';', ':') for frame in stack)} {count}\n")
+
+    def write_flamegraph(self, path: str, title: str):
+        """A self-contained SVG flame graph; hover a frame for its name and share."""
+        total = sum(self.stacks.values())
+        rects = []
+        depth_max = 0
+
+        def layout(stacks: List[Tuple[Stack, int]], depth: int, x: float):
+            nonlocal depth_max
+            children: Dict[str, List[Tuple[Stack, int]]] = {}
+            for stack, count in stacks:
+                if len(stack) > depth:
+                    children.setdefault(stack[depth], []).append((stack, count))
+            for frame in sorted(children):
+                count = sum(c for _s, c in children[frame])
+                width = count / total * FLAMEGRAPH_WIDTH
+                if width >= 0.5:
+                    rects.append((frame, depth, x, width, count))
+                    depth_max = max(depth_max, depth)
+                    layout(children[frame], depth + 1, x)
+                x += width
+
+        if total:
+            layout(list(self.stacks.items()), 0, 0.0)
+        height = (depth_max + 3) * FLAMEGRAPH_ROW_HEIGHT
+        lines = [
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{FLAMEGRAPH_WIDTH}" height="{height}" font-family="monospace" font-size="11">',
+            f'<text x="4" y="{FLAMEGRAPH_ROW_HEIGHT - 4}">{escape(title)}</text>',
+        ]
+        for frame, depth, x, width, count in rects:
+            y = height - (depth + 1) * FLAMEGRAPH_ROW_HEIGHT
+            hue = 10 + (hash(frame) % 40) # Warm colors; same function, same color within a graph
+            label = escape(frame[:max(int(width / 7) - 1, 0)]) if width > 28 else ''
+            lines.append(f'<g><title>{escape(frame)}: {count} samples ({count / total:.1%})</title>'
+                         f'<rect x="{x:.1f}" y="{y}" width="{max(width - 0.5, 0.5):.1f}" height="{FLAMEGRAPH_ROW_HEIGHT - 1}" fill="hsl({hue},85%,60%)"/>'
+                         f'<text x="{x + 2:.1f}" y="{y + FLAMEGRAPH_ROW_HEIGHT - 5}">{label}</text></g>')
+        lines.append('</svg>')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines))
+
+
+class ProfileSession:
+    """
+    Profiles one job: the SamplingProfiler for Python code (document parsing, G2P, writing,
+    waits) plus, if torch is available, torch.profiler for the operators of the model's
+    forward passes. On exit it writes into output_dir a flame graph (flamegraph.svg and
+    profile.folded), a Chrome/Perfetto trace of the torch operators (torch_trace.json),
+    and summary.txt with the top_n hotspots.
+
+    Only the job's own process is covered; with synthesis workers, the forward passes run
+    in the worker processes and show up as waits here.
+    """
+
+    def __init__(self, output_dir: str, name: str, sample_interval_ms: float = DEFAULT_SAMPLE_INTERVAL_MS,
+                 top_n: int = DEFAULT_TOP_N, torch_profiler: bool = True):
+        self.output_dir = output_dir
+        self.name = name
+        self.top_n = max(int(top_n), 1)
+        self.sampler = SamplingProfiler(float(sample_interval_ms) / 1000)
+        self.use_torch_profiler = torch_profiler
+        self._torch_profiler = None
+        self._torch_sort_by = 'self_cpu_time_total'
+
+    def __enter__(self) -> "ProfileSession":
+        os.makedirs(self.output_dir, exist_ok=True)
+        if self.use_torch_profiler:
+            self._torch_profiler = self._start_torch_profiler()
+        self.sampler.start()
+        logger.info(f"Profiling '{self.name}' into '{self.output_dir}'.")
+        return self
+
+    def _start_torch_profiler(self):
+        if not _torch_profiler_lock.acquire(blocking=False):
+            logger.warning(f"Another job is being profiled; '{self.name}' is profiled without the torch operator breakdown.")
+            return None
+        try:
+            import torch
+            from torch.profiler import ProfilerActivity, profile
+            activities = [ProfilerActivity.CPU]
+            if torch.cuda.is_available():
+                activities.append(ProfilerActivity.CUDA)
+                self._torch_sort_by = 'self_cuda_time_total'
+            profiler = profile(activities=activities)
+            profiler.start()
+            return profiler
+        except Exception as e:
+            _torch_profiler_lock.release()
+            logger.warning(f"Torch profiler unavailable, profiling '{self.name}' without the operator breakdown: {e}")
+            return None
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.sampler.stop()
+        torch_table = None
+        if self._torch_profiler is not None:
+            try:
+                self._torch_profiler.stop()
+                self._torch_profiler.export_chrome_trace(os.path.join(self.output_dir, TORCH_TRACE_FILE_NAME))
+                torch_table = self._torch_profiler.key_averages().table(sort_by=self._torch_sort_by, row_limit=self.top_n)
+            except Exception as e:
+                logger.warning(f"Could not save the torch profile of '{self.name}': {e}")
+            finally:
+                self._torch_profiler = None
+                _torch_profiler_lock.release()
+        try:
+            self._write_artifacts(torch_table, failed=exc_type is not None)
+        except OSError as e:
+            logger.warning(f"Could not save the profile of '{self.name}' to '{self.output_dir}': {e}")
+        return False
+
+    def _write_artifacts(self, torch_table: Optional[str], failed: bool):
+        sampler = self.sampler
+        stats = f"{sampler.wall_seconds:.1f} s, {sampler.samples} samples every {sampler.interval_seconds * 1000:g} ms"
+        sampler.write_folded(os.path.join(self.output_dir, FOLDED_FILE_NAME))
+        sampler.write_flamegraph(os.path.join(self.output_dir, FLAMEGRAPH_FILE_NAME), f"{self.name}: {stats}")
+
+        thread_samples = sum(sampler.stacks.values()) or 1
+        own, total = sampler.hotspots(self.top_n)
+        lines = [f"Profile of '{self.name}'{' (job failed)' if failed else ''}: {stats}.",
+                 "Shares are of all thread samples; threads waiting on I/O, locks or queues count too.", ""]
+        for heading, rows in ((f"Top {self.top_n} functions by own time", own),
+                              (f"Top {self.top_n} functions by total time (including callees)", total)):
+            lines += [heading + ':', f"{'samples':>8}  {'share':>6}  function"]
+            lines += [f"{count:>8}  {count / thread_samples:>6.1%}  {function}" for function, count in rows]
+            lines.append('')
+        if torch_table:
+            lines += [f"Torch operators (top {self.top_n}):", torch_table]
+        summary_path = os.path.join(self.output_dir, SUMMARY_FILE_NAME)
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines))
+
+        top = ', '.join(f"{function} {count / thread_samples:.0%}" for function, count in own[:5])
+        logger.info(f"Profile of '{self.name}' saved to '{self.output_dir}' ({FLAMEGRAPH_FILE_NAME}, {SUMMARY_FILE_NAME}). Top: {top}")
+
+
+def profile_job(output_dir: str, name: str, enabled: bool, settings: Optional[dict] = None) -> ContextManager:
+    """
+    A ProfileSession for the job if enabled, else a no-op context, so jobs that are not
+    profiled run exactly as without this module. settings are those of settings.profiling.
+    """
+    if not enabled:
+        return nullcontext()
+    settings = settings or {}
+    return ProfileSession(
+        output_dir,
+        name,
+        sample_interval_ms=settings.get('sample_interval_ms', DEFAULT_SAMPLE_INTERVAL_MS),
+        top_n=settings.get('top_n', DEFAULT_TOP_N),
+        torch_profiler=settings.get('torch_profiler', True)
+    )
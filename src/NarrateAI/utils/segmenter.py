@@ -0,0 +1,226 @@
+import re
+from typing import Dict, Iterable, Iterator, List, Tuple
+import utils.metrics as metrics
+
+# Sentence ends: terminal punctuation followed by whitespace, but not inside abbreviations
+# like "e.g." or "Mr.".
+SPLIT_PATTERN = re.compile(r'(?<!\w\.\w.)(?<![A-Z][a-z]\.)(?<=\.|\?|\!|։|۔|。)\s')
+SPLIT_CONTEXT_CHARS = 4 # Longest lookbehind of SPLIT_PATTERN
+# Paragraph breaks: a blank line, possibly containing other whitespace.
+PARAGRAPH_PATTERN = re.compile(r'\n[^\S\n]*\n\s*')
+# Clause ends, used to break up sentences that are too long for one model pass.
+CLAUSE_PATTERN = re.compile(r'(?<=[,;:—–)])\s+')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+DEFAULT_TARGET_CHARS = 150
+DEFAULT_MAX_CHARS = 400 # Stays below Kokoro's 510 phonemes per pass for typical text
+MIN_MAX_CHARS = 50
+SEGMENTER_VERSION = 3 # Bump when the rules change in ways the constants above do not capture
+
+
+class Segment(str):
+    """Text of one segment. paragraph_end marks the last segment of a paragraph."""
+    paragraph_end = False
+
+
+class SegmentStats:
+    """Counts what a TextSegmenter produced, for logs and metrics."""
+
+    def __init__(self):
+        self.segments = 0
+        self.sentences = 0
+        self.characters = 0
+        self.min_chars = 0
+        self.max_chars = 0
+        self.merged_segments = 0 # Segments made of more than one sentence
+        self.hard_splits = 0 # Sentences longer than max_chars that had to be broken up
+
+    def add(self, segment: str, sentences: int):
+        length = len(segment)
+        self.min_chars = min(self.min_chars, length) if self.segments else length
+        self.max_chars = max(self.max_chars, length)
+        self.segments += 1
+        self.sentences += sentences
+        self.characters += length
+        if sentences > 1:
+            self.merged_segments += 1
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            'segments': self.segments,
+            'sentences': self.sentences,
+            'characters': self.characters,
+            'min_chars': self.min_chars,
+            'max_chars': self.max_chars,
+            'mean_chars': round(self.characters / self.segments, 1) if self.segments else 0.0,
+            'merged_segments': self.merged_segments,
+            'hard_splits': self.hard_splits,
+        }
+
+    def __str__(self) -> str:
+        stats = self.as_dict()
+        return (f"{stats['segments']} segments from {stats['sentences']} sentences, "
+                f"{stats['min_chars']}/{stats['mean_chars']}/{stats['max_chars']} chars min/mean/max, "
+                f"{stats['merged_segments']} merged, {stats['hard_splits']} long sentences split")
+
+
+def _normalize(text: str) -> str:
+    """Collapses whitespace runs into single spaces; applying it to parts of a text and then to the whole changes nothing."""
+    return WHITESPACE_PATTERN.sub(' ', text)
+
+
+def _sentence_ends(text: str, context: str) -> List[int]:
+    """Positions of the whitespace after each sentence end in text; context is the text right before it."""
+    return [match.start() - len(context) for match in SPLIT_PATTERN.finditer(context + text, len(context))]
+
+
+class TextSegmenter:
+    """
+    Turns text into the segments that are synthesized one model pass at a time, in a single
+    scan. Consecutive sentences are packed together while the segment stays within
+    target_chars (characters approximate Kokoro's phoneme tokens), and sentences longer than
+    max_chars are split at clause boundaries, then at spaces. Segments never span a
+    paragraph break (a blank line); the last one of each paragraph is a Segment with
+    paragraph_end set. The same segments feed the progress total and the model, so the text
+    is never split twice.
+
+    A segmenter keeps statistics for the text it has seen, so use one per document.
+    """
+
+    def __init__(self, target_chars: int = DEFAULT_TARGET_CHARS, max_chars: int = DEFAULT_MAX_CHARS):
+        self.max_chars = max(int(max_chars), MIN_MAX_CHARS)
+        self.target_chars = min(max(int(target_chars), 0), self.max_chars)
+        self.stats = SegmentStats()
+        self._pending: List[str] = []
+        self._pending_chars = 0
+
+    @property
+    def signature(self) -> str:
+        """Identifies the segmentation rules, e.g. for checkpoints that rely on identical segments."""
+        return f"{SEGMENTER_VERSION}|{SPLIT_PATTERN.pattern}|{self.target_chars}|{self.max_chars}"
+
+    def split(self, text: str) -> List[Segment]:
+        return list(self.iter_segments([text]))
+
+    def iter_segments(self, pieces: Iterable[str]) -> Iterator[Segment]:
+        """
+        Segments streamed text pieces. Text is only turned into segments once no later piece
+        can change how it is split, so the segments are the same however the text is divided
+        into pieces; split(text) is iter_segments([text]). Whitespace inside a paragraph is
+        collapsed to single spaces.
+        """
+        carry = "" # Text of the current paragraph not segmented yet; normalized except for its trailing whitespace
+        context = "" # The paragraph's text right before carry, for the lookbehinds of SPLIT_PATTERN
+        for piece in pieces:
+            *paragraphs, carry = PARAGRAPH_PATTERN.split(carry + piece)
+            for paragraph in paragraphs:
+                yield from self._add_sentences(_normalize(paragraph), context)
+                yield from self._flush(paragraph_end=True)
+                context = ""
+            # Trailing whitespace is kept as it is: it may be the start of a paragraph break.
+            stripped_length = len(carry.rstrip())
+            body = _normalize(carry[:stripped_length])
+            carry = body + carry[stripped_length:]
+            # A sentence end is final once text follows it; at the very end, a paragraph break may still follow.
+            ends = [end for end in _sentence_ends(carry, context) if end < len(body)]
+            if ends:
+                start = 0
+                for end in ends:
+                    yield from self._add_sentence(carry[start:end])
+                    start = end + 1
+                context, carry = (context + carry[:start])[-SPLIT_CONTEXT_CHARS:], carry[start:]
+                body = body[start:]
+            if len(body.strip()) > self.max_chars:
+                # The sentence is going to be split anyway; the parts no continuation can change are
+                # produced now, so a run without sentence ends (e.g. a badly extracted PDF) never piles up.
+                leading = len(body) - len(body.lstrip())
+                parts, offset = self._pack_long(body.strip(), complete=False)
+                if parts:
+                    yield from self._flush()
+                    for part in parts:
+                        yield from self._emit_part(part)
+                    offset += leading
+                    context, carry = (context + carry[:offset])[-SPLIT_CONTEXT_CHARS:], carry[offset:]
+        yield from self._add_sentences(_normalize(carry), context)
+        yield from self._flush()
+
+    def _add_sentences(self, text: str, context: str) -> Iterator[Segment]:
+        start = 0
+        for end in _sentence_ends(text, context):
+            yield from self._add_sentence(text[start:end])
+            start = end + 1
+        yield from self._add_sentence(text[start:])
+
+    def _add_sentence(self, sentence: str) -> Iterator[Segment]:
+        sentence = sentence.strip()
+        if not sentence:
+            return
+        if len(sentence) > self.max_chars:
+            yield from self._flush()
+            self.stats.hard_splits += 1
+            *parts, sentence = self._pack_long(sentence, complete=True)[0]
+            for part in parts:
+                yield from self._emit_part(part)
+            # The last part stays pending, so it can end a paragraph or absorb a short next sentence.
+        if self._pending and self._pending_chars + 1 + len(sentence) > self.target_chars:
+            yield from self._flush()
+        self._pending.append(sentence)
+        self._pending_chars += len(sentence) + (1 if len(self._pending) > 1 else 0)
+
+    def _emit_part(self, part: str) -> Iterator[Segment]:
+        self.stats.add(part, 1)
+        metrics.SEGMENT_CHARACTERS.observe(len(part))
+        yield Segment(part)
+
+    def _flush(self, paragraph_end: bool = False) -> Iterator[Segment]:
+        if not self._pending:
+            return
+        segment = Segment(' '.join(self._pending))
+        segment.paragraph_end = paragraph_end
+        self.stats.add(segment, len(self._pending))
+        metrics.SEGMENT_CHARACTERS.observe(len(segment))
+        self._pending, self._pending_chars = [], 0
+        yield segment
+
+    def _pack_long(self, text: str, complete: bool) -> Tuple[List[str], int]:
+        """
+        Breaks normalized text longer than max_chars into parts of at most max_chars: at clause
+        boundaries, then at spaces, then anywhere. With complete=False the text may still
+        continue, so only the parts no continuation can change are returned, together with
+        the offset in text where the rest begins.
+        """
+        parts: List[List] = [] # [text, start offset]
+
+        def add_unit(unit: str, start: int):
+            while len(unit) > self.max_chars: # No spaces at all, e.g. a URL or CJK text
+                parts.append([unit[:self.max_chars], start])
+                unit, start = unit[self.max_chars:], start + self.max_chars
+            if parts and len(parts[-1][0]) + 1 + len(unit) <= self.max_chars:
+                parts[-1][0] = f"{parts[-1][0]} {unit}"
+            elif unit:
+                parts.append([unit, start])
+
+        clauses, start = [], 0
+        for match in CLAUSE_PATTERN.finditer(text):
+            clauses.append((text[start:match.start()], start))
+            start = match.end()
+        clauses.append((text[start:], start))
+        for number, (clause, clause_start) in enumerate(clauses, start=1):
+            last_open = not complete and number == len(clauses)
+            if len(clause) <= self.max_chars:
+                if not last_open: # An unfinished clause may still grow past max_chars
+                    add_unit(clause, clause_start)
+                continue
+            words = [(match.group(), clause_start + match.start()) for match in re.finditer(r'\S+', clause)]
+            last_word, last_word_start = words.pop() if last_open else ('', 0)
+            for word, word_start in words:
+                add_unit(word, word_start)
+            if last_word:
+                # The last word may continue too; only its pieces a continuation cannot change are added.
+                add_unit(last_word[:(len(last_word) - 1) // self.max_chars * self.max_chars], last_word_start)
+        if complete:
+            return [part for part, _start in parts], len(text)
+        if len(parts) < 2:
+            return [], 0
+        # The last part may still absorb more text; it is packed again once the sentence is complete.
+        return [part for part, _start in parts[:-1]], parts[-1][1]
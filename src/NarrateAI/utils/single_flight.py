@@ -0,0 +1,59 @@
+import threading
+from typing import Callable, Dict, Generic, Tuple, TypeVar
+
+T = TypeVar('T')
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight(Generic[T]):
+    """
+    Collapses concurrent calls with the same key into one.
+
+    The first caller for a key runs the function; callers arriving while it is still
+    running wait for it and get its result (or its exception) instead of running the
+    function again. Once the call has finished, the next caller starts a new one, so
+    results are never kept around here; cache them separately if they should outlive
+    the call.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+
+    def in_flight(self, key: str) -> bool:
+        with self._lock:
+            return key in self._calls
+
+    def do(self, key: str, fn: Callable[[], T]) -> Tuple[T, bool]:
+        """Returns (result, shared); shared is True if the result came from another caller's call."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.followers += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
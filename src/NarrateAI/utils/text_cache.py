@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Iterable, Iterator, Optional
+from loguru import logger
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def hash_file(path_to_file: str) -> str:
+    """Returns the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path_to_file, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class TextCache:
+    """
+    Disk cache of extracted document text, keyed by the file's content hash.
+
+    Each entry stores the pieces the streaming reader produced, one JSON string per line,
+    so a cached document replays page by page just like a fresh extraction. Entries are
+    written and read piece by piece, so memory use does not depend on the document's
+    size. Least recently used entries are removed once the directory grows past max_bytes.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max(int(max_bytes), 0)
+        self._lock = threading.Lock()
+        if self.enabled:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _path_for(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + '.jsonl')
+
+    def get(self, key: str) -> Optional[Iterator[str]]:
+        """
+        Returns an iterator over the cached pieces for key, or None on a miss. The entry is
+        only opened once iteration starts, and closed when it ends or the iterator is dropped.
+        """
+        if not self.enabled:
+            return None
+        path = self._path_for(key)
+        try:
+            os.utime(path, None) # Also tells whether the entry exists
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"Could not read text cache entry '{path}': {e}")
+            return None
+        return self._iter_entry(path)
+
+    @staticmethod
+    def _iter_entry(path: str) -> Iterator[str]:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    logger.warning(f"Dropping unreadable text cache entry '{path}'.")
+                    _remove_quietly(path)
+                    raise
+
+    def write_through(self, key: str, units: Iterable[str]) -> Iterator[str]:
+        """
+        Yields units while appending each to a temporary file, which becomes the entry for
+        key once units are exhausted. Nothing is stored if iteration fails or stops early.
+        """
+        if not self.enabled:
+            yield from units
+            return
+        path = self._path_for(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            f = open(tmp_path, 'w', encoding='utf-8')
+        except OSError as e:
+            logger.warning(f"Could not write text cache entry '{path}': {e}")
+            yield from units
+            return
+        complete = False
+        try:
+            with f:
+                for unit in units:
+                    if f is not None:
+                        try:
+                            f.write(json.dumps(unit, ensure_ascii=False) + '\n')
+                        except OSError as e:
+                            logger.warning(f"Could not write text cache entry '{path}': {e}")
+                            f.close()
+                            f = None
+                    yield unit
+            complete = f is not None
+        finally:
+            if complete:
+                try:
+                    os.replace(tmp_path, path)
+                except OSError as e:
+                    logger.warning(f"Could not write text cache entry '{path}': {e}")
+                    complete = False
+            if not complete:
+                _remove_quietly(tmp_path)
+        if complete:
+            self._evict()
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.cache_dir):
+                if entry.is_file() and entry.name.endswith(('.jsonl', '.json')): # .json: entries of older versions
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total_bytes = sum(size for _mtime, size, _path in entries)
+            for _mtime, size, path in sorted(entries):
+                if total_bytes <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total_bytes -= size
+                    logger.debug(f"Evicted text cache entry '{path}'.")
+                except OSError as e:
+                    logger.warning(f"Could not evict text cache entry '{path}': {e}")
+
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,61 @@
+import os
+import shutil
+import threading
+import time
+import uuid
+from loguru import logger
+
+PRUNE_INTERVAL_SECONDS = 600
+DEFAULT_RETENTION_HOURS = 24
+
+
+class RequestWorkspaces:
+    """
+    Hands out a fresh directory under root for every request, so concurrent requests for
+    files with the same name (or the same request submitted twice with different
+    settings) never write to the same output path.
+
+    Workspaces older than retention_hours are removed when new ones are created, so every
+    request's output counts against the disk only for that long; 0 keeps them forever.
+    """
+
+    def __init__(self, root: str, retention_hours: float = DEFAULT_RETENTION_HOURS):
+        self.root = root
+        self.retention_seconds = max(float(retention_hours), 0.0) * 3600
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+
+    def create(self) -> str:
+        self._maybe_prune()
+        # Sortable by creation time, unique across threads and processes.
+        path = os.path.join(self.root, f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}")
+        os.makedirs(path)
+        return path
+
+    def _maybe_prune(self):
+        if not self.retention_seconds:
+            return
+        with self._lock:
+            now = time.time()
+            if now - self._last_prune < PRUNE_INTERVAL_SECONDS:
+                return
+            self._last_prune = now
+        self.prune(now - self.retention_seconds)
+
+    def prune(self, older_than: float) -> int:
+        """Removes workspaces last modified before the older_than timestamp and returns how many."""
+        try:
+            entries = list(os.scandir(self.root))
+        except FileNotFoundError:
+            return 0
+        removed = 0
+        for entry in entries:
+            try:
+                if entry.is_dir() and entry.stat().st_mtime < older_than:
+                    shutil.rmtree(entry.path)
+                    removed += 1
+            except OSError as e:
+                logger.warning(f"Could not remove expired workspace '{entry.path}': {e}")
+        if removed:
+            logger.info(f"Removed {removed} expired request workspaces from '{self.root}'.")
+        return removed
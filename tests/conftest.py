@@ -0,0 +1,38 @@
+import os
+import shutil
+import sys
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The app imports its modules flat from src/NarrateAI, as when started from there.
+sys.path.insert(0, os.path.join(REPO_ROOT, 'src', 'NarrateAI'))
+
+from utils.constants import CONFIG_FILE_PATH # noqa: E402
+from utils.json_handler import JsonHandler # noqa: E402
+
+# Caches that outlive a test; tests that exercise one turn it back on.
+CACHES_OFF = {
+    'settings.file_reader.text_cache_max_bytes': 0,
+    'settings.kokoro_tts.segment_cache_max_bytes': 0,
+    'settings.kokoro_tts.output_cache_max_bytes': 0,
+    'settings.kokoro_tts.g2p_cache_memory_entries': 0,
+    'settings.kokoro_tts.g2p_cache_max_entries': 0,
+}
+
+
+@pytest.fixture
+def app_dir(tmp_path, monkeypatch):
+    """
+    Runs the test from a scratch copy of the app's working directory, so config/ and
+    outputs/ (resolved relative to it) never touch the repository's own.
+    """
+    os.makedirs(tmp_path / 'config')
+    shutil.copyfile(os.path.join(REPO_ROOT, CONFIG_FILE_PATH), tmp_path / CONFIG_FILE_PATH)
+    monkeypatch.chdir(tmp_path)
+    handler = JsonHandler()
+    handler.reload_if_changed()
+    handler.set_settings(CACHES_OFF)
+    yield tmp_path
+    monkeypatch.undo()
+    handler.reload_if_changed()
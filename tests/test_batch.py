@@ -0,0 +1,63 @@
+import os
+import benchmark
+import pytest
+from audio.kokoro_tts import Kokoro_TTS
+from batch import BatchRunner, collect_items
+from utils.file_reader import FileReader
+
+EXTENSIONS = ['.txt', '.html', '.pdf']
+
+
+def _write(path, text: str = "A short book. It has two sentences.") -> str:
+    os.makedirs(os.path.dirname(str(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    return str(path)
+
+
+def test_directories_and_manifests_are_expanded(tmp_path):
+    _write(tmp_path / 'books' / 'one.txt')
+    _write(tmp_path / 'books' / 'nested' / 'two.txt')
+    _write(tmp_path / 'books' / 'notes.md')
+    manifest = _write(tmp_path / 'list.txt', "# extra books\nextra/three.txt\n")
+    _write(tmp_path / 'extra' / 'three.txt')
+    out = str(tmp_path / 'out')
+
+    flat = collect_items([str(tmp_path / 'books')], [], out, recursive=False, supported_extensions=EXTENSIONS)
+    assert [item.output_name for item in flat] == ['one']
+    deep = collect_items([str(tmp_path / 'books')], [manifest], out, recursive=True, supported_extensions=EXTENSIONS)
+    assert [(os.path.relpath(item.output_dir, out), item.output_name) for item in deep] == \
+        [('.', 'one'), ('nested', 'two'), ('.', 'three')]
+
+
+def test_documents_with_the_same_stem_get_their_extension(tmp_path):
+    _write(tmp_path / 'books' / 'book.txt')
+    _write(tmp_path / 'books' / 'book.html', "<p>Another book.</p>")
+    _write(tmp_path / 'books' / 'other.txt')
+    items = collect_items([str(tmp_path / 'books')], [], str(tmp_path / 'out'), recursive=False, supported_extensions=EXTENSIONS)
+    assert sorted(item.output_name for item in items) == ['book.html', 'book.txt', 'other']
+
+
+def test_documents_that_still_collide_are_rejected(tmp_path):
+    first = _write(tmp_path / 'a' / 'book.txt')
+    second = _write(tmp_path / 'b' / 'book.txt')
+    with pytest.raises(ValueError, match='same output file'):
+        collect_items([first, second], [], str(tmp_path / 'out'), recursive=False, supported_extensions=EXTENSIONS)
+
+
+def test_unchanged_outputs_are_skipped_and_changed_sources_reconverted(app_dir, tmp_path):
+    source = _write(tmp_path / 'books' / 'book.txt', '\n\n'.join(benchmark.generate_text(100)))
+    items = collect_items([source], [], str(tmp_path / 'out'), recursive=False, supported_extensions=EXTENSIONS)
+    engine = Kokoro_TTS(lang_code='a', voice='af_heart', workers=1, pipeline=benchmark.StubPipeline(samples_per_char=10))
+    runner = BatchRunner(engine, FileReader())
+
+    first = runner.run(items)
+    assert (first['done'], first['skipped']) == (1, 0)
+    assert os.path.exists(first['results'][0]['output'])
+    assert runner.run(items)['skipped'] == 1
+
+    _write(source, "The book was edited.")
+    assert runner.run(items)['done'] == 1
+    engine.apply_settings(speed=1.2)
+    assert runner.run(items)['done'] == 1 # Other voice settings
+    assert BatchRunner(engine, FileReader(), force=True).run(items)['done'] == 1
@@ -0,0 +1,112 @@
+import os
+import time
+import benchmark
+from audio.chapter_jobs import ChapterJobRunner, prune_books
+from audio.kokoro_tts import Kokoro_TTS
+from utils.file_reader import Chapter, FileReader
+
+
+def _write_docx(path: str):
+    from docx import Document
+    document = Document()
+    document.add_paragraph("A foreword before any heading.")
+    document.add_heading("The Beginning", level=1)
+    document.add_paragraph("It was a quiet morning.")
+    document.add_heading("A subsection", level=2)
+    document.add_paragraph("Still the first chapter.")
+    document.add_heading("The End", level=1)
+    document.add_paragraph("And then it was evening.")
+    document.save(path)
+
+
+def _write_epub(path: str):
+    from ebooklib import epub
+    book = epub.EpubBook()
+    book.set_identifier('test-book')
+    book.set_title('Test Book')
+    book.set_language('en')
+    one = epub.EpubHtml(title='Chapter One', file_name='one.xhtml', lang='en', content='<p>The first chapter.</p>')
+    one_continued = epub.EpubHtml(title='', file_name='one-b.xhtml', lang='en', content='<p>More of the first chapter.</p>')
+    two = epub.EpubHtml(title='Chapter Two', file_name='two.xhtml', lang='en', content='<p>The second chapter.</p>')
+    for item in (one, one_continued, two):
+        book.add_item(item)
+    book.toc = (one, two)
+    book.add_item(epub.EpubNcx())
+    book.add_item(epub.EpubNav())
+    book.spine = ['nav', one, one_continued, two]
+    epub.write_epub(path, book)
+
+
+def test_docx_chapters_split_at_the_top_heading_level(app_dir):
+    path = str(app_dir / 'book.docx')
+    _write_docx(path)
+    chapters = FileReader().read_chapters(path)
+    assert [chapter.title for chapter in chapters] == ["Front Matter", "The Beginning", "The End"]
+    assert "Still the first chapter." in chapters[1].text
+    assert chapters[2].text.strip().endswith("And then it was evening.")
+
+
+def test_epub_chapters_follow_the_table_of_contents(app_dir):
+    path = str(app_dir / 'book.epub')
+    _write_epub(path)
+    chapters = FileReader().read_chapters(path)
+    assert [chapter.title for chapter in chapters] == ["Chapter One", "Chapter Two"]
+    assert "More of the first chapter." in chapters[0].text # Spine items without a TOC entry are merged
+
+
+def test_documents_without_structure_are_one_chapter(app_dir):
+    path = str(app_dir / 'notes.txt')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("Just some text.")
+    assert FileReader().read_chapters(path) == [Chapter("notes", "Just some text.")]
+
+
+class RecordingEngine(Kokoro_TTS):
+    def __init__(self):
+        super().__init__(lang_code='a', voice='af_heart', workers=1, pipeline=benchmark.StubPipeline(samples_per_char=10))
+        self.rendered = []
+
+    def process_audio(self, input_text, base_file_name, **kwargs):
+        self.rendered.append(base_file_name)
+        return super().process_audio(input_text, base_file_name, **kwargs)
+
+
+def test_rerunning_a_book_renders_only_edited_chapters(app_dir):
+    engine = RecordingEngine()
+    runner = ChapterJobRunner(engine)
+    chapters = [Chapter("One", "The first chapter."), Chapter("Two", "The second chapter.")]
+    index_path = runner.run(chapters, 'book')
+    assert engine.rendered == ['01 - One', '02 - Two']
+    assert os.path.exists(os.path.join(os.path.dirname(index_path), 'book.m3u'))
+
+    engine.rendered.clear()
+    assert runner.run([chapters[0], Chapter("Two", "The second chapter, edited.")], 'book') == index_path
+    assert engine.rendered == ['02 - Two']
+
+    engine.rendered.clear()
+    engine.apply_settings(speed=1.2)
+    runner.run(chapters, 'book', only_chapters={1})
+    assert engine.rendered == ['01 - One'] # Other settings, but only the selected chapter
+
+
+def test_different_books_with_the_same_name_get_their_own_folders(app_dir):
+    runner = ChapterJobRunner(RecordingEngine())
+    first = runner.run([Chapter("One", "A book.")], 'book')
+    second = runner.run([Chapter("Prologue", "Another book.")], 'book')
+    assert os.path.dirname(first) != os.path.dirname(second)
+    assert os.path.exists(first) and os.path.exists(second)
+
+
+def test_prune_books_removes_only_stale_book_folders(app_dir):
+    runner = ChapterJobRunner(RecordingEngine())
+    stale_book = os.path.dirname(runner.run([Chapter("One", "An old book.")], 'old'))
+    fresh_book = os.path.dirname(runner.run([Chapter("One", "A new book.")], 'new'))
+    other_dir = app_dir / 'outputs' / 'not-a-book'
+    other_dir.mkdir()
+    old = time.time() - 3600
+    os.utime(os.path.join(stale_book, 'index.json'), (old, old))
+    os.utime(other_dir, (old, old))
+
+    assert prune_books(os.path.dirname(stale_book), time.time() - 60) == 1
+    assert not os.path.exists(stale_book)
+    assert os.path.exists(fresh_book) and other_dir.exists()
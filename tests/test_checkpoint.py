@@ -0,0 +1,106 @@
+import os
+import threading
+import time
+import numpy as np
+import pytest
+import soundfile as sf
+import benchmark
+from audio.checkpoint import SegmentCheckpoint, prune_checkpoints
+from audio.kokoro_tts import Kokoro_TTS, SynthesisInterrupted
+
+TEXT = '\n\n'.join(benchmark.generate_text(600))
+
+
+class CountingPipeline(benchmark.StubPipeline):
+    """Counts model passes, and sets interrupt after interrupt_after of them (like a shutdown)."""
+
+    def __init__(self, interrupt_after: int = 0):
+        super().__init__(samples_per_char=10)
+        self.calls = 0
+        self.interrupt_after = interrupt_after
+        self.interrupt = threading.Event()
+
+    def __call__(self, text, *args, **kwargs):
+        self.calls += 1
+        if self.interrupt_after and self.calls >= self.interrupt_after:
+            self.interrupt.set()
+        return super().__call__(text, *args, **kwargs)
+
+
+def _engine(pipeline) -> Kokoro_TTS:
+    return Kokoro_TTS(lang_code='a', voice='af_heart', workers=1, pipeline=pipeline)
+
+
+@pytest.fixture
+def engine_settings(app_dir):
+    from utils.json_handler import JsonHandler
+    JsonHandler().set_settings({'settings.kokoro_tts.checkpoint_interval_segments': 2})
+    return app_dir
+
+
+def test_interrupted_job_resumes_from_its_checkpoint(engine_settings, tmp_path):
+    reference_pipeline = CountingPipeline()
+    reference = _engine(reference_pipeline).process_audio(TEXT, 'reference', output_dir=str(tmp_path / 'reference'))
+
+    pipeline = CountingPipeline(interrupt_after=5)
+    engine = _engine(pipeline)
+    with pytest.raises(SynthesisInterrupted):
+        engine.process_audio(TEXT, 'book', output_dir=str(tmp_path / 'first'),
+                             checkpoint=engine.create_checkpoint('input'), interrupt_event=pipeline.interrupt)
+    first_calls = pipeline.calls
+    assert 0 < first_calls < reference_pipeline.calls
+
+    resumed_pipeline = CountingPipeline()
+    resumed_engine = _engine(resumed_pipeline)
+    checkpoint = resumed_engine.create_checkpoint('input')
+    output_path = resumed_engine.process_audio(TEXT, 'book', output_dir=str(tmp_path / 'second'), checkpoint=checkpoint)
+
+    # Only the segments after the last checkpoint are synthesized again.
+    assert resumed_pipeline.calls <= reference_pipeline.calls - first_calls + checkpoint.interval_segments
+    resumed_audio, reference_audio = sf.read(output_path, dtype='int16')[0], sf.read(reference, dtype='int16')[0]
+    assert resumed_audio.shape == reference_audio.shape
+    assert np.abs(resumed_audio.astype(int) - reference_audio).max() <= 2 # Replayed audio went through 16-bit PCM once more
+    assert not os.path.exists(checkpoint.work_dir) # Discarded once the job finished
+
+
+def test_checkpoints_of_other_settings_are_not_resumed(engine_settings, tmp_path):
+    engine = _engine(CountingPipeline())
+    checkpoint = engine.create_checkpoint('input')
+    checkpoint.begin()
+    checkpoint.append(np.zeros(100, dtype=np.float32))
+    checkpoint.release()
+
+    faster = engine.current_settings()._replace(speed=1.5)
+    assert engine.create_checkpoint('input', faster).work_dir != checkpoint.work_dir
+    resumed = engine.create_checkpoint('input')
+    assert resumed.begin() == 1
+    resumed.release()
+
+
+def test_partial_export_holds_the_checkpointed_audio(engine_settings, tmp_path):
+    checkpoint = _engine(CountingPipeline()).create_checkpoint('input')
+    checkpoint.begin()
+    checkpoint.append(np.full(240, 0.5, dtype=np.float32))
+    checkpoint.append(np.full(240, -0.5, dtype=np.float32))
+    checkpoint.flush()
+    exported = checkpoint.export_partial(str(tmp_path / 'partial.wav'))
+    checkpoint.release()
+
+    audio, sample_rate = sf.read(exported, dtype='float32')
+    assert sample_rate == checkpoint.sample_rate
+    assert audio.shape == (480,)
+    assert audio[0] == pytest.approx(0.5, abs=1e-3) and audio[-1] == pytest.approx(-0.5, abs=1e-3)
+
+
+def test_stale_checkpoints_are_pruned_unless_in_use(tmp_path):
+    stale, active = SegmentCheckpoint(str(tmp_path / 'stale'), 'a', 24000), SegmentCheckpoint(str(tmp_path / 'active'), 'b', 24000)
+    stale.begin()
+    stale.release()
+    active.begin()
+    long_ago = time.time() - 3600
+    for checkpoint in (stale, active):
+        os.utime(checkpoint.manifest_path, (long_ago, long_ago))
+
+    assert prune_checkpoints(str(tmp_path), older_than=time.time() - 60) == 1
+    assert not os.path.exists(stale.work_dir) and os.path.exists(active.work_dir)
+    active.discard()
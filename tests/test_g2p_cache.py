@@ -0,0 +1,68 @@
+import sqlite3
+import itertools
+import types
+import audio.g2p_cache as g2p_cache
+from audio.g2p_cache import CachedG2P, G2PCache, install_g2p_cache
+
+
+def test_round_trip_through_memory_and_disk(tmp_path):
+    cache = G2PCache(str(tmp_path / 'g2p.sqlite3'), memory_entries=1, max_entries=100)
+    cache.put('a', 'hello', ('həlˈO', ['token']))
+    cache.put('a', 'world', ('wˈɜɹld', []))
+    assert cache.get('a', 'hello') == ('həlˈO', ['token']) # Pushed out of memory, read back from disk
+    assert cache.get('b', 'hello') is None # Keyed by language too
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    value = cache.get('a', 'world')
+    value[1].append('changed')
+    assert cache.get('a', 'world') == ('wˈɜɹld', []) # Every hit gets its own copy
+
+
+def test_entries_survive_a_restart(tmp_path):
+    db_path = str(tmp_path / 'g2p.sqlite3')
+    G2PCache(db_path, memory_entries=10, max_entries=100).put('a', 'hello', 'həlˈO')
+    assert G2PCache(db_path, memory_entries=10, max_entries=100).get('a', 'hello') == 'həlˈO'
+
+
+def test_pruning_keeps_recently_used_entries(tmp_path, monkeypatch):
+    clock = itertools.count(1)
+    monkeypatch.setattr(g2p_cache, 'time', types.SimpleNamespace(time=lambda: float(next(clock))))
+    monkeypatch.setattr(g2p_cache, 'PRUNE_INTERVAL', 3)
+    cache = G2PCache(str(tmp_path / 'g2p.sqlite3'), memory_entries=0, max_entries=2)
+    cache.put('a', 'hot', 1)
+    cache.put('a', 'cold', 2)
+    assert cache.get('a', 'hot') == 1
+    cache.put('a', 'new', 3) # Third insert trims the table to the two most recently used rows
+    remaining = {row[0] for row in cache._connection.execute('SELECT text FROM g2p')}
+    assert remaining == {'hot', 'new'}
+
+
+def test_tables_without_last_used_are_migrated(tmp_path):
+    db_path = str(tmp_path / 'g2p.sqlite3')
+    connection = sqlite3.connect(db_path)
+    connection.execute('CREATE TABLE g2p (lang_code TEXT NOT NULL, text TEXT NOT NULL, value BLOB NOT NULL, PRIMARY KEY (lang_code, text))')
+    connection.commit()
+    connection.close()
+    cache = G2PCache(db_path, memory_entries=0, max_entries=10)
+    cache.put('a', 'hello', 'həlˈO')
+    assert cache.get('a', 'hello') == 'həlˈO'
+
+
+def test_cached_g2p_phonemizes_each_text_once(tmp_path):
+    calls = []
+
+    def g2p(text):
+        calls.append(text)
+        return text.upper(), []
+
+    pipeline = types.SimpleNamespace(lang_code='a', g2p=g2p)
+    cache = G2PCache(str(tmp_path / 'g2p.sqlite3'), memory_entries=10, max_entries=10)
+    install_g2p_cache(pipeline, cache)
+    install_g2p_cache(pipeline, cache) # Installing twice does not wrap twice
+    assert isinstance(pipeline.g2p, CachedG2P) and pipeline.g2p.g2p is g2p
+    assert pipeline.g2p('hi') == ('HI', [])
+    assert pipeline.g2p('hi') == ('HI', [])
+    assert calls == ['hi']
+
+    install_g2p_cache(pipeline, G2PCache(str(tmp_path / 'off.sqlite3'), memory_entries=0, max_entries=0))
+    assert pipeline.g2p is g2p # A disabled cache unwraps the pipeline
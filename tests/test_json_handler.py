@@ -0,0 +1,88 @@
+import json
+import os
+import threading
+import time
+from utils.constants import CONFIG_FILE_PATH
+from utils.json_handler import JsonHandler
+
+
+def _read_config() -> dict:
+    with open(CONFIG_FILE_PATH, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_settings_are_written_together_in_one_atomic_replace(app_dir, monkeypatch):
+    handler = JsonHandler()
+    saves = []
+    save_config = handler._save_config
+    monkeypatch.setattr(handler, '_save_config', lambda data: (saves.append(data), save_config(data)))
+
+    with handler.transaction() as transaction:
+        transaction.set('settings.kokoro_tts.speed', 1.25)
+        transaction.set('settings.kokoro_tts.voice', 'af_bella')
+    assert transaction.committed and len(saves) == 1
+
+    config = _read_config()
+    assert config['settings']['kokoro_tts']['speed'] == 1.25
+    assert config['settings']['kokoro_tts']['voice'] == 'af_bella'
+    assert [name for name in os.listdir('config') if name.endswith('.tmp')] == []
+
+
+def test_nothing_is_written_if_any_setting_fails(app_dir):
+    handler = JsonHandler()
+    assert not handler.set_settings({'settings.kokoro_tts.speed': 2.0, 'settings.kokoro_tts.speed.nested': 1})
+    assert _read_config()['settings']['kokoro_tts']['speed'] != 2.0
+    assert handler.get_setting('settings.kokoro_tts.speed') != 2.0
+
+
+def test_subscribers_are_notified_on_the_notifier_thread(app_dir):
+    handler = JsonHandler()
+    received = []
+
+    def callback(changes):
+        received.append((threading.current_thread().name, changes))
+
+    handler.subscribe(callback, prefix='settings.kokoro_tts')
+    try:
+        handler.set_settings({'settings.kokoro_tts.speed': 1.5, 'settings.jobs.max_concurrent_jobs': 3})
+        handler.wait_for_notifications()
+    finally:
+        handler.unsubscribe(callback)
+    assert received == [('settings-notifier', {'settings.kokoro_tts.speed': 1.5})]
+
+
+def test_external_edits_are_reloaded_and_reported(app_dir):
+    handler = JsonHandler()
+    received = []
+    handler.subscribe(received.append, prefix='settings.kokoro_tts')
+    try:
+        config = _read_config()
+        config['settings']['kokoro_tts']['voice'] = 'af_nicole'
+        time.sleep(0.01) # A new mtime even on coarse file system clocks
+        with open(CONFIG_FILE_PATH, 'w', encoding='utf-8') as f:
+            json.dump(config, f, indent=4)
+
+        assert handler.reload_if_changed() == {'settings.kokoro_tts.voice': 'af_nicole'}
+        assert received == [{'settings.kokoro_tts.voice': 'af_nicole'}] # Delivered before reload_if_changed returns
+        assert handler.get_setting('settings.kokoro_tts.voice') == 'af_nicole'
+    finally:
+        handler.unsubscribe(received.append)
+
+
+def test_a_slow_subscriber_does_not_block_readers_or_writers(app_dir):
+    handler = JsonHandler()
+    release = threading.Event()
+
+    def slow_callback(_changes):
+        release.wait(5)
+
+    handler.subscribe(slow_callback)
+    try:
+        start = time.monotonic()
+        handler.set_setting('settings.kokoro_tts.speed', 1.1)
+        assert handler.get_setting('settings.kokoro_tts.speed') == 1.1
+        assert time.monotonic() - start < 1.0
+    finally:
+        release.set()
+        handler.wait_for_notifications()
+        handler.unsubscribe(slow_callback)
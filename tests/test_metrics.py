@@ -0,0 +1,67 @@
+import pytest
+import utils.metrics as metrics
+from utils.metrics import MetricsRegistry
+
+
+def test_counters_and_gauges_render_in_prometheus_text_format():
+    registry = MetricsRegistry()
+    requests = registry.counter('test_requests_total', 'Requests by result.', ['result'])
+    requests.inc(result='hit')
+    requests.inc(2, result='miss')
+    registry.gauge('test_depth', 'Queue depth.').set(1.5)
+    registry.gauge('test_uptime_seconds', 'Seconds up.', callback=lambda: 42)
+
+    assert registry.expose() == (
+        '# HELP test_requests_total Requests by result.\n'
+        '# TYPE test_requests_total counter\n'
+        'test_requests_total{result="hit"} 1\n'
+        'test_requests_total{result="miss"} 2\n'
+        '# HELP test_depth Queue depth.\n'
+        '# TYPE test_depth gauge\n'
+        'test_depth 1.5\n'
+        '# HELP test_uptime_seconds Seconds up.\n'
+        '# TYPE test_uptime_seconds gauge\n'
+        'test_uptime_seconds 42\n'
+    )
+
+
+def test_histograms_render_cumulative_buckets_sum_and_count():
+    registry = MetricsRegistry()
+    durations = registry.histogram('test_seconds', 'Durations.', ['stage'], buckets=(1.0, 5.0))
+    for value in (0.5, 1.0, 3.0, 10.0):
+        durations.observe(value, stage='read')
+
+    assert registry.expose().splitlines()[2:] == [
+        'test_seconds_bucket{stage="read",le="1"} 2',
+        'test_seconds_bucket{stage="read",le="5"} 3',
+        'test_seconds_bucket{stage="read",le="+Inf"} 4',
+        'test_seconds_sum{stage="read"} 14.5',
+        'test_seconds_count{stage="read"} 4',
+    ]
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.counter('test_total', 'Escaping.', ['name']).inc(name='a "quoted"\\path\nline')
+    assert 'test_total{name="a \\"quoted\\"\\\\path\\nline"} 1' in registry.expose()
+
+
+def test_wrong_labels_are_rejected_and_names_are_registered_once():
+    registry = MetricsRegistry()
+    counter = registry.counter('test_total', 'Once.', ['kind'])
+    with pytest.raises(ValueError):
+        counter.inc(other='x')
+    assert registry.counter('test_total', 'Once.', ['kind']) is counter
+
+
+def test_track_job_records_outcome_and_duration():
+    before_success = metrics.JOBS_TOTAL.get(kind='test', status='success')
+    before_failed = metrics.JOBS_TOTAL.get(kind='test', status='failed')
+    with metrics.track_job('test'):
+        pass
+    with pytest.raises(RuntimeError):
+        with metrics.track_job('test'):
+            raise RuntimeError("failed")
+    assert metrics.JOBS_TOTAL.get(kind='test', status='success') == before_success + 1
+    assert metrics.JOBS_TOTAL.get(kind='test', status='failed') == before_failed + 1
+    assert 'narrateai_job_duration_seconds_count{kind="test"} 2' in metrics.REGISTRY.expose()
@@ -0,0 +1,76 @@
+import os
+from audio.output_cache import OutputCache
+
+FILE_BYTES = 1024 * 1024
+
+
+def _disk_usage(root: str) -> int:
+    """Bytes allocated for the files under root, counting hard-linked files once."""
+    seen = set()
+    total = 0
+    for dir_path, _dirs, files in os.walk(root):
+        for name in files:
+            stat = os.stat(os.path.join(dir_path, name))
+            if (stat.st_dev, stat.st_ino) not in seen:
+                seen.add((stat.st_dev, stat.st_ino))
+                total += stat.st_blocks * 512
+    return total
+
+
+def _write_output(workspace: str, name: str) -> str:
+    os.makedirs(workspace, exist_ok=True)
+    path = os.path.join(workspace, name)
+    with open(path, 'wb') as f:
+        f.write(os.urandom(FILE_BYTES))
+    return path
+
+
+def test_put_moves_the_output_into_the_cache_and_hits_serve_it(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    cache = OutputCache(cache_dir, max_bytes=FILE_BYTES * 4)
+    source = _write_output(str(tmp_path / 'requests' / 'first'), 'book.wav')
+    with open(source, 'rb') as f:
+        content = f.read()
+
+    cached_path = cache.put('first', source)
+    assert not os.path.exists(source)
+    assert os.path.basename(cached_path) == 'book.wav'
+    assert cache.get('first') == cached_path
+    with open(cached_path, 'rb') as f:
+        assert f.read() == content
+    assert _disk_usage(str(tmp_path)) < 2 * FILE_BYTES # Stored once
+
+
+def test_eviction_frees_disk_space(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    cache = OutputCache(cache_dir, max_bytes=FILE_BYTES * 4)
+    cache.put('first', _write_output(str(tmp_path / 'requests' / 'first'), 'book.wav'))
+    usage_before = _disk_usage(str(tmp_path))
+
+    # Reopened with a smaller budget, the cache evicts the entry.
+    smaller = OutputCache(cache_dir, max_bytes=FILE_BYTES // 2)
+    assert smaller.get('first') is None
+    assert _disk_usage(str(tmp_path)) <= usage_before - FILE_BYTES
+
+
+def test_put_evicts_least_recently_used_entries(tmp_path):
+    cache = OutputCache(str(tmp_path / 'cache'), max_bytes=int(FILE_BYTES * 2.5))
+    for name in ('a', 'b'):
+        cache.put(name, _write_output(str(tmp_path / 'requests' / name), f'{name}.wav'))
+    assert cache.get('a') is not None # 'b' is now the least recently used
+    cache.put('c', _write_output(str(tmp_path / 'requests' / 'c'), 'c.wav'))
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+
+
+def test_put_leaves_outputs_larger_than_the_budget_alone(tmp_path):
+    cache = OutputCache(str(tmp_path / 'cache'), max_bytes=FILE_BYTES // 2)
+    source = _write_output(str(tmp_path / 'requests' / 'big'), 'big.wav')
+    assert cache.put('big', source) is None
+    assert os.path.exists(source)
+
+
+def test_reopened_cache_finds_its_entries(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    cached_path = OutputCache(cache_dir, max_bytes=FILE_BYTES * 4).put('book', _write_output(str(tmp_path / 'requests' / 'a'), 'book.wav'))
+    assert OutputCache(cache_dir, max_bytes=FILE_BYTES * 4).get('book') == cached_path
@@ -0,0 +1,67 @@
+import numpy as np
+from audio.postprocess import AudioPostProcessor, db_to_amplitude
+
+SAMPLE_RATE = 1000
+
+
+def _tone(amplitude: float, length: int = 200) -> np.ndarray:
+    return (amplitude * np.sin(np.linspace(0, 40 * np.pi, length))).astype(np.float32)
+
+
+def test_defaults_pass_audio_through_unchanged():
+    processor = AudioPostProcessor(SAMPLE_RATE)
+    audio = _tone(0.5)
+    assert not processor.active
+    assert processor.signature == ''
+    assert processor.process(audio, paragraph_end=True) is audio
+
+
+def test_trim_cuts_silence_but_keeps_a_margin():
+    processor = AudioPostProcessor(SAMPLE_RATE, trim_silence=True)
+    silence = np.zeros(500, dtype=np.float32)
+    tone = _tone(0.5)
+    trimmed = processor.process(np.concatenate((silence, tone, silence)))
+    margin = processor._trim_margin
+    assert tone.size <= trimmed.size <= tone.size + 2 * margin
+    assert processor.process(silence).size == 0 # All-silent segments disappear, pause included
+
+
+def test_pauses_depend_on_paragraph_end():
+    processor = AudioPostProcessor(SAMPLE_RATE, segment_pause_ms=100, paragraph_pause_ms=400)
+    tone = _tone(0.5)
+    within = processor.process(tone)
+    ending = processor.process(tone, paragraph_end=True)
+    assert within.size == tone.size + 100
+    assert ending.size == tone.size + 400
+    assert not ending[tone.size:].any()
+    np.testing.assert_array_equal(ending[:tone.size], tone)
+
+
+def test_peak_normalization_hits_the_target():
+    processor = AudioPostProcessor(SAMPLE_RATE, normalize='peak', target_db=-6.0)
+    audio = _tone(0.1)
+    processed = processor.process(audio)
+    assert np.isclose(np.abs(processed).max(), db_to_amplitude(-6.0), rtol=1e-3)
+    assert np.abs(audio).max() <= 0.1 # The input is not modified
+
+
+def test_loudness_normalization_is_capped_and_never_clips():
+    processor = AudioPostProcessor(SAMPLE_RATE, normalize='loudness', target_db=-20.0)
+    loud = processor.process(_tone(0.9))
+    assert np.abs(loud).max() <= db_to_amplitude(-1.0) + 1e-6
+    quiet = processor.process(_tone(0.001))
+    assert np.abs(quiet).max() <= 0.001 * db_to_amplitude(12.0) + 1e-6 # Gain is capped at +12 dB
+
+
+def test_unknown_normalization_falls_back_to_none():
+    processor = AudioPostProcessor(SAMPLE_RATE, normalize='bogus')
+    assert processor.normalize == 'none'
+    assert not processor.active
+
+
+def test_signature_changes_with_settings():
+    first = AudioPostProcessor(SAMPLE_RATE, trim_silence=True)
+    second = AudioPostProcessor(SAMPLE_RATE, trim_silence=True, paragraph_pause_ms=300)
+    assert first.signature and second.signature
+    assert first.signature != second.signature
+    assert first.signature == AudioPostProcessor(SAMPLE_RATE, trim_silence=True).signature
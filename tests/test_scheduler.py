@@ -0,0 +1,87 @@
+import os
+import time
+import benchmark
+from audio.kokoro_tts import Kokoro_TTS, SynthesisSettings
+from jobs.scheduler import JobScheduler
+from jobs.store import CANCELLED, DONE, FAILED, QUEUED, RUNNING, JobStore
+from utils.file_reader import FileReader
+
+SETTINGS = SynthesisSettings(lang_code='a', voice='af_heart', speed=1.0, device='cpu')
+
+
+def _scheduler(tmp_path, tts_engine=None, max_concurrent_jobs: int = 1) -> JobScheduler:
+    store = JobStore(str(tmp_path / 'jobs.sqlite3'))
+    return JobScheduler(store, tts_engine, FileReader(), str(tmp_path / 'jobs'), max_concurrent_jobs=max_concurrent_jobs)
+
+
+def _document(tmp_path, name: str = 'book.txt', words: int = 200) -> str:
+    path = str(tmp_path / name)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n\n'.join(benchmark.generate_text(words)))
+    return path
+
+
+def _wait_for(scheduler: JobScheduler, job_id: str, statuses, timeout: float = 30.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = scheduler.store.get(job_id)
+        if job['status'] in statuses:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"Job {job_id} is still {scheduler.store.get(job_id)['status']}")
+
+
+def test_users_take_turns_and_each_users_jobs_keep_their_order(tmp_path):
+    scheduler = _scheduler(tmp_path)
+    source = _document(tmp_path)
+    alice = [scheduler.submit('alice', f'a{number}.txt', source, SETTINGS) for number in range(3)]
+    bob = scheduler.submit('bob', 'b0.txt', source, SETTINGS)
+
+    order = [job['filename'] for job in scheduler._fair_order(scheduler.store.queued())]
+    assert order == ['a0.txt', 'b0.txt', 'a1.txt', 'a2.txt']
+    assert scheduler.queue_position(scheduler.store.get(bob['id'])) == 2
+    assert scheduler.queue_position(scheduler.store.get(alice[2]['id'])) == 4
+
+
+def test_cancelling_a_queued_job_takes_it_out_of_the_queue(tmp_path):
+    scheduler = _scheduler(tmp_path)
+    job = scheduler.submit('alice', 'book.txt', _document(tmp_path), SETTINGS)
+    assert scheduler.cancel(job['id'])['status'] == CANCELLED
+    assert scheduler.store.queued() == []
+    assert scheduler.queue_position(scheduler.store.get(job['id'])) is None
+
+
+def test_only_failed_jobs_are_retried(tmp_path):
+    scheduler = _scheduler(tmp_path)
+    job = scheduler.submit('alice', 'book.txt', _document(tmp_path), SETTINGS)
+    assert scheduler.retry(job['id'])['status'] == QUEUED # Unchanged: it never failed
+    scheduler.store.update(job['id'], status=FAILED, error='boom', finished_at=time.time())
+
+    retried = scheduler.retry(job['id'])
+    assert retried['status'] == QUEUED
+    assert retried['error'] is None and retried['finished_at'] is None
+
+
+def test_interrupted_jobs_are_requeued_on_restart(tmp_path):
+    scheduler = _scheduler(tmp_path)
+    job = scheduler.submit('alice', 'book.txt', _document(tmp_path), SETTINGS)
+    assert scheduler.store.transition(job['id'], QUEUED, RUNNING, started_at=time.time())
+
+    restarted = JobStore(str(tmp_path / 'jobs.sqlite3'))
+    assert restarted.requeue_interrupted() == 1
+    assert restarted.get(job['id'])['status'] == QUEUED
+
+
+def test_jobs_run_to_completion_in_the_background(app_dir, tmp_path):
+    engine = Kokoro_TTS(lang_code='a', voice='af_heart', workers=1, pipeline=benchmark.StubPipeline(samples_per_char=10))
+    scheduler = _scheduler(tmp_path, engine, max_concurrent_jobs=2)
+    scheduler.start()
+    try:
+        jobs = [scheduler.submit(user, f'{user}.txt', _document(tmp_path, f'{user}.txt'), engine.current_settings())
+                for user in ('alice', 'bob')]
+        for job in jobs:
+            finished = _wait_for(scheduler, job['id'], (DONE, FAILED))
+            assert finished['status'] == DONE, finished['error']
+            assert os.path.exists(finished['output_path'])
+    finally:
+        scheduler.stop()
@@ -0,0 +1,62 @@
+import numpy as np
+from audio.segment_cache import SegmentCache
+
+SEGMENT_FRAMES = 24000 # One second of audio, 96 KB as float32
+SEGMENT_BYTES = SEGMENT_FRAMES * 4
+
+
+def _audio(seed: int) -> np.ndarray:
+    return np.random.default_rng(seed).uniform(-1, 1, SEGMENT_FRAMES).astype(np.float32)
+
+
+def test_entries_round_trip_and_count_hits(tmp_path):
+    cache = SegmentCache(str(tmp_path), max_bytes=SEGMENT_BYTES * 10)
+    key = SegmentCache.make_key("Hello there.", 'a', 'af_heart', 1.0)
+    assert cache.get(key) is None
+    cache.put(key, _audio(1))
+    assert np.array_equal(cache.get(key), _audio(1))
+    assert (cache.stats()['hits'], cache.stats()['misses']) == (1, 1)
+
+
+def test_keys_depend_on_text_and_every_voice_setting():
+    base = SegmentCache.make_key("Hello.", 'a', 'af_heart', 1.0, 'model')
+    assert base == SegmentCache.make_key("Hello.", 'a', 'af_heart', 1.0, 'model')
+    variants = [
+        SegmentCache.make_key("Hello!", 'a', 'af_heart', 1.0, 'model'),
+        SegmentCache.make_key("Hello.", 'b', 'af_heart', 1.0, 'model'),
+        SegmentCache.make_key("Hello.", 'a', 'af_bella', 1.0, 'model'),
+        SegmentCache.make_key("Hello.", 'a', 'af_heart', 1.1, 'model'),
+        SegmentCache.make_key("Hello.", 'a', 'af_heart', 1.0, 'model|packed'),
+    ]
+    assert base not in variants and len(set(variants)) == len(variants)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = SegmentCache(str(tmp_path), max_bytes=int(SEGMENT_BYTES * 2.5))
+    cache.put('a' * 64, _audio(1))
+    cache.put('b' * 64, _audio(2))
+    assert cache.get('a' * 64) is not None # 'b' is now the least recently used
+    cache.put('c' * 64, _audio(3))
+    assert not cache.contains('b' * 64)
+    assert cache.contains('a' * 64) and cache.contains('c' * 64)
+    assert cache.total_bytes <= cache.max_bytes
+
+
+def test_reopened_cache_keeps_its_entries_and_budget(tmp_path):
+    cache = SegmentCache(str(tmp_path), max_bytes=SEGMENT_BYTES * 10)
+    for seed in range(3):
+        cache.put(f"{seed}" * 64, _audio(seed))
+    reopened = SegmentCache(str(tmp_path), max_bytes=int(SEGMENT_BYTES * 2.5))
+    assert reopened.stats()['entries'] == 2
+    assert not reopened.contains('0' * 64) # The oldest entry goes first
+    assert np.array_equal(reopened.get('2' * 64), _audio(2))
+
+
+def test_unreadable_entries_are_dropped(tmp_path):
+    cache = SegmentCache(str(tmp_path), max_bytes=SEGMENT_BYTES * 10)
+    key = 'd' * 64
+    cache.put(key, _audio(1))
+    with open(cache._path_for(key), 'wb') as f:
+        f.write(b'not a numpy file')
+    assert cache.get(key) is None
+    assert not cache.contains(key)
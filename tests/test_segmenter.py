@@ -0,0 +1,50 @@
+import random
+import pytest
+from utils.segmenter import TextSegmenter
+
+TOKENS = ['word', 'Mr.', 'e.g.', 'end.', 'why?', 'yes!', 'clause,', 'semi;', 'A.', 'x.y.', 'U.S.', 'ok)', '。', 'long' * 30, 'a' * 450]
+SEPARATORS = [' ', ' ', ' ', '  ', '\t', '\n', '\n\n', ' \n \n ', '\n\n\n']
+PIECE_LENGTHS = [1, 2, 3, 7, 50, 500, 5000]
+
+
+def _random_text(rng: random.Random) -> str:
+    words = (rng.choice(TOKENS) + rng.choice(SEPARATORS) for _ in range(rng.randint(0, 400)))
+    return ''.join(words) + rng.choice(['', ' ', '\n', 'tail'])
+
+
+def _random_pieces(rng: random.Random, text: str):
+    pieces, start = [], 0
+    while start < len(text):
+        end = start + rng.choice(PIECE_LENGTHS)
+        pieces.append(text[start:end])
+        start = end
+    return pieces
+
+
+def _segments(segments):
+    return [(str(segment), segment.paragraph_end) for segment in segments]
+
+
+@pytest.mark.parametrize('target_chars, max_chars', [(150, 400), (60, 120), (0, 50)])
+def test_streamed_segments_match_whole_text(target_chars, max_chars):
+    rng = random.Random(f"{target_chars}-{max_chars}")
+    for _case in range(200):
+        text = _random_text(rng)
+        whole = _segments(TextSegmenter(target_chars, max_chars).split(text))
+        streamed = _segments(TextSegmenter(target_chars, max_chars).iter_segments(_random_pieces(rng, text)))
+        assert streamed == whole, text
+
+
+def test_paragraph_break_split_across_pieces():
+    text = "First paragraph ends here.\n\nSecond one."
+    expected = _segments(TextSegmenter().split(text))
+    assert expected == [("First paragraph ends here.", True), ("Second one.", False)]
+    assert _segments(TextSegmenter().iter_segments(["First paragraph ends here.\n", "\nSecond one."])) == expected
+
+
+def test_run_without_sentence_ends_is_segmented_while_streaming():
+    segmenter = TextSegmenter(max_chars=100)
+    segments = segmenter.iter_segments('word ' for _ in range(10000))
+    first = next(segments) # Produced long before the input ends
+    assert 0 < len(first) <= 100
+    assert all(len(segment) <= 100 for segment in segments)
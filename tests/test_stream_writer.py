@@ -0,0 +1,61 @@
+import os
+import numpy as np
+import pytest
+import soundfile as sf
+from audio.stream_writer import AudioStreamWriter
+
+SAMPLE_RATE = 24000
+
+
+def _tone(seconds: float) -> np.ndarray:
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    return (0.3 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+
+
+@pytest.mark.parametrize('output_format', ['wav', 'flac'])
+def test_chunks_are_appended_and_moved_into_place_on_close(tmp_path, output_format):
+    output_path = str(tmp_path / f'book.{output_format}')
+    writer = AudioStreamWriter(output_path, SAMPLE_RATE, output_format).open()
+    for _ in range(3):
+        writer.write(_tone(0.5))
+        assert not os.path.exists(output_path)
+        assert os.path.exists(writer.partial_path)
+    assert writer.close() == output_path
+
+    assert not os.path.exists(writer.partial_path)
+    info = sf.info(output_path)
+    assert info.frames == int(SAMPLE_RATE * 0.5) * 3
+    assert info.samplerate == SAMPLE_RATE
+
+
+def test_abort_removes_the_partial_file_and_keeps_the_previous_output(tmp_path):
+    output_path = str(tmp_path / 'book.wav')
+    with open(output_path, 'wb') as f:
+        f.write(b'previous')
+    with pytest.raises(RuntimeError):
+        with AudioStreamWriter(output_path, SAMPLE_RATE) as writer:
+            writer.write(_tone(0.1))
+            raise RuntimeError("synthesis failed")
+    assert not os.path.exists(writer.partial_path)
+    with open(output_path, 'rb') as f:
+        assert f.read() == b'previous'
+
+
+def test_writers_for_the_same_path_use_separate_partial_files(tmp_path):
+    output_path = str(tmp_path / 'book.wav')
+    first = AudioStreamWriter(output_path, SAMPLE_RATE).open()
+    second = AudioStreamWriter(output_path, SAMPLE_RATE).open()
+    assert first.partial_path != second.partial_path
+    first.write(_tone(0.2))
+    second.write(_tone(0.4))
+    first.close()
+    second.close()
+    assert sf.info(output_path).frames == int(SAMPLE_RATE * 0.4)
+
+
+def test_empty_chunks_write_nothing(tmp_path):
+    with AudioStreamWriter(str(tmp_path / 'book.wav'), SAMPLE_RATE) as writer:
+        assert writer.write(None) == 0
+        assert writer.write(np.zeros(0, dtype=np.float32)) == 0
+        writer.write(_tone(0.1))
+    assert writer.frames_written == int(SAMPLE_RATE * 0.1)
@@ -0,0 +1,44 @@
+import os
+import pytest
+from utils.text_cache import TextCache, hash_file
+
+
+def test_entries_are_stored_only_when_fully_read(tmp_path):
+    cache = TextCache(str(tmp_path / 'text'), max_bytes=1024 * 1024)
+    partial = cache.write_through('partial', iter(["one", "two"]))
+    next(partial)
+    partial.close()
+    assert cache.get('partial') is None
+
+    assert list(cache.write_through('key', iter(["one", "twö\n"]))) == ["one", "twö\n"]
+    assert list(cache.get('key')) == ["one", "twö\n"]
+
+
+def test_get_does_not_open_the_entry_until_iterated(tmp_path):
+    cache = TextCache(str(tmp_path / 'text'), max_bytes=1024 * 1024)
+    list(cache.write_through('key', iter(["one"])))
+    entry = cache.get('key')
+    os.remove(cache._path_for('key'))
+    with pytest.raises(FileNotFoundError):
+        next(entry)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = TextCache(str(tmp_path / 'text'), max_bytes=250)
+    list(cache.write_through('old', iter(["x" * 100])))
+    list(cache.write_through('used', iter(["y" * 100])))
+    os.utime(cache._path_for('old'), (2, 2))
+    os.utime(cache._path_for('used'), (1, 1))
+    assert cache.get('used') is not None # Hits count as use
+    list(cache.write_through('new', iter(["z" * 100])))
+    assert cache.get('old') is None
+    assert list(cache.get('used')) == ["y" * 100]
+
+
+def test_hash_file_depends_on_contents_only(tmp_path):
+    first, second = tmp_path / 'a.txt', tmp_path / 'b.txt'
+    first.write_text("same")
+    second.write_text("same")
+    assert hash_file(str(first)) == hash_file(str(second))
+    second.write_text("different")
+    assert hash_file(str(first)) != hash_file(str(second))